@@ -0,0 +1,95 @@
+# audio_codec.py
+# Decoders for the compact /ws/stream transport codecs (pure Python, no extra dependencies).
+# The service picks the codec from the client's preferences and reports it in "info":
+#   {"codec": "pcm" | "mulaw" | "adpcm", "sample_rate": ..., "sample_width": 1 | 2}
+# Every decoder turns one audio frame into 16-bit little-endian PCM for PyAudio (paInt16).
+import struct
+import sys
+from array import array
+from typing import Callable, Dict, Optional
+
+CODECS = ("adpcm", "mulaw", "pcm")   # most compact first
+
+IMA_STEPS = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230, 253, 279, 307,
+    337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066,
+    2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899,
+    15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767)
+IMA_INDEX = (-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8)
+
+
+def _mulaw_table():
+    table = []
+    for u in range(256):
+        u = ~u & 0xFF
+        mag = ((((u & 0x0F) << 3) + 0x84) << ((u >> 4) & 0x07)) - 0x84
+        table.append(-mag if u & 0x80 else mag)
+    return table
+
+
+_MULAW = _mulaw_table()
+
+
+def _pcm(samples: array) -> bytes:
+    if sys.byteorder != "little":
+        samples.byteswap()
+    return samples.tobytes()
+
+
+def decode_mulaw(data: bytes) -> bytes:
+    return _pcm(array("h", map(_MULAW.__getitem__, data)))
+
+
+def decode_pcm8(data: bytes) -> bytes:
+    return _pcm(array("h", ((b - 128) << 8 for b in data)))
+
+
+def decode_adpcm(data: bytes) -> bytes:
+    if len(data) < 4:
+        return b""
+    pred, index, flags = struct.unpack_from("<hBB", data)
+    out = array("h", [pred])
+    steps, adjust = IMA_STEPS, IMA_INDEX
+    body = data[4:]
+    count = len(body) * 2 - (flags & 1)
+    for i in range(count):
+        byte = body[i >> 1]
+        code = (byte >> 4) if i & 1 else (byte & 0x0F)
+        step = steps[index]
+        vpdiff = step >> 3
+        if code & 4:
+            vpdiff += step
+        if code & 2:
+            vpdiff += step >> 1
+        if code & 1:
+            vpdiff += step >> 2
+        pred = pred - vpdiff if code & 8 else pred + vpdiff
+        pred = -32768 if pred < -32768 else 32767 if pred > 32767 else pred
+        index += adjust[code]
+        index = 0 if index < 0 else 88 if index > 88 else index
+        out.append(pred)
+    return _pcm(out)
+
+
+def decoder(info: Optional[Dict]) -> Optional[Callable[[bytes], bytes]]:
+    """Frame decoder for the negotiated codec in an "info"/"session" message; None for plain 16-bit PCM."""
+    info = info or {}
+    codec = (info.get("codec") or "pcm").lower()
+    if codec == "mulaw":
+        return decode_mulaw
+    if codec == "adpcm":
+        return decode_adpcm
+    if int(info.get("sample_width") or 2) == 1:
+        return decode_pcm8
+    return None
+
+
+def request_fields(codec: Optional[str], sample_rate: Optional[int]) -> Dict:
+    """What a client adds to its first message to ask for a transport (older services ignore it)."""
+    fields: Dict = {}
+    if codec:
+        fields["codec"] = [c.strip() for c in codec.split(",")] if "," in codec else codec
+    if sample_rate:
+        fields["sample_rate"] = int(sample_rate)
+    return fields
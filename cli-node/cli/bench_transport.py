@@ -0,0 +1,178 @@
+# bench_transport.py
+# Loopback TCP vs Unix domain socket between a CLI and the service.
+#   python bench_transport.py                    # 300 connects, 300 HTTP calls, 3000 frames per transport
+#   python bench_transport.py --frames 10000 --frame-bytes 8192 --json
+# Starts local-service/serve.py on a free port and a private socket with a small echo app, so only the
+# transport is measured: WebSocket connect (handshake + close), a keep-alive HTTP round trip, and one
+# /ws/stream-sized JSON frame echoed back. Reports median/p90 wall time and the client and service CPU
+# spent per frame (service CPU from /proc, Linux only).
+import asyncio
+import base64
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import typer
+
+import service_socket
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.abspath(os.path.join(HERE, "..", "..", "local-service"))
+
+APP = typer.Typer(add_completion=False)
+
+
+async def echo_app(scope, receive, send):
+    """ASGI app served by serve.py for the benchmark: GET -> {"ok": true}, WebSocket -> echo."""
+    if scope["type"] == "lifespan":
+        while True:
+            msg = await receive()
+            await send({"type": msg["type"] + ".complete"})
+            if msg["type"] == "lifespan.shutdown":
+                return
+    elif scope["type"] == "http":
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b'{"ok": true}'})
+    elif scope["type"] == "websocket":
+        await receive()
+        await send({"type": "websocket.accept"})
+        while True:
+            msg = await receive()
+            if msg["type"] == "websocket.disconnect":
+                return
+            await send({"type": "websocket.send", "text": msg.get("text"), "bytes": msg.get("bytes")})
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _service_cpu(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def start_service(app: str = "bench_transport:echo_app", sock_dir: Optional[str] = None, tcp: bool = True):
+    """serve.py in a subprocess on a free port and a socket in sock_dir; returns (proc, port, socket path)."""
+    port = _free_port()
+    path = os.path.join(sock_dir or tempfile.mkdtemp(prefix="vibe-bench-"), f"{port}.sock")
+    env = dict(os.environ, VIBE_PORT=str(port), VIBE_UDS=path, VIBE_TCP="1" if tcp else "0",
+               VIBE_LOG_LEVEL="warning", PYTHONPATH=os.pathsep.join(filter(None, [HERE, os.getenv("PYTHONPATH")])))
+    proc = subprocess.Popen([sys.executable, "serve.py", app], cwd=SERVICE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while not service_socket._probe(path):
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            raise RuntimeError("service did not start")
+        time.sleep(0.02)
+    return proc, port, path
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {"median_us": round(statistics.median(samples) * 1e6, 1),
+            "p90_us": round(samples[int(len(samples) * 0.9)] * 1e6, 1)}
+
+
+async def _ws(url: str, path: Optional[str]):
+    import websockets
+    if path:
+        return await websockets.unix_connect(path, url, max_size=None)
+    return await websockets.connect(url, max_size=None)
+
+
+async def _measure_ws(url: str, path: Optional[str], connects: int, frames: int, frame_bytes: int, pid: int):
+    out = {}
+    samples = []
+    for _ in range(connects):
+        t0 = time.perf_counter()
+        ws = await _ws(url, path)
+        await ws.close()
+        samples.append(time.perf_counter() - t0)
+    out["connect"] = _stats(samples)
+
+    frame = json.dumps({"audio": base64.b64encode(os.urandom(frame_bytes)).decode()})
+    async with await _ws(url, path) as ws:
+        for _ in range(50):                                   # warm up
+            await ws.send(frame)
+            await ws.recv()
+        samples = []
+        cpu0, svc0 = time.process_time(), _service_cpu(pid)
+        for _ in range(frames):
+            t0 = time.perf_counter()
+            await ws.send(frame)
+            await ws.recv()
+            samples.append(time.perf_counter() - t0)
+        cpu1, svc1 = time.process_time(), _service_cpu(pid)
+    out["frame"] = _stats(samples)
+    out["frame"]["client_cpu_us"] = round((cpu1 - cpu0) / frames * 1e6, 1)
+    if svc0 is not None and svc1 is not None:
+        out["frame"]["service_cpu_us"] = round((svc1 - svc0) / frames * 1e6, 1)
+    return out
+
+
+def measure(connects: int = 300, requests_n: int = 300, frames: int = 3000, frame_bytes: int = 4096,
+            app: str = "bench_transport:echo_app") -> Dict[str, Dict]:
+    import requests
+    proc, port, path = start_service(app)
+    results: Dict[str, Dict] = {}
+    try:
+        for transport, uds in (("tcp", None), ("uds", path)):
+            base = f"http://127.0.0.1:{port}"
+            session = requests.Session()
+            if uds:
+                session.mount(base, service_socket._unix_adapter(uds, "127.0.0.1", port))
+            session.get(base + "/health", timeout=5).raise_for_status()
+            samples = []
+            for _ in range(requests_n):
+                t0 = time.perf_counter()
+                session.get(base + "/health", timeout=5)
+                samples.append(time.perf_counter() - t0)
+            session.close()
+            row = asyncio.run(_measure_ws(f"ws://127.0.0.1:{port}/ws/stream", uds, connects, frames, frame_bytes, proc.pid))
+            row["http"] = _stats(samples)
+            results[transport] = row
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return results
+
+
+@APP.command()
+def main(
+    connects: int = typer.Option(300, "--connects"),
+    requests_n: int = typer.Option(300, "--requests"),
+    frames: int = typer.Option(3000, "--frames"),
+    frame_bytes: int = typer.Option(4096, "--frame-bytes", help="Raw audio bytes per frame (sent base64 in JSON)"),
+    as_json: bool = typer.Option(False, "--json"),
+):
+    results = measure(connects, requests_n, frames, frame_bytes)
+    if as_json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'':14}{'tcp':>12}{'uds':>12}{'uds/tcp':>10}")
+    for stage, metric in (("connect", "median_us"), ("connect", "p90_us"), ("http", "median_us"),
+                          ("frame", "median_us"), ("frame", "p90_us"), ("frame", "client_cpu_us"),
+                          ("frame", "service_cpu_us")):
+        tcp, uds = results["tcp"][stage].get(metric), results["uds"][stage].get(metric)
+        if tcp is None or uds is None:
+            continue
+        label = f"{stage} {metric.replace('_us', '')}"
+        print(f"{label:14}{tcp:>10.1f}us{uds:>10.1f}us{uds / tcp if tcp else 0:>10.2f}")
+
+
+if __name__ == "__main__":
+    APP()
@@ -0,0 +1,74 @@
+# cli_profile.py
+# --profile PATH for the CLIs (vibe, vibe_stream stream, live_agent).
+#   vibe --profile out/run main "explain app.py"
+# A background thread samples every thread's Python stack every few ms while the command runs, and
+# tracemalloc records allocations. At exit it writes
+#   PATH.folded  one "thread;file.py:outer;file.py:inner <samples>" line per stack
+#                (flamegraph.pl, speedscope and inferno read it as-is)
+#   PATH.txt     hottest frames (self / total) and the top allocation sites
+# and prints the first few hot frames. The service side is /admin/profile (local-service/profiling.py).
+# Sampling is local-service/profiling.py's SamplingProfiler, loaded from the sibling folder, so the
+# CLI and the service report stacks the same way.
+import atexit
+import os
+import sys
+from typing import Optional
+
+SERVICE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service"))
+if SERVICE_DIR not in sys.path:
+    sys.path.append(SERVICE_DIR)
+
+from profiling import INTERVAL_S, SamplingProfiler  # noqa: E402
+
+_active: Optional["Profiler"] = None
+
+
+class Profiler:
+    def __init__(self, path: str, interval: float = INTERVAL_S):
+        self.path = path
+        self.sampler = SamplingProfiler(interval)
+
+    def start(self) -> "Profiler":
+        self.sampler.start()
+        return self
+
+    def stop(self, top: int = 25) -> str:
+        """Stop sampling, write PATH.folded and PATH.txt; returns the summary text."""
+        report = self.sampler.stop().report()
+        hot = self.sampler.top(top)
+        lines = [f"{report['duration_s']:.2f}s, {report['samples']} samples every {report['period_ms']:.1f} ms",
+                 "", "self ms    frame"]
+        lines += [f"{row['ms']:8.0f}  {row['frame']}" for row in hot["self"]]
+        lines += ["", "total ms   frame"]
+        lines += [f"{row['ms']:8.0f}  {row['frame']}" for row in hot["total"]]
+        lines += ["", "alloc KiB  count  where"]
+        lines += [f"{row['size_kb']:9.1f} {row['count']:6d}  {row['where']}" for row in self.sampler.memory_top(top)]
+        summary = "\n".join(lines) + "\n"
+
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        with open(self.path + ".folded", "w", encoding="utf-8") as f:
+            f.write(report["folded"])
+        with open(self.path + ".txt", "w", encoding="utf-8") as f:
+            f.write(summary)
+        return summary
+
+
+def start(path: Optional[str]) -> Optional[Profiler]:
+    """Profile the rest of this process; the report is written when the interpreter exits."""
+    global _active
+    if not path or _active is not None:
+        return _active
+    _active = Profiler(path).start()
+    atexit.register(_finish)
+    return _active
+
+
+def _finish():
+    global _active
+    prof, _active = _active, None
+    if prof is None:
+        return
+    summary = prof.stop()
+    head = "\n".join(summary.splitlines()[:13])         # run length + the ten hottest frames
+    print(f"\n--- Profile ({prof.path}.folded, {prof.path}.txt) ---\n{head}", file=sys.stderr)
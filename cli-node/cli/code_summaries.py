@@ -0,0 +1,249 @@
+# code_summaries.py
+# Incremental, per-symbol summaries for the LangChain advanced agent.
+# A Python file is split with `ast` into its top-level functions and classes (methods inside a class
+# are symbols of their own) plus the module-level code between them. Each piece is summarized once
+# and cached under the hash of its source, and the class and file summaries are built from the
+# summaries below them. After an edit only the changed symbols, and the summaries above them, go
+# back to the model; an unchanged file is answered from _cache/summaries.json without loading it.
+# Other files are summarized in fixed-size chunks the same way, and so is a symbol too long for one
+# prompt: its chunks are summarized and combined, nothing is cut off.
+import ast
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from cache_utils import get_cache_dir
+
+SYMBOL_CHARS = int(os.getenv("VIBE_SUMMARY_SYMBOL_CHARS", "2000"))    # source sent per model call
+GROUP_CHARS = int(os.getenv("VIBE_SUMMARY_GROUP_CHARS", "1500"))      # child summaries per combine call
+MAX_ENTRIES = int(os.getenv("VIBE_SUMMARY_MAX_ENTRIES", "5000"))
+CACHE_FILE = "summaries.json"
+
+PROMPTS = {
+    "summarize": "Summarize the following code:\n{code}\nSummary:",
+    "combine": "Summarize {name} from the summaries of its parts:\n{code}\nSummary:",
+    "refactor": "Refactor the following code for best practices:\n{code}\nRefactored code:",
+}
+
+# complete(prompt) -> model text
+Complete = Callable[[str], str]
+
+
+class Symbol(NamedTuple):
+    name: str           # "Class.method", "function", "<module>" or "lines 1-40"
+    kind: str           # function | class | method | module | chunk
+    lineno: int
+    source: str
+    parent: Optional[str] = None
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(p.encode("utf-8", "surrogatepass"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def _segment(lines: List[str], node: ast.AST) -> str:
+    start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    return "".join(lines[start - 1:node.end_lineno])
+
+
+def symbols(source: str, chunk_chars: int = SYMBOL_CHARS) -> List[Symbol]:
+    """
+    The pieces a file is summarized from, in file order. Python files give functions, classes, their
+    methods and one "<module>" piece for the remaining top-level code; anything that does not parse
+    is cut into chunks of whole lines.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return _chunks(source, chunk_chars)
+    lines = source.splitlines(keepends=True)
+    out: List[Symbol] = []
+    rest: List[str] = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            out.append(Symbol(node.name, "function", node.lineno, _segment(lines, node)))
+        elif isinstance(node, ast.ClassDef):
+            out.append(Symbol(node.name, "class", node.lineno, _segment(lines, node)))
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    out.append(Symbol(f"{node.name}.{child.name}", "method", child.lineno,
+                                      _segment(lines, child), node.name))
+        else:
+            rest.append(_segment(lines, node))
+    if rest:
+        out.insert(0, Symbol("<module>", "module", 1, "".join(rest)))
+    return out
+
+
+def _chunks(source: str, size: int) -> List[Symbol]:
+    """Runs of whole lines of at most `size` chars; a longer line is a run of its own, cut every `size` chars."""
+    out: List[Symbol] = []
+    buf: List[str] = []
+    first = 1
+
+    def flush(last: int):
+        nonlocal buf, first
+        if buf:
+            out.append(Symbol(f"lines {first}-{last}", "chunk", first, "".join(buf)))
+        buf, first = [], last + 1
+
+    for n, line in enumerate(source.splitlines(keepends=True), 1):
+        if buf and sum(map(len, buf)) + len(line) > size:
+            flush(n - 1)
+        if len(line) > size:
+            out.extend(Symbol(f"lines {n}-{n}", "chunk", n, line[i:i + size]) for i in range(0, len(line), size))
+            first = n + 1
+            continue
+        buf.append(line)
+    flush(first + len(buf) - 1)
+    return out
+
+
+def _class_header(sym: Symbol, methods: List[Symbol]) -> str:
+    """A class's own code with each method body left out (the methods are summarized separately)."""
+    text = sym.source
+    for m in methods:
+        text = text.replace(m.source, "")
+    return text
+
+
+class SummaryCache:
+    """Summaries keyed by content hash, persisted as one JSON file and pruned by last use."""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries: Dict[str, Dict] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        entry["used"] = round(time.time())
+        return entry["text"]
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self.entries[key] = {"text": text, "used": round(time.time())}
+            self._dirty = True
+
+    def save(self):
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            if len(self.entries) > self.max_entries:
+                keep = sorted(self.entries.items(), key=lambda kv: kv[1]["used"])[-self.max_entries:]
+                self.entries = dict(keep)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+class Summarizer:
+    """
+    Hierarchical summaries over a per-symbol cache. `complete` is only called for pieces whose
+    source (or whose children's summaries) changed; `stats` counts model calls and cache hits.
+    """
+
+    def __init__(self, complete: Complete, cache: Optional[SummaryCache] = None):
+        self.complete = complete
+        self.cache = cache if cache is not None else SummaryCache()
+        self.stats = {"calls": 0, "hits": 0}
+
+    def _ask(self, task: str, code: str, name: str = "") -> str:
+        key = _digest(task, name if task == "combine" else "", code)
+        text = self.cache.get(key)
+        if text is not None:
+            self.stats["hits"] += 1
+            return text
+        prompt = PROMPTS[task].format(code=code, name=name)
+        text = self.complete(prompt)
+        if text.startswith(prompt):                     # text-generation pipelines echo the prompt
+            text = text[len(prompt):]
+        text = text.strip()
+        self.stats["calls"] += 1
+        self.cache.put(key, text)
+        return text
+
+    def _summarize(self, name: str, code: str) -> str:
+        """A symbol longer than SYMBOL_CHARS is summarized in line chunks, combined like a class's children."""
+        if len(code) <= SYMBOL_CHARS:
+            return self._ask("summarize", code)
+        chunks = _chunks(code, SYMBOL_CHARS)
+        return self._combine(name, [f"{name} part {i}/{len(chunks)}: {self._ask('summarize', c.source)}"
+                                    for i, c in enumerate(chunks, 1)])
+
+    def _combine(self, name: str, parts: List[str]) -> str:
+        """Fold child summaries into one, about GROUP_CHARS at a time, so any number of parts fits a prompt."""
+        while len(parts) > 1:
+            groups: List[List[str]] = [[]]
+            for p in parts:
+                if len(groups[-1]) >= 2 and sum(map(len, groups[-1])) + len(p) > GROUP_CHARS:
+                    groups.append([])
+                groups[-1].append(p)
+            parts = [self._ask("combine", "\n".join(g), name) for g in groups]
+        return parts[0] if parts else ""
+
+    def summarize_source(self, source: str, name: str = "file") -> Dict:
+        pieces = symbols(source)
+        methods: Dict[str, List[Symbol]] = {}
+        for s in pieces:
+            if s.parent:
+                methods.setdefault(s.parent, []).append(s)
+        out: Dict[str, str] = {}
+        for s in pieces:
+            if s.kind == "class":
+                continue
+            out[s.name] = self._summarize(s.name, s.source)
+        top: List[str] = []
+        for s in pieces:
+            if s.kind == "class":
+                own = self._summarize(f"class {s.name}", _class_header(s, methods.get(s.name, [])))
+                children = [f"{m.name}: {out[m.name]}" for m in methods.get(s.name, [])]
+                out[s.name] = self._combine(f"class {s.name}", [f"{s.name}: {own}"] + children)
+            if not s.parent:
+                top.append(f"{s.name}: {out[s.name]}")
+        summary = self._combine(name, top)
+        self.cache.save()
+        return {"summary": summary, "symbols": out}
+
+    def summarize_file(self, path: str) -> Dict:
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            return self.summarize_source(f.read(), os.path.basename(path))
+
+    def refactor_file(self, path: str) -> str:
+        """Refactored code per top-level symbol, in file order; unchanged symbols come from the cache."""
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            pieces = [s for s in symbols(f.read()) if not s.parent]
+        # a symbol too long for one prompt is refactored a chunk of whole lines at a time
+        out = [f"# {s.name}\n" + "\n".join(self._ask("refactor", c.source) for c in _chunks(s.source, SYMBOL_CHARS))
+               for s in pieces]
+        self.cache.save()
+        return "\n\n".join(out)
+
+
+_cache: Optional[SummaryCache] = None
+
+
+def get_cache() -> SummaryCache:
+    global _cache
+    if _cache is None:
+        _cache = SummaryCache(str(get_cache_dir() / CACHE_FILE))
+    return _cache
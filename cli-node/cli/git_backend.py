@@ -0,0 +1,272 @@
+# git_backend.py
+# Read-only git queries for the voice git agent, answered as short spoken summaries.
+# Objects (HEAD, the last commits) come from one long-lived `git cat-file --batch` process instead of a
+# fork per command; HEAD is resolved from the ref files directly. `git status --porcelain=v2` is parsed
+# into entries and cached by HEAD plus the index's mtime and size, so asking again is answered from
+# memory. Edits to tracked files do not touch the index, so a cached status is also only trusted for
+# STATUS_TTL seconds. Summaries are counts plus the first few paths, not the raw porcelain text.
+import atexit
+import os
+import subprocess
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+STATUS_TTL = float(os.getenv("VIBE_GIT_STATUS_TTL", "10"))
+TOP = int(os.getenv("VIBE_GIT_TOP", "3"))            # paths named per group in a spoken summary
+
+
+class Entry(NamedTuple):
+    kind: str               # "1" changed, "2" renamed/copied, "u" unmerged, "?" untracked, "!" ignored
+    xy: str                 # index / worktree status letters, "." for unchanged
+    path: str
+    orig: Optional[str] = None
+
+
+class Status(NamedTuple):
+    branch: Optional[str]   # None when detached
+    oid: Optional[str]      # None before the first commit
+    upstream: Optional[str]
+    ahead: int
+    behind: int
+    entries: List[Entry]
+
+    def groups(self) -> Dict[str, List[str]]:
+        out: Dict[str, List[str]] = {"conflicted": [], "staged": [], "modified": [], "deleted": [], "untracked": []}
+        for e in self.entries:
+            if e.kind == "u":
+                out["conflicted"].append(e.path)
+            elif e.kind == "?":
+                out["untracked"].append(e.path)
+            elif e.kind in "12":
+                if e.xy[0] != ".":
+                    out["staged"].append(e.path)
+                if e.xy[1] == "D":
+                    out["deleted"].append(e.path)
+                elif e.xy[1] != ".":
+                    out["modified"].append(e.path)
+        return out
+
+
+class Commit(NamedTuple):
+    sha: str
+    parents: List[str]
+    author: str
+    when: int
+    subject: str
+
+
+def parse_status(data: bytes) -> Status:
+    """`git status --porcelain=v2 --branch -z` output -> Status."""
+    fields = data.decode("utf-8", "surrogateescape").split("\0")
+    head: Dict[str, str] = {}
+    entries: List[Entry] = []
+    i = 0
+    while i < len(fields):
+        rec = fields[i]
+        i += 1
+        if not rec:
+            continue
+        if rec.startswith("# "):
+            key, _, value = rec[2:].partition(" ")
+            head[key] = value
+        elif rec[0] == "1":
+            parts = rec.split(" ", 8)
+            entries.append(Entry("1", parts[1], parts[8]))
+        elif rec[0] == "2":
+            parts = rec.split(" ", 9)
+            entries.append(Entry("2", parts[1], parts[9], fields[i]))
+            i += 1
+        elif rec[0] == "u":
+            parts = rec.split(" ", 10)
+            entries.append(Entry("u", parts[1], parts[10]))
+        elif rec[0] in "?!":
+            entries.append(Entry(rec[0], "??" if rec[0] == "?" else "!!", rec[2:]))
+    ahead = behind = 0
+    if "branch.ab" in head:
+        a, b = head["branch.ab"].split()
+        ahead, behind = int(a), -int(b)
+    branch = head.get("branch.head")
+    oid = head.get("branch.oid")
+    return Status(None if branch == "(detached)" else branch, None if oid == "(initial)" else oid,
+                  head.get("branch.upstream"), ahead, behind, entries)
+
+
+def parse_commit(sha: str, data: bytes) -> Commit:
+    header, _, message = data.decode("utf-8", "replace").partition("\n\n")
+    parents, author, when = [], "", 0
+    for line in header.splitlines():
+        if line.startswith("parent "):
+            parents.append(line[7:])
+        elif line.startswith("author "):
+            name, _, rest = line[7:].partition(" <")
+            author = name
+            stamp = rest.split("> ", 1)[-1].split()
+            when = int(stamp[0]) if stamp else 0
+    return Commit(sha, parents, author, when, message.strip().split("\n", 1)[0])
+
+
+class CatFile:
+    """One `git cat-file --batch` process; read(name) -> (sha, type, bytes) or None. Restarted if it dies."""
+
+    def __init__(self, cwd: str):
+        self.cwd = cwd
+        self.proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        self.proc = subprocess.Popen(["git", "cat-file", "--batch"], cwd=self.cwd, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def read(self, name: str) -> Optional[Tuple[str, str, bytes]]:
+        if not name or "\n" in name:
+            return None
+        with self._lock:
+            if self.proc is None or self.proc.poll() is not None:
+                self._start()
+            self.proc.stdin.write(name.encode("utf-8") + b"\n")
+            self.proc.stdin.flush()
+            header = self.proc.stdout.readline().decode("utf-8", "replace").split()
+            if len(header) != 3:                       # "<name> missing" / "<name> ambiguous"
+                return None
+            sha, kind, size = header
+            data = self.proc.stdout.read(int(size) + 1)[:-1]
+            return sha, kind, data
+
+    def close(self):
+        with self._lock:
+            if self.proc and self.proc.poll() is None:
+                self.proc.stdin.close()
+                try:
+                    self.proc.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    self.proc.kill()
+            self.proc = None
+
+
+class GitBackend:
+    def __init__(self, path: str = "."):
+        out = subprocess.run(["git", "rev-parse", "--show-toplevel", "--absolute-git-dir", "--git-common-dir"],
+                             cwd=path, capture_output=True, text=True, check=True).stdout.splitlines()
+        self.root, self.git_dir = out[0], out[1]
+        self.common_dir = os.path.normpath(os.path.join(path, out[2])) if not os.path.isabs(out[2]) else out[2]
+        self.cat = CatFile(self.root)
+        self.stats = {"status_runs": 0, "status_hits": 0}
+        self._status: Optional[Tuple[Tuple, float, Status]] = None
+        atexit.register(self.close)
+
+    def close(self):
+        self.cat.close()
+
+    # ---- refs ---------------------------------------------------------------
+    def _read(self, *parts: str) -> Optional[str]:
+        try:
+            with open(os.path.join(*parts), encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def head(self) -> Tuple[Optional[str], Optional[str]]:
+        """(branch or None if detached, commit sha or None before the first commit), without running git."""
+        value = self._read(self.git_dir, "HEAD") or ""
+        if not value.startswith("ref: "):
+            return None, value or None
+        ref = value[5:]
+        sha = self._read(self.git_dir, ref) or self._read(self.common_dir, ref)
+        if sha is None:
+            for line in (self._read(self.common_dir, "packed-refs") or "").splitlines():
+                if line.endswith(" " + ref):
+                    sha = line.split(" ", 1)[0]
+                    break
+        return ref[len("refs/heads/"):] if ref.startswith("refs/heads/") else ref, sha
+
+    # ---- status -------------------------------------------------------------
+    def _status_key(self) -> Tuple:
+        try:
+            st = os.stat(os.path.join(self.git_dir, "index"))
+            index = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            index = (0, 0)
+        return self.head() + index
+
+    def status(self, refresh: bool = False) -> Status:
+        cached = self._status
+        if (not refresh and cached and cached[0] == self._status_key()
+                and time.monotonic() - cached[1] < STATUS_TTL):
+            self.stats["status_hits"] += 1
+            return cached[2]
+        out = subprocess.run(["git", "status", "--porcelain=v2", "--branch", "-z"], cwd=self.root,
+                             capture_output=True, check=True).stdout
+        self.stats["status_runs"] += 1
+        status = parse_status(out)
+        # status may have refreshed the index on the way; key on what it left behind
+        self._status = (self._status_key(), time.monotonic(), status)
+        return status
+
+    # ---- history ------------------------------------------------------------
+    def commit(self, name: str = "HEAD") -> Optional[Commit]:
+        obj = self.cat.read(name)
+        if obj is None or obj[1] != "commit":
+            return None
+        return parse_commit(obj[0], obj[2])
+
+    def log(self, n: int = 5, start: str = "HEAD") -> List[Commit]:
+        """The last n commits along first parents."""
+        out: List[Commit] = []
+        c = self.commit(start)
+        while c and len(out) < n:
+            out.append(c)
+            c = self.commit(c.parents[0]) if c.parents else None
+        return out
+
+
+# ---- spoken summaries -------------------------------------------------------------
+def _names(paths: List[str], top: int) -> str:
+    shown = ", ".join(paths[:top])
+    return f"{shown} and {len(paths) - top} more" if len(paths) > top else shown
+
+
+def _ago(ts: int, now: Optional[float] = None) -> str:
+    seconds = max(0, int((now or time.time()) - ts))
+    for unit, size in (("day", 86400), ("hour", 3600), ("minute", 60)):
+        if seconds >= size:
+            n = seconds // size
+            return f"{n} {unit}{'s' if n != 1 else ''} ago"
+    return "just now"
+
+
+def speak_status(status: Status, top: int = TOP) -> str:
+    head = f"On branch {status.branch}" if status.branch else f"Detached at {(status.oid or '')[:7]}"
+    if status.upstream and (status.ahead or status.behind):
+        sides = [f"{n} {word}" for n, word in ((status.ahead, "ahead"), (status.behind, "behind")) if n]
+        head += f", {' and '.join(sides)} of {status.upstream}"
+    groups = {k: v for k, v in status.groups().items() if v}
+    if not groups:
+        return head + ". Working tree clean."
+    counts = ", ".join(f"{len(v)} {k}" for k, v in groups.items())
+    lines = [f"{head}. {counts}."]
+    lines += [f"{k.capitalize()}: {_names(v, top)}." for k, v in groups.items()]
+    return " ".join(lines)
+
+
+def speak_commit(c: Optional[Commit], now: Optional[float] = None) -> str:
+    if c is None:
+        return "No commits yet."
+    return f"Last commit {c.sha[:7]} by {c.author}, {_ago(c.when, now)}: {c.subject}"
+
+
+def speak_log(commits: List[Commit], now: Optional[float] = None) -> str:
+    if not commits:
+        return "No commits yet."
+    items = "; ".join(f"{c.subject} ({c.author}, {_ago(c.when, now)})" for c in commits)
+    return f"Last {len(commits)} commit{'s' if len(commits) != 1 else ''}: {items}."
+
+
+_backends: Dict[str, GitBackend] = {}
+
+
+def get_backend(path: str = ".") -> GitBackend:
+    key = os.path.abspath(path)
+    if key not in _backends:
+        _backends[key] = GitBackend(path)
+    return _backends[key]
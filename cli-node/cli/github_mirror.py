@@ -0,0 +1,146 @@
+# github_mirror.py
+# Local mirror of a repo's open issues for the voice GitHub agent.
+# Refreshes with conditional requests (If-None-Match -> 304, which GitHub does not count
+# against the rate limit) and fetches Link-paginated pages concurrently.
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from cache_utils import get_cache_dir
+
+GITHUB_API = os.environ.get("GITHUB_API", "https://api.github.com")
+PER_PAGE = 100
+TIMEOUT = 10
+
+
+def _slim(issue: dict) -> dict:
+    # Keep only what list/search needs; the mirror file stays small
+    return {
+        "number": issue["number"],
+        "title": issue.get("title") or "",
+        "body": (issue.get("body") or "")[:500],
+        "labels": [l.get("name") for l in issue.get("labels", []) if isinstance(l, dict)],
+        "pull_request": "pull_request" in issue,
+    }
+
+
+def _issues_only(items: List[dict]) -> List[dict]:
+    # the issues endpoint lists pull requests too; the mirror keeps them so page ETags still match
+    return [i for i in items if not i.get("pull_request")]
+
+
+def _last_page(resp: requests.Response) -> Optional[int]:
+    last = resp.links.get("last", {}).get("url")
+    if not last:
+        return None
+    try:
+        return int(parse_qs(urlparse(last).query)["page"][0])
+    except (KeyError, ValueError):
+        return None
+
+
+class IssueMirror:
+    def __init__(self, repo: str, token: Optional[str] = None, api: str = GITHUB_API,
+                 path: Optional[str] = None, workers: int = 4):
+        self.repo = repo
+        self.api = api.rstrip("/")
+        self.path = Path(path) if path else get_cache_dir() / "github" / (repo.replace("/", "__") + ".json")
+        self.workers = workers
+        self.session = requests.Session()
+        self.session.headers["Accept"] = "application/vnd.github.v3+json"
+        if token:
+            self.session.headers["Authorization"] = f"token {token}"
+        self.stats = {"requests": 0, "not_modified": 0}
+        self._lock = threading.Lock()
+        self.pages, self.last = self._load()
+
+    # ---- storage ------------------------------------------------------------
+    def _load(self):
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            return data.get("pages", {}), data.get("last", 1)
+        except Exception:
+            return {}, 1
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"repo": self.repo, "last": self.last, "pages": self.pages},
+                                  ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    # ---- fetching -----------------------------------------------------------
+    def _url(self, page: int) -> str:
+        return f"{self.api}/repos/{self.repo}/issues?state=open&per_page={PER_PAGE}&page={page}"
+
+    def _fetch(self, page: int):
+        cached = self.pages.get(str(page))
+        headers = {"If-None-Match": cached["etag"]} if cached and cached.get("etag") else {}
+        r = self.session.get(self._url(page), headers=headers, timeout=TIMEOUT)
+        not_modified = r.status_code == 304 and cached is not None and "items" in cached
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["not_modified"] += not_modified
+        if not_modified:
+            return cached, r
+        if r.status_code == 304:
+            # a 304 the mirror has no copy of that page for: ask again without the validator
+            r = self.session.get(self._url(page), headers={"If-None-Match": None}, timeout=TIMEOUT)
+            with self._lock:
+                self.stats["requests"] += 1
+        r.raise_for_status()
+        return {"etag": r.headers.get("ETag"), "items": [_slim(i) for i in r.json()]}, r
+
+    def refresh(self) -> Iterator[List[dict]]:
+        """
+        Yield each page's issues (without pull requests) in page order as soon as it is available,
+        so callers can start speaking page 1 while the rest are still in flight. The mirror is saved
+        once every page has been seen; stopping early keeps the previous mirror.
+        """
+        first, resp = self._fetch(1)
+        last = _last_page(resp) if resp.status_code == 200 else self.last
+        last = last or 1
+        pages: Dict[str, dict] = {"1": first}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self._fetch, p) for p in range(2, last + 1)]
+            yield _issues_only(first["items"])
+            for page, fut in enumerate(futures, start=2):
+                pages[str(page)] = fut.result()[0]
+                yield _issues_only(pages[str(page)]["items"])
+
+        # Issues reopened further back can grow the list without touching page 1
+        page = last
+        while len(pages[str(page)]["items"]) >= PER_PAGE:
+            page += 1
+            pages[str(page)] = self._fetch(page)[0]
+            yield _issues_only(pages[str(page)]["items"])
+
+        # a trailing empty page is kept too, so the next refresh gets a 304 for it
+        self.pages = pages
+        self.last = page
+        self._save()
+
+    # ---- queries (answered from the mirror) ---------------------------------
+    def issues(self, refresh: bool = True, after_page: int = 0) -> List[dict]:
+        """Open issues in page order; after_page skips the pages a caller has already been given."""
+        if refresh:
+            for _ in self.refresh():
+                pass
+        return [i for p in sorted(self.pages, key=int) if int(p) > after_page
+                for i in _issues_only(self.pages[p]["items"])]
+
+    def search(self, query: str, refresh: bool = True) -> List[dict]:
+        words = query.lower().split()
+        return [i for i in self.issues(refresh=refresh)
+                if all(w in f"{i['title']} {i['body']} {' '.join(i['labels'])}".lower() for w in words)]
+
+
+def format_issues(issues: List[dict]) -> str:
+    return "\n".join(f"#{i['number']}: {i['title']}" for i in issues)
@@ -4,38 +4,39 @@
 # Does NOT modify or break any existing code
 
 import os
+from functools import lru_cache
 from langchain_community.llms import HuggingFacePipeline
 from transformers import pipeline
 from vosk_stt import transcribe_vosk
-from vibe_stream import stream as murf_stream
+from speaker import speak
+from code_summaries import Summarizer, get_cache
 
 # Load a local HuggingFace model (e.g., distilgpt2 for demo)
+@lru_cache(maxsize=1)
 def get_local_llm():
     pipe = pipeline("text-generation", model="distilgpt2")
     return HuggingFacePipeline(pipeline=pipe)
 
+# Per-symbol summaries cached by source hash; the model is only loaded when something changed
+def get_summarizer():
+    return Summarizer(lambda prompt: get_local_llm()(prompt), get_cache())
+
 # Advanced agent: supports Q&A, code editing, and file creation
 def agent_action(action, target_file=None, code_snippet=None):
-    llm = get_local_llm()
     result = ""
     if action == "summarize":
-        context = ""
         if target_file and os.path.isfile(target_file):
-            with open(target_file, encoding="utf-8", errors="ignore") as f:
-                context = f.read(2000)
-        prompt = f"Summarize the following code:\n{context}\nSummary:"
-        result = llm(prompt)
+            result = get_summarizer().summarize_file(target_file)["summary"]
+        else:
+            result = get_local_llm()("Summarize the following code:\n\nSummary:")
     elif action == "add_code" and target_file and code_snippet:
         # Add code snippet to file (append, never overwrite)
         with open(target_file, "a", encoding="utf-8") as f:
             f.write(f"\n# Added by LangChain agent\n{code_snippet}\n")
         result = f"Code added to {target_file}."
     elif action == "refactor" and target_file:
-        # Generate refactored code (does not overwrite)
-        with open(target_file, encoding="utf-8", errors="ignore") as f:
-            context = f.read(2000)
-        prompt = f"Refactor the following code for best practices:\n{context}\nRefactored code:"
-        result = llm(prompt)
+        # Generate refactored code symbol by symbol (does not overwrite)
+        result = get_summarizer().refactor_file(target_file)
     else:
         result = "Unknown action or missing parameters."
     return result
@@ -54,7 +55,7 @@ def voice_agent():
     else:
         result = "Command not recognized. Try 'summarize', 'add function', or 'refactor'."
     print("Agent result:", result)
-    murf_stream(prompt=result, lang="en", stt_input=False)
+    speak(result)
 
 if __name__ == "__main__":
     voice_agent()
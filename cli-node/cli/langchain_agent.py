@@ -6,7 +6,7 @@ import os
 from langchain.llms import HuggingFacePipeline
 from transformers import pipeline
 from vosk_stt import transcribe_vosk
-from vibe_stream import stream as murf_stream
+from speaker import speak
 
 # Load a local HuggingFace model (e.g., distilgpt2 for demo)
 def get_local_llm():
@@ -32,7 +32,7 @@ def voice_code_qa():
     answer = answer_code_question(question, file_path=os.path.join("..", "local-service", "app.py"))
     print("Answer:", answer)
     # Speak answer with Murf TTS (if available)
-    murf_stream(prompt=answer, lang="en", stt_input=False)
+    speak(answer)
 
 if __name__ == "__main__":
     voice_code_qa()
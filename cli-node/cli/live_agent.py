@@ -10,7 +10,7 @@ import time
 
 
 
-def listen_vosk():
+def listen_vosk(turn=None):
     try:
         from vosk_stt import transcribe_vosk
     except ImportError:
@@ -22,13 +22,15 @@ def listen_vosk():
     except Exception:
         duration = 5
     try:
-        text = transcribe_vosk(duration=duration)
-        return text
+        if turn is None:
+            return transcribe_vosk(duration=duration)
+        with turn.span("stt"):          # Vosk records and recognizes in one call
+            return transcribe_vosk(duration=duration)
     except Exception as e:
         print(f"Vosk error: {e}")
         return None
 
-def listen_google():
+def listen_google(turn=None):
     recognizer = sr.Recognizer()
     user_input = input("Type 's' to speak, 'q' to quit, or Enter to skip: ").strip().lower()
     if user_input == "q":
@@ -39,9 +41,15 @@ def listen_google():
     with sr.Microphone() as source:
         print("Listening...")
         recognizer.pause_threshold = 1.0  # Waits longer for pauses
+        t = turn.now() if turn else None
         audio = recognizer.listen(source)
+        if turn:
+            turn.mark("stt capture", t)
     try:
+        t = turn.now() if turn else None
         text = recognizer.recognize_google(audio)
+        if turn:
+            turn.mark("stt recognition", t)
         print("You said:", text)
         return text
     except sr.UnknownValueError:
@@ -81,7 +89,133 @@ def extract_lang_from_prompt(prompt):
         return LANG_MAP.get(lang_word)
     return None
 
-def tts_stream(prompt, lang=None, voice=None, style=None, fmt="WAV"):
+# Each turn asks the service to answer within this budget (Gemini + first audio)
+TURN_DEADLINE_MS = 60000
+
+class LiveSession:
+    """
+    One /ws/stream session for the whole conversation. The service keeps the history,
+    file context and voice, so each turn is a single message; the audio device stays open.
+    """
+    def __init__(self, ws_url="ws://127.0.0.1:8001/ws/stream", lang=None, voice=None, style=None, fmt="WAV",
+                 codec=os.getenv("VIBE_CODEC"), sample_rate=os.getenv("VIBE_SAMPLE_RATE")):
+        import asyncio
+        from audio_codec import request_fields
+        self.ws_url = ws_url
+        self.cfg = {"language": lang, "voice_id": voice, "style": style, "format": fmt,
+                    **request_fields(codec, sample_rate)}
+        self.loop = asyncio.new_event_loop()
+        self.ws = None
+        self.pa = None
+        self.stream = None
+        self.rate = None
+        self.turns = 0
+        self.played = False     # the current turn's audio has started playing
+
+    async def _connect(self):
+        import json
+        from service_socket import ws_connect
+        self.ws = await ws_connect(self.ws_url)
+        await self.ws.send(json.dumps({"session": self.cfg}))
+        data = json.loads(await self.ws.recv())
+        if "error" in data:
+            raise RuntimeError(data["error"])
+
+    def _output(self, rate):
+        import pyaudio
+        if self.stream is None or self.rate != rate:
+            if self.stream:
+                self.stream.stop_stream()
+                self.stream.close()
+            self.pa = self.pa or pyaudio.PyAudio()
+            self.stream = self.pa.open(format=pyaudio.paInt16, channels=1, rate=rate, output=True)
+            self.rate = rate
+        return self.stream
+
+    async def _turn(self, prompt, lang, files, timings):
+        import json, base64
+        from audio_codec import decoder
+        if self.ws is None:
+            t = timings.now() if timings else None
+            await self._connect()
+            if timings:
+                timings.mark("ws connect", t)
+        self.turns += 1
+        self.played = False
+        sid = f"t{self.turns}"
+        turn = {"id": sid, "text": prompt, "language": lang, "deadline_ms": TURN_DEADLINE_MS}
+        if files:
+            turn["files"] = files
+        if timings:
+            turn.update(timings.request_fields())
+        await self.ws.send(json.dumps(turn))
+        if timings:
+            timings.sent()
+        stream = None
+        first = True
+        decode = None
+        play_t = None
+        while True:
+            data = json.loads(await self.ws.recv())
+            if data.get("id") != sid:
+                continue
+            if "error" in data:
+                print("Error:", data["error"])
+                return
+            if "info" in data:
+                if timings:
+                    timings.mark("info")
+                transcript = (data["info"].get("transcript") or "").strip()
+                if transcript:
+                    print("\n--- Transcript ---\n" + transcript + "\n")
+                stream = self._output(int(data["info"].get("sample_rate", 44100)))
+                decode = decoder(data["info"])
+                continue
+            if "audio_b64" in data:
+                if timings and play_t is None:
+                    timings.mark("first audio")
+                    play_t = timings.now()
+                chunk = base64.b64decode(data["audio_b64"])
+                if decode:
+                    chunk = decode(chunk)
+                elif first and len(chunk) > 44:
+                    chunk = chunk[44:]
+                    first = False
+                if stream:
+                    stream.write(chunk)
+                    self.played = True
+                continue
+            if data.get("final"):
+                if timings:
+                    timings.server_timings(data)
+                    if play_t is not None:
+                        timings.mark("playback", play_t)     # the output stream stays open between turns
+                return
+
+    def say(self, prompt, lang=None, files=None, timings=None):
+        import websockets
+        try:
+            self.loop.run_until_complete(self._turn(prompt, lang, files, timings))
+        except websockets.ConnectionClosed:
+            self.ws = None
+            if self.played:
+                # part of the answer was heard: saying it again would repeat it, so the turn counts as delivered
+                print("(Connection lost; the rest of this answer was cut off.)")
+                return
+            # service restarted before this turn was heard: open a fresh session and retry it once
+            self.loop.run_until_complete(self._turn(prompt, lang, files, timings))
+
+    def close(self):
+        if self.ws is not None:
+            self.loop.run_until_complete(self.ws.close())
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+        if self.pa:
+            self.pa.terminate()
+        self.loop.close()
+
+def tts_stream(prompt, session, lang=None, timings=None):
     # Detect language from prompt if not explicitly set
     detected_lang = extract_lang_from_prompt(prompt)
     if detected_lang:
@@ -89,6 +223,7 @@ def tts_stream(prompt, lang=None, voice=None, style=None, fmt="WAV"):
     # Detect file mentions in the prompt (e.g., "app.py", "explain local-service/app.py")
     file_pattern = re.compile(r"([\w\-/\\]+\.py)", re.IGNORECASE)
     files = []
+    t = timings.now() if timings else None
     for match in file_pattern.findall(prompt):
         # Try to resolve relative to project root or cli dir
         if os.path.isfile(match):
@@ -98,59 +233,14 @@ def tts_stream(prompt, lang=None, voice=None, style=None, fmt="WAV"):
             possible = os.path.join("..", "local-service", match)
             if os.path.isfile(possible):
                 files.append(possible)
-    # Call your FastAPI backend for TTS (adjust endpoint as needed)
-    ws_url = "ws://127.0.0.1:8001/ws/stream"
-    import websockets, asyncio, json, base64
-    async def run():
-        payload = {"text": prompt, "language": lang, "voice_id": voice, "style": style, "format": fmt}
-        if files:
-            payload["files"] = files
-        async with websockets.connect(ws_url) as ws:
-            await ws.send(json.dumps(payload))
-            pa = None
-            stream = None
-            first = True
-            import pyaudio
-            while True:
-                msg = await ws.recv()
-                data = json.loads(msg)
-                if "error" in data:
-                    print("Error:", data["error"])
-                    break
-                if "info" in data:
-                    info = data["info"]
-                    transcript = (info.get("transcript") or "").strip()
-                    if transcript:
-                        print("\n--- Transcript ---\n" + transcript + "\n")
-                    pa = pyaudio.PyAudio()
-                    stream = pa.open(
-                        format=pyaudio.paInt16,
-                        channels=1,
-                        rate=int(info.get("sample_rate", 44100)),
-                        output=True,
-                    )
-                    continue
-                if "audio_b64" in data:
-                    chunk = base64.b64decode(data["audio_b64"])
-                    if first and len(chunk) > 44:
-                        chunk = chunk[44:]
-                        first = False
-                    if stream:
-                        stream.write(chunk)
-                    continue
-                if data.get("final"):
-                    break
-            if stream:
-                stream.stop_stream()
-                stream.close()
-            if pa:
-                pa.terminate()
-    asyncio.run(run())
-
-
-
-
-def live_agent():
+    if timings:
+        timings.mark("file scan", t)
+    session.say(prompt, lang=lang, files=files, timings=timings)
+
+
+
+
+def live_agent(timings=False, trace=None):
     print("Live Agent Conversation (STT + TTS)")
     print("Default: Vosk STT (offline, more robust for CLI)")
     print("Type 'g' to use Google STT (online) for this session, or Enter to use Vosk.")
@@ -161,9 +251,18 @@ def live_agent():
     else:
         stt_func = listen_vosk
         print("Using Vosk STT (offline)")
+    session = LiveSession()
+    try:
+        _conversation(stt_func, session, timings, trace)
+    finally:
+        session.close()
+
+def _conversation(stt_func, session, timings=False, trace=None):
+    from turn_timings import TurnTimings
     while True:
         while True:
-            user_text = stt_func()
+            turn = TurnTimings("live_agent", show=timings, trace=trace)
+            user_text = stt_func(turn)
             if user_text == "__QUIT__":
                 print("Goodbye!")
                 return
@@ -180,8 +279,23 @@ def live_agent():
         if user_text.lower() in ["exit", "quit", "stop"]:
             print("Goodbye!")
             break
-        tts_stream(user_text)
+        try:
+            tts_stream(user_text, session, timings=turn if turn.enabled else None)
+        finally:
+            turn.finish()
         time.sleep(0.5)
 
 if __name__ == "__main__":
-    live_agent()
+    import argparse
+    parser = argparse.ArgumentParser(description="Live voice conversation (STT + TTS)")
+    parser.add_argument("--profile", metavar="PATH", default=os.getenv("VIBE_PROFILE"),
+                        help="Sample the session and write PATH.folded (flamegraph) and PATH.txt")
+    parser.add_argument("--timings", action="store_true",
+                        help="Print where each turn's time went (client and service stages)")
+    parser.add_argument("--trace", metavar="PATH", default=os.getenv("VIBE_TRACE"),
+                        help="Append each turn's stage timings to this JSONL file")
+    args = parser.parse_args()
+    if args.profile:
+        import cli_profile
+        cli_profile.start(args.profile)
+    live_agent(timings=args.timings, trace=args.trace)
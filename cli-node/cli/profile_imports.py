@@ -0,0 +1,52 @@
+# profile_imports.py
+# Import-time profile for the CLIs and the service.
+#   python profile_imports.py                 # vibe, vibe_stream, app
+#   python profile_imports.py app --top 25
+# Each target is imported in a fresh interpreter under `python -X importtime`;
+# prints the slowest imports by cumulative time and the total for the target.
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+import typer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.abspath(os.path.join(HERE, "..", "..", "local-service"))
+
+# module -> directory it is imported from
+TARGETS = {"vibe": HERE, "vibe_stream": HERE, "app": SERVICE_DIR}
+
+APP = typer.Typer(add_completion=False)
+
+
+def import_times(module: str, cwd: str) -> List[Tuple[int, int, str]]:
+    """(self_us, cumulative_us, name) for every import made by `import module`."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=cwd, capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cum_us), name.rstrip()))
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-800:]}")
+    return rows
+
+
+@APP.command()
+def main(
+    modules: List[str] = typer.Argument(None, help="Modules to profile (default: vibe vibe_stream app)"),
+    top: int = typer.Option(15, "--top", help="How many of the slowest imports to show"),
+):
+    for module in modules or list(TARGETS):
+        rows = import_times(module, TARGETS.get(module, HERE))
+        total = next((cum for _, cum, name in rows if name.strip() == module), 0)
+        typer.secho(f"\n{module}: {total / 1000:.1f} ms", fg="cyan")
+        for self_us, cum_us, name in sorted(rows, key=lambda r: r[1], reverse=True)[:top]:
+            typer.echo(f"  {cum_us / 1000:8.1f} ms cum {self_us / 1000:7.1f} ms self  {name}")
+
+
+if __name__ == "__main__":
+    APP()
@@ -0,0 +1,260 @@
+# semantic_cache.py
+# Near-duplicate layer over the exact transcript cache (cache_utils.py).
+# Spoken prompts come through STT, so "explain app.py in spanish", "Explain app.py in Spanish." and
+# "um explain the app.py in spanish" should find the same cached answer. Each prompt is normalized
+# (case, punctuation, filler words), turned into a character 3-5-gram TF-IDF vector (hashed into
+# DIM buckets, NumPy only, nothing remote) and compared by cosine similarity with the prompts
+# answered before in the same scope: locale, voice and a hash of the context files' contents.
+# A match at or above THRESHOLD reuses that entry's cache key, and only between prompts with the same
+# anchors: numbers, file names and identifiers must be equal and so must the number of negations, since
+# "line 10" / "line 100" or "delete the cache" / "do not delete the cache" look alike as n-grams.
+# The index lives in _cache/semantic_index.jsonl, so answers carry over between sessions.
+# `python vibe_stream.py cache-report` prints the precision / hit-rate trade-off per threshold.
+import hashlib
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from cache_utils import get_cache_dir
+
+THRESHOLD = float(os.getenv("VIBE_SEMANTIC_THRESHOLD", "0.8"))
+DIM = 4096
+NGRAMS = (3, 4, 5)
+INDEX_FILE = "semantic_index.jsonl"
+
+# words STT adds or drops between takes of the same question
+FILLERS = {
+    "um", "uh", "erm", "hmm", "like", "so", "okay", "ok", "please", "hey", "vibe", "just",
+    "the", "a", "an", "can", "could", "would", "you", "me", "for", "us",
+}
+
+_FILE_DOT = re.compile(r"(?<=\w)\.(?=\w)")
+_SPOKEN_DOT = re.compile(r"\b(\w+) dot (py|js|ts|md|json|txt|toml|yaml|yml)\b")     # "app dot py"
+_NOT_WORD = re.compile(r"[^\w\x00]+")
+_CAMEL = re.compile(r"\b[A-Za-z0-9]*[a-z0-9][A-Z]\w*")       # getUserName, toJSON
+_NEGATION = re.compile(r"\b(?:not|no|never|none|nothing|nor|without|cannot|dont|doesnt|isnt|arent|wont|cant|"
+                       r"shouldnt|didnt)\b|n't\b")
+
+
+def normalize(prompt: str) -> str:
+    """Lower-case, accent-folded words without punctuation or filler; "app.py" keeps its dot."""
+    text = unicodedata.normalize("NFKD", prompt or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = _FILE_DOT.sub("\x00", _SPOKEN_DOT.sub(lambda m: f"{m[1]}\x00{m[2]}", text))
+    words = [w.replace("\x00", ".") for w in _NOT_WORD.sub(" ", text).split()]
+    words = [w for w in words if w not in FILLERS]
+    return " ".join(words)
+
+
+def anchors(prompt: str) -> Tuple[Tuple[str, ...], int]:
+    """(numbers, file names and identifiers; negation count): prompts must agree on these to match."""
+    words = {w for w in normalize(prompt).split() if "." in w or "_" in w or any(c.isdigit() for c in w)}
+    words |= {m.lower() for m in _CAMEL.findall(prompt or "")}
+    return tuple(sorted(words)), len(_NEGATION.findall((prompt or "").lower()))
+
+
+def _grams(text: str) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + n] for n in NGRAMS for i in range(len(padded) - n + 1))
+
+
+def _buckets(grams: Counter) -> Dict[int, int]:
+    out: Dict[int, int] = {}
+    for g, c in grams.items():
+        b = zlib.crc32(g.encode("utf-8")) % DIM
+        out[b] = out.get(b, 0) + c
+    return out
+
+
+def files_fingerprint(files: Optional[Iterable[str]]) -> str:
+    """Hash of the context files' contents: an edited file is a different question."""
+    h = hashlib.sha1()
+    for path in sorted(set(files or [])):
+        h.update(os.path.abspath(path).encode("utf-8"))
+        try:
+            with open(path, "rb") as f:
+                h.update(hashlib.sha1(f.read()).digest())
+        except OSError:
+            h.update(b"missing")
+    return h.hexdigest()[:16]
+
+
+def scope_of(language: Optional[str], voice_id: Optional[str], files: Optional[Iterable[str]]) -> str:
+    return f"{(language or '').lower()}|{voice_id or ''}|{files_fingerprint(files)}"
+
+
+class Match(NamedTuple):
+    key: str
+    score: float
+    prompt: str
+
+
+class SemanticIndex:
+    """In-memory nearest-neighbour index over answered prompts, optionally backed by a JSONL file."""
+
+    def __init__(self, path: Optional[str] = None, threshold: float = THRESHOLD):
+        import numpy as np
+        self.np = np
+        self.path = path
+        self.threshold = threshold
+        self.entries: List[Dict[str, str]] = []
+        self.counts: List[Dict[int, int]] = []
+        self.anchors: List[Tuple[Tuple[str, ...], int]] = []
+        self.hits = 0
+        self.lookups = 0
+        self._matrix = None
+        self._idf = None
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    rec = json.loads(line)
+                    if "key" in rec:
+                        self._remember(rec)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _remember(self, rec: Dict[str, str]):
+        self.entries.append(rec)
+        self.counts.append(_buckets(_grams(normalize(rec["prompt"]))))
+        self.anchors.append(anchors(rec["prompt"]))
+        self._matrix = None
+
+    def add(self, key: str, prompt: str, scope: str):
+        rec = {"key": key, "prompt": prompt, "scope": scope, "ts": round(time.time(), 3)}
+        self._remember(rec)
+        self._append(rec)
+
+    def _append(self, rec: Dict):
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def _vector(self, counts: Dict[int, int]):
+        np = self.np
+        v = np.zeros(DIM, np.float32)
+        if counts:
+            idx = np.fromiter(counts.keys(), np.int64, len(counts))
+            tf = np.fromiter(counts.values(), np.float32, len(counts))
+            v[idx] = (1 + np.log(tf)) * self._idf[idx]
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else v
+
+    def _build(self):
+        np = self.np
+        df = np.zeros(DIM, np.float32)
+        for counts in self.counts:
+            df[list(counts)] += 1
+        n = len(self.counts)
+        self._idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        self._matrix = np.stack([self._vector(c) for c in self.counts]) if n else np.zeros((0, DIM), np.float32)
+
+    def nearest(self, prompt: str, scope: Optional[str] = None) -> Optional[Match]:
+        """Best match in the scope with the same anchors, regardless of threshold (None if there is none)."""
+        want = anchors(prompt)
+        rows = [i for i, e in enumerate(self.entries)
+                if (scope is None or e["scope"] == scope) and self.anchors[i] == want]
+        if not rows:
+            return None
+        if self._matrix is None:
+            self._build()
+        q = self._vector(_buckets(_grams(normalize(prompt))))
+        scores = self._matrix[rows] @ q
+        best = int(scores.argmax())
+        entry = self.entries[rows[best]]
+        return Match(entry["key"], float(scores[best]), entry["prompt"])
+
+    def lookup(self, prompt: str, scope: str) -> Optional[Match]:
+        self.lookups += 1
+        match = self.nearest(prompt, scope)
+        if match is None or match.score < self.threshold:
+            return None
+        self.hits += 1
+        self._append({"hit": match.key, "score": round(match.score, 4), "prompt": prompt, "ts": round(time.time(), 3)})
+        return match
+
+
+_index: Optional[SemanticIndex] = None
+
+
+def get_index() -> SemanticIndex:
+    global _index
+    if _index is None:
+        _index = SemanticIndex(str(get_cache_dir() / INDEX_FILE))
+    return _index
+
+
+# ---- precision / hit-rate report ----------------------------------------------------
+# (answered prompt, later prompt, same question?) — STT variants and near misses
+LABELED_PAIRS: List[Tuple[str, str, bool]] = [
+    ("explain app.py in spanish", "Explain app.py in Spanish.", True),
+    ("explain app.py in spanish", "um explain the app.py in spanish", True),
+    ("explain app.py in spanish", "can you explain app.py in spanish please", True),
+    ("what does quota.py do", "What does quota dot py do?", True),
+    ("what does quota.py do", "so what does the quota.py do", True),
+    ("summarize the readme", "Summarize the README.", True),
+    ("list the open pull requests", "list open pull request", True),
+    ("how do i run the tests", "how do I run the test", True),
+    ("explain the websocket handler", "explain the web socket handler", True),
+    ("what does line 10 of app.py do", "What does line 10 of app dot py do?", True),
+    ("delete the cache directory", "please delete the cache directory", True),
+    ("explain app.py in spanish", "explain app.py in french", False),
+    ("explain app.py in spanish", "explain tts.py in spanish", False),
+    ("what does quota.py do", "what does upstream.py do", False),
+    ("summarize the readme", "summarize the changelog", False),
+    ("list the open pull requests", "list the closed issues", False),
+    ("how do i run the tests", "how do i write the tests", False),
+    ("explain the websocket handler", "explain the http handler", False),
+    ("delete the cache directory", "do not delete the cache directory", False),
+    ("delete the cache directory", "don't delete the cache directory", False),
+    ("what does line 10 of app.py do", "what does line 100 of app.py do", False),
+    ("what does line 10 of app.py do", "what does line 10 of app.ts do", False),
+    ("explain getUserName in app.py", "explain getUserId in app.py", False),
+    ("explain get_user_name in app.py", "explain get_user_names in app.py", False),
+    ("explain function foo in app.py", "explain function foo in app.py but shorter", False),
+]
+
+
+def evaluate(pairs: Sequence[Tuple[str, str, bool]] = LABELED_PAIRS,
+             thresholds: Sequence[float] = (0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95)) -> List[Dict[str, float]]:
+    """
+    Index every answered prompt once, look up every later prompt, and per threshold report
+    precision (hits that found the right question) and hit rate (same-question prompts served).
+    """
+    index = SemanticIndex()
+    for prompt in dict.fromkeys(a for a, _, _ in pairs):
+        index.add(prompt, prompt, "")
+    best = [(index.nearest(b, ""), a, same) for a, b, same in pairs]
+    positives = sum(1 for _, _, same in pairs if same) or 1
+    rows = []
+    for t in thresholds:
+        hits = [(m.key == a and same) for m, a, same in best if m and m.score >= t]
+        correct = sum(hits)
+        rows.append({"threshold": t, "precision": round(correct / len(hits), 3) if hits else 1.0,
+                     "hit_rate": round(correct / positives, 3), "hits": len(hits)})
+    return rows
+
+
+def report(index: Optional[SemanticIndex] = None) -> str:
+    lines = ["threshold  precision  hit rate  (labeled STT variants)"]
+    for r in evaluate():
+        mark = "  <- current" if math.isclose(r["threshold"], THRESHOLD) else ""
+        lines.append(f"{r['threshold']:9.2f}  {r['precision']:9.2f}  {r['hit_rate']:8.2f}{mark}")
+    index = index or get_index()
+    if index.path and os.path.exists(index.path):
+        scores = []
+        with open(index.path, encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                if "hit" in rec:
+                    scores.append(rec["score"])
+        lines.append("")
+        lines.append(f"index: {len(index)} answered prompts, {len(scores)} near-duplicate hits served"
+                     + (f" (lowest score {min(scores):.2f})" if scores else ""))
+    return "\n".join(lines)
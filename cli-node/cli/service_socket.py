@@ -0,0 +1,137 @@
+# service_socket.py
+# Unix-domain-socket transport to the local service.
+# `python serve.py` (local-service) listens on a Unix socket as well as TCP. When a CLI's service URL
+# points at this host and that socket answers, its WebSocket and HTTP calls go over the socket instead
+# of loopback TCP: no TCP handshake, no ACK/Nagle traffic and less kernel work per frame. A remote URL,
+# a missing socket, no AF_UNIX (Windows) or VIBE_UDS=off keep plain TCP.
+# The socket is named after the URL's port, $XDG_RUNTIME_DIR/vibe/8001.sock (or /tmp/vibe-<uid>/8001.sock),
+# so several services on one box never answer each other's clients; VIBE_UDS names it explicitly.
+# A socket is only used when this user owns it and its directory, and nobody else can write to that
+# directory: another user on a shared box could otherwise create /tmp/vibe-<uid> first and listen there.
+import os
+import socket
+import stat
+import tempfile
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+LOOPBACK = {"127.0.0.1", "localhost", "::1"}
+PROBE_TIMEOUT = 0.2
+
+_answers: Dict[str, bool] = {}
+_sessions: Dict[str, object] = {}
+
+
+def socket_path(port: int = 8001) -> Optional[str]:
+    """Where the service for `port` listens, or None when the Unix socket is turned off."""
+    value = os.getenv("VIBE_UDS")
+    if not hasattr(socket, "AF_UNIX") or (value is not None and value.strip().lower() in ("", "0", "off")):
+        return None
+    if value:
+        return value
+    runtime = os.getenv("XDG_RUNTIME_DIR")
+    folder = os.path.join(runtime, "vibe") if runtime else os.path.join(tempfile.gettempdir(), f"vibe-{os.getuid()}")
+    return os.path.join(folder, f"{port}.sock")
+
+
+def _trusted(path: str) -> bool:
+    """A socket this user created, in a directory only this user can write to."""
+    try:
+        st = os.lstat(path)
+        folder = os.lstat(os.path.dirname(path) or ".")
+    except OSError:
+        return False
+    uid = os.getuid()
+    return (stat.S_ISSOCK(st.st_mode) and st.st_uid == uid and stat.S_ISDIR(folder.st_mode)
+            and folder.st_uid == uid and not folder.st_mode & 0o022)
+
+
+def _probe(path: str) -> bool:
+    try:
+        if not _trusted(path):
+            return False
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(PROBE_TIMEOUT)
+            s.connect(path)
+        return True
+    except OSError:
+        return False
+
+
+def uds_for(url: str) -> Optional[str]:
+    """The Unix socket to reach `url` through, or None for TCP. Probed once per process."""
+    parts = urlsplit(url)
+    if parts.hostname not in LOOPBACK:
+        return None
+    path = socket_path(parts.port or (443 if parts.scheme in ("https", "wss") else 80))
+    if path is None:
+        return None
+    if path not in _answers:
+        _answers[path] = _probe(path)
+    return path if _answers[path] else None
+
+
+async def ws_connect(url: str, **kwargs):
+    """websockets.connect(url), over the Unix socket when the service has one; use as `async with await ...`."""
+    import websockets
+    path = uds_for(url)
+    if path:
+        try:
+            return await websockets.unix_connect(path, url, **kwargs)
+        except OSError:
+            _answers[path] = False                  # gone since the probe (service restarted on TCP only)
+    return await websockets.connect(url, **kwargs)
+
+
+def _unix_adapter(path: str, host: str, port: int):
+    import requests
+    from urllib3.connection import HTTPConnection
+    from urllib3.connectionpool import HTTPConnectionPool
+
+    class UnixConnection(HTTPConnection):
+        def _new_conn(self):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            if isinstance(self.timeout, (int, float)):
+                sock.settimeout(self.timeout)
+            try:
+                sock.connect(path)
+            except OSError:
+                sock.close()
+                raise
+            return sock
+
+    class UnixPool(HTTPConnectionPool):
+        ConnectionCls = UnixConnection
+
+    class UnixAdapter(requests.adapters.HTTPAdapter):
+        """Sends every request for one origin through the Unix socket; the Host header stays the URL's."""
+
+        def __init__(self):
+            super().__init__()
+            self.pool = UnixPool(host, port, maxsize=4)
+
+        def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+            return self.pool
+
+        def get_connection(self, url, proxies=None):
+            return self.pool
+
+        def close(self):
+            self.pool.close()
+            super().close()
+
+    return UnixAdapter()
+
+
+def session_for(url: str):
+    """A requests.Session for the service at `url` (kept per origin, so connections are reused)."""
+    import requests
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    session = _sessions.get(origin)
+    if session is None:
+        session = _sessions[origin] = requests.Session()
+        path = uds_for(url) if parts.scheme == "http" else None
+        if path:
+            session.mount(origin, _unix_adapter(path, parts.hostname, parts.port or 80))
+    return session
@@ -0,0 +1,170 @@
+# speaker.py
+# In-process speech queue for the voice agents.
+# speak(text) returns immediately; utterances play in order on a background thread that keeps
+# one /ws/stream connection (keep_open) and one PyAudio output stream for the whole process.
+import asyncio
+import atexit
+import base64
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Optional
+
+from audio_codec import decoder, request_fields
+from service_socket import ws_connect
+
+DEFAULT_WS = "ws://127.0.0.1:8001/ws/stream"
+DEADLINE_MS = 30000  # verbatim text: only TTS has to fit in it
+
+
+def strip_wav_header(chunk: bytes) -> bytes:
+    # Murf puts a RIFF header in front of the first frame; keep only the PCM after "data"+size
+    if not chunk.startswith(b"RIFF"):
+        return chunk
+    i = chunk.find(b"data", 12)
+    return chunk[i + 8:] if i >= 0 else chunk[44:]
+
+
+class Speaker:
+    def __init__(self, api_ws: str = DEFAULT_WS, lang: str = "en-US",
+                 voice: Optional[str] = None, style: Optional[str] = None,
+                 codec: Optional[str] = os.getenv("VIBE_CODEC"),
+                 sample_rate: Optional[int] = os.getenv("VIBE_SAMPLE_RATE")):
+        self.api_ws = api_ws
+        self.lang = lang
+        self.voice = voice
+        self.style = style
+        self.transport = request_fields(codec, sample_rate)
+        self._q: "queue.Queue[Optional[dict]]" = queue.Queue()
+        self._ws = None
+        self._pa = None
+        self._out = None
+        self._rate = None
+        self._thread = threading.Thread(target=self._worker, name="vibe-speaker", daemon=True)
+        self._thread.start()
+
+    def speak(self, text: str, lang: Optional[str] = None, voice: Optional[str] = None,
+              style: Optional[str] = None):
+        """Queue already-final text and return immediately."""
+        if text and text.strip():
+            self._q.put({"text": text, "language": lang or self.lang,
+                         "voice_id": voice or self.voice, "style": style or self.style})
+
+    def wait(self):
+        """Block until everything queued so far has been played."""
+        self._q.join()
+
+    def close(self):
+        """Finish the queued utterances, then release the connection and audio device."""
+        if self._thread.is_alive():
+            self._q.put(None)
+            self._thread.join()
+
+    # ---- background thread --------------------------------------------------
+    def _worker(self):
+        asyncio.run(self._loop())
+
+    async def _loop(self):
+        try:
+            while True:
+                item = await asyncio.to_thread(self._q.get)
+                try:
+                    if item is None:
+                        return
+                    await self._say(item)
+                except Exception as e:
+                    logging.error(f"Speaker error: {e}")
+                    await self._disconnect()
+                finally:
+                    self._q.task_done()
+        finally:
+            await self._disconnect()
+            if self._out:
+                self._out.stop_stream()
+                self._out.close()
+            if self._pa:
+                self._pa.terminate()
+
+    async def _send(self, payload: dict):
+        import websockets
+        # An older service closes after each request; reconnect once and carry on
+        for attempt in (0, 1):
+            try:
+                if self._ws is None:
+                    self._ws = await ws_connect(self.api_ws)
+                await self._ws.send(json.dumps(payload))
+                return
+            except websockets.ConnectionClosed:
+                self._ws = None
+                if attempt:
+                    raise
+
+    async def _disconnect(self):
+        if self._ws is not None:
+            try:
+                await self._ws.close()
+            except Exception:
+                pass
+            self._ws = None
+
+    def _output(self, rate: int):
+        import pyaudio
+        if self._out is not None and self._rate == rate:
+            return self._out
+        if self._pa is None:
+            self._pa = pyaudio.PyAudio()
+        if self._out is not None:
+            self._out.stop_stream()
+            self._out.close()
+        self._out = self._pa.open(format=pyaudio.paInt16, channels=1, rate=rate, output=True)
+        self._rate = rate
+        return self._out
+
+    async def _say(self, item: dict):
+        await self._send(dict(item, format="WAV", mode="verbatim", keep_open=True, deadline_ms=DEADLINE_MS,
+                              **self.transport))
+        out = None
+        first = True
+        decode = None
+        while True:
+            data = json.loads(await self._ws.recv())
+            if "error" in data:
+                logging.error(f"Backend error: {data['error']}")
+                return
+            if "info" in data:
+                out = self._output(int(data["info"].get("sample_rate", 44100)))
+                decode = decoder(data["info"])
+                continue
+            if "audio_b64" in data:
+                chunk = base64.b64decode(data["audio_b64"])
+                if decode:
+                    chunk = decode(chunk)
+                elif first:
+                    chunk = strip_wav_header(chunk)
+                    first = False
+                if out and chunk:
+                    out.write(chunk)
+                continue
+            if data.get("final"):
+                return
+
+
+_speaker: Optional[Speaker] = None
+_speaker_lock = threading.Lock()
+
+
+def get_speaker() -> Speaker:
+    """Process-wide speaker, started on first use and drained at exit."""
+    global _speaker
+    with _speaker_lock:
+        if _speaker is None:
+            _speaker = Speaker()
+            atexit.register(_speaker.close)
+        return _speaker
+
+
+def speak(text: str, lang: Optional[str] = None, voice: Optional[str] = None, style: Optional[str] = None):
+    """Queue text on the shared speaker; returns immediately."""
+    get_speaker().speak(text, lang=lang, voice=voice, style=style)
@@ -0,0 +1,233 @@
+import asyncio
+import base64
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from starlette.websockets import WebSocketDisconnect  # noqa: E402
+
+import app  # noqa: E402
+
+
+class FakeChat:
+    """A Gemini chat: "wait" turns block until a "go" turn has been answered."""
+    def __init__(self, model, history):
+        self.model, self.history = model, list(history)
+
+    def send_message(self, user, request_options=None):
+        asked = user.split("\n")[-1]
+        self.model.seen.append((asked, len(self.history)))
+        if asked.endswith("wait"):
+            assert self.model.go.wait(5), "turns were serialized"
+        reply = f"Answer to {asked}."
+        if user.endswith("go"):
+            self.model.go.set()
+        self.history += [("user", user), ("model", reply)]
+        return SimpleNamespace(text=reply)
+
+
+class FakeModel:
+    def __init__(self, name, system_instruction=None):
+        self.seen, self.go = [], threading.Event()
+
+    def start_chat(self, history):
+        return FakeChat(self, history)
+
+
+@pytest.fixture
+def session_upstreams(monkeypatch):
+    async def frames(text, voice_id, style, fmt, deadline=None, sample_rate=44100, lease=None):
+        for _ in range(3):
+            if "slow" in text:
+                await asyncio.sleep(10)
+            yield "AAAA"
+
+    model = FakeModel("gemini")
+    monkeypatch.setattr(app, "murf_stream_frames", frames)
+    monkeypatch.setattr(app, "_ensure_gemini", lambda: None)
+    monkeypatch.setattr(app, "_gemini_model", lambda key, name="gemini-1.5-flash", **kw: model)
+    monkeypatch.setattr(app, "call_hedged", lambda name, fn, deadline, hedge=True, pin=None: fn(5.0, "key"))
+    monkeypatch.setattr(app.quota, "keys", lambda name: ["key"])
+    return model
+
+
+def _receive(ws, until):
+    msgs = [ws.receive_json()]
+    while not until(msgs):
+        msgs.append(ws.receive_json())
+    return msgs
+
+
+def _finals(msgs):
+    return [m["id"] for m in msgs if m.get("final")]
+
+
+def test_session_turns_run_concurrently(session_upstreams):
+    with TestClient(app.app).websocket_connect("/ws/stream") as ws:
+        ws.send_json({"session": {"language": "en-US", "voice_id": "en-US-test"}})
+        assert ws.receive_json()["session"]["voice_id"] == "en-US-test"
+        ws.send_json({"id": "a", "text": "please wait"})
+        ws.send_json({"id": "b", "text": "now go"})
+        msgs = _receive(ws, lambda m: len(_finals(m)) == 2)
+        assert sorted(_finals(msgs)) == ["a", "b"]  # "a" was still waiting on Gemini while "b" was answered
+        assert not [m for m in msgs if "error" in m]
+        info = {m["id"]: m["info"]["transcript"] for m in msgs if "info" in m}
+        assert info == {"a": "Answer to please wait.", "b": "Answer to now go."}
+        assert all("id" in m for m in msgs)
+
+        ws.send_json({"id": "c", "text": "and go"})
+        _receive(ws, lambda m: _finals(m) == ["c"])
+    # both earlier turns started from an empty history; the third one sees both exchanges
+    assert sorted(session_upstreams.seen) == [("and go", 4), ("now go", 0), ("please wait", 0)]
+
+
+def test_session_cancel_duplicate_id_and_end(session_upstreams):
+    with TestClient(app.app).websocket_connect("/ws/stream") as ws:
+        ws.send_json({"session": {"voice_id": "en-US-test"}})
+        ws.receive_json()
+        ws.send_json({"id": "a", "text": "a slow one"})
+        assert "info" in ws.receive_json()          # the turn is now streaming
+        ws.send_json({"id": "a", "text": "again"})
+        assert _receive(ws, lambda m: "error" in m[-1])[-1] == {"id": "a", "error": "Stream id 'a' is already in use."}
+        ws.send_json({"id": "a", "cancel": True})
+        assert _receive(ws, lambda m: "cancelled" in m[-1])[-1] == {"id": "a", "cancelled": True}
+
+        ws.send_json({"id": "a", "text": "reused id"})     # a cancelled turn frees its id
+        assert _finals(_receive(ws, _finals)) == ["a"]
+        ws.send_json({"end": True})
+        with pytest.raises(WebSocketDisconnect):
+            ws.receive_json()
+
+
+def test_file_context_cache_keeps_one_entry_per_path_and_a_bounded_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "CTX_CACHE_MAX", 2)
+    monkeypatch.setattr(app, "_CTX_CACHE", app.OrderedDict())
+    a, b, c = (tmp_path / n for n in ("a.py", "b.py", "c.py"))
+    for f in (a, b, c):
+        f.write_text(f"x = '{f.name}'\n")
+    assert app.file_context(str(a)) == "x = 'a.py'"
+    a.write_text("x = 'edited'\n")
+    os.utime(a, ns=(1, 1))
+    assert app.file_context(str(a)) == "x = 'edited'" and len(app._CTX_CACHE) == 1
+    app.file_context(str(b))
+    app.file_context(str(a))                        # a is now the most recently used
+    app.file_context(str(c))
+    assert list(app._CTX_CACHE) == [str(a), str(c)]
+
+
+def test_each_gemini_attempt_gets_its_own_model_on_a_shared_per_key_client(monkeypatch):
+    genai = pytest.importorskip("google.generativeai")
+    monkeypatch.setattr(app, "genai", genai)
+    monkeypatch.setattr(app, "_GEMINI_CLIENTS", {})
+    first, other, again = app._gemini_model("k1"), app._gemini_model("k2"), app._gemini_model("k1", system_instruction="x")
+    assert first is not again and first.client is again.client and first.client is not other.client
+
+    sent = []
+
+    class Client:
+        def generate_content(self, request, timeout=None):
+            sent.append((request, timeout))
+            reply = genai.protos.Content(role="model", parts=[genai.protos.Part(text=f"reply {len(sent)}")])
+            return genai.protos.GenerateContentResponse(candidates=[genai.protos.Candidate(content=reply)])
+
+    chat = app._GeminiOnKey(Client(), "gemini-1.5-flash", system_instruction="Be brief.").start_chat([])
+    assert chat.send_message("hi", request_options={"timeout": 3}).text == "reply 1"
+    assert chat.send_message("again").text == "reply 2"
+    request, timeout = sent[-1]
+    assert (request.model, timeout, request.system_instruction.parts[0].text) == ("models/gemini-1.5-flash", None, "Be brief.")
+    assert [(c.role, c.parts[0].text) for c in request.contents] == [("user", "hi"), ("model", "reply 1"), ("user", "again")]
+    assert len(chat.history) == 4
+
+
+
+PCM = bytes(range(1, 17))
+MURF_HEADER = b"RIFF" + bytes(4) + b"WAVEfmt " + bytes(20) + b"data" + bytes(4)
+
+
+@pytest.fixture
+def murf_wav(monkeypatch):
+    """Murf answering every text with one WAV stream: a RIFF header in front of the first frame."""
+    spoken = []
+
+    async def frames(text, voice_id, style, fmt, deadline=None, sample_rate=44100, lease=None):
+        spoken.append(text)
+        if "broken" in text:
+            raise RuntimeError("Murf went away")
+        yield base64.b64encode(MURF_HEADER + PCM[:8]).decode()
+        yield base64.b64encode(PCM[8:]).decode()
+
+    def no_gemini(*args, **kwargs):
+        raise AssertionError("verbatim text went to Gemini")
+
+    monkeypatch.setattr(app, "murf_stream_frames", frames)
+    monkeypatch.setattr(app, "run_gemini", no_gemini)
+    monkeypatch.setattr(app.quota, "keys", lambda name: ["key"])
+    return spoken
+
+
+def test_verbatim_mode_skips_gemini(monkeypatch):
+    monkeypatch.setattr(app, "run_gemini", lambda text, *args: f"Answer to {text}")
+    assert app.text_for_mode("3 files changed", "en-US", None, "verbatim") == "3 files changed"
+    assert app.text_for_mode("why?", "en-US", None, None) == "Answer to why?"
+    with pytest.raises(app.HTTPException):
+        app.text_for_mode("why?", "en-US", None, "shout")
+
+
+def test_speak_stream_strips_the_murf_header_and_sends_the_transcript(murf_wav):
+    client = TestClient(app.app)
+    text = "Déjà vu: 2 files changed"
+    r = client.post("/speak/stream", json={"text": text, "mode": "verbatim", "format": "pcm", "trim": False})
+    assert r.status_code == 200 and r.headers["content-type"] == "audio/pcm"
+    assert r.content == PCM
+    assert base64.b64decode(r.headers["X-Vibe-Transcript-B64"]).decode("utf-8") == text
+
+    r = client.post("/speak/stream", json={"text": text, "mode": "verbatim", "trim": False})
+    assert r.content == app._wav_stream_header(int(r.headers["X-Sample-Rate"])) + PCM     # one header, ours
+
+
+def test_speaker_keeps_one_socket_open_across_utterances(murf_wav, monkeypatch, caplog, capsys):
+    uvicorn = pytest.importorskip("uvicorn")
+    pytest.importorskip("websockets")
+    import speaker
+
+    server = uvicorn.Server(uvicorn.Config(app.app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            time.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+
+        connects = []
+
+        async def ws_connect(url, **kwargs):
+            connects.append(url)
+            return await real_connect(url, **kwargs)
+
+        real_connect = speaker.ws_connect
+        played = []
+        monkeypatch.setenv("VIBE_UDS", "off")
+        monkeypatch.setattr(speaker, "ws_connect", ws_connect)
+        monkeypatch.setattr(speaker.Speaker, "_output", lambda self, rate: SimpleNamespace(write=played.append))
+
+        voice = speaker.Speaker(f"ws://127.0.0.1:{port}/ws/stream", voice="en-US-test")
+        for text in ("First line.", "A broken line.", "Last line."):
+            voice.speak(text)
+        voice.wait()
+        voice.close()
+    finally:
+        server.should_exit = True
+        thread.join(5)
+
+    assert murf_wav == ["First line.", "A broken line.", "Last line."]
+    assert len(connects) == 1                                   # the failed request did not cost the socket
+    assert b"".join(played) == PCM * 2
+    assert "Murf went away" in caplog.text and capsys.readouterr().out == ""
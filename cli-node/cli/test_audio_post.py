@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+from audio_post import PcmPostProcessor  # noqa: E402
+
+SR = 44100
+
+
+def _tone(seconds):
+    t = np.arange(int(SR * seconds)) / SR
+    return (8000 * np.sin(2 * np.pi * 440 * t)).astype(np.int16)
+
+
+def _silence(seconds):
+    return np.zeros(int(SR * seconds), np.int16)
+
+
+def _run(post, pcm, block=4410):
+    return post.process(pcm[:0]) + b"".join(post.process(pcm[i:i + block])
+                                           for i in range(0, len(pcm), block)) + post.flush()
+
+
+def test_trims_ends_and_compresses_pauses():
+    pcm = np.concatenate([_silence(0.5), _tone(0.5), _silence(2), _tone(0.5), _silence(1)]).tobytes()
+    post = PcmPostProcessor(SR, max_pause_ms=400)
+    out = _run(post, pcm, block=3001)
+    stats = post.stats()
+    assert 450 < stats["lead_ms"] <= 500
+    assert 950 < stats["trail_ms"] <= 1000
+    assert 1550 < stats["pause_ms"] <= 1600
+    assert len(out) // 2 == len(pcm) // 2 - stats["removed_samples"]
+
+
+def test_loud_blocks_pass_through_without_copy():
+    post = PcmPostProcessor(SR)
+    tone = _tone(0.2)
+    post.process(tone[:4410].tobytes())
+    block = tone[4410:8820].tobytes()
+    assert post.process(block) is block
+
+
+def test_resamples_block_by_block():
+    pcm = _tone(1).tobytes()
+    for rate in (16000, 22050, 48000):
+        post = PcmPostProcessor(SR, rate, trim=False)
+        out = np.frombuffer(_run(post, pcm, block=1001), np.int16)
+        assert abs(len(out) - rate) <= 1
+        ref = 8000 * np.sin(2 * np.pi * 440 * np.arange(len(out)) / rate)
+        assert np.abs(out[200:-200] - ref[200:-200]).max() < 50
@@ -0,0 +1,88 @@
+import time
+
+from code_summaries import SummaryCache, Summarizer, symbols
+
+SOURCE = '''import os
+
+LIMIT = 3
+
+
+@staticmethod
+def helper(x):
+    return x + 1
+
+
+class Player:
+    """Plays things."""
+    volume = 5
+
+    def play(self, clip):
+        return helper(clip)
+
+    async def stop(self):
+        pass
+'''
+
+
+class FakeModel:
+    def __init__(self):
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return f"{prompt} summary #{len(self.prompts)}"
+
+
+def test_symbols_cover_the_whole_file():
+    pieces = {s.name: s for s in symbols(SOURCE)}
+    assert list(pieces) == ["<module>", "helper", "Player", "Player.play", "Player.stop"]
+    assert pieces["helper"].source.startswith("@staticmethod")
+    assert "import os" in pieces["<module>"].source and "LIMIT = 3" in pieces["<module>"].source
+    assert pieces["Player.stop"].parent == "Player" and pieces["Player.stop"].lineno == 18
+    chunks = symbols("def broken(:\n" + "x = 1\n" * 50, chunk_chars=100)
+    assert {s.kind for s in chunks} == {"chunk"} and "".join(s.source for s in chunks).count("x = 1") == 50
+
+
+def test_only_changed_symbols_go_back_to_the_model(tmp_path):
+    path = tmp_path / "player.py"
+    path.write_text(SOURCE)
+    model = FakeModel()
+    first = Summarizer(model, SummaryCache(str(tmp_path / "summaries.json")))
+    result = first.summarize_file(str(path))
+    assert set(result["symbols"]) == {"<module>", "helper", "Player", "Player.play", "Player.stop"}
+    assert result["summary"] and first.stats["calls"] == len(model.prompts)
+    assert not result["summary"].startswith("Summarize")                 # the echoed prompt is cut
+
+    # a fresh process: everything comes from the cache file, fast, without the model
+    again = Summarizer(lambda prompt: _no_model(), SummaryCache(str(tmp_path / "summaries.json")))
+    t0 = time.perf_counter()
+    assert again.summarize_file(str(path)) == result
+    assert time.perf_counter() - t0 < 0.05 and again.stats["calls"] == 0
+
+    path.write_text(SOURCE.replace("return helper(clip)", "return helper(clip) * 2"))
+    model.prompts.clear()
+    edited = Summarizer(model, SummaryCache(str(tmp_path / "summaries.json"))).summarize_file(str(path))
+    changed = [p for p in model.prompts if p.startswith("Summarize the following")]
+    assert len(changed) == 1 and "helper(clip) * 2" in changed[0]
+    assert edited["symbols"]["helper"] == result["symbols"]["helper"]
+    assert edited["symbols"]["Player"] != result["symbols"]["Player"]
+
+
+def _no_model():
+    raise AssertionError("the model should not be called")
+
+
+def test_long_symbols_are_summarized_in_parts_not_cut(monkeypatch):
+    import code_summaries
+    monkeypatch.setattr(code_summaries, "SYMBOL_CHARS", 300)
+    body = "".join(f"    step_{n} = compute({n})\n" for n in range(60))
+    source = f"def long_one():\n{body}    return step_59\n\n" + "".join(f"NAME_{n} = {n}\n" for n in range(40))
+    model = FakeModel()
+    result = Summarizer(model).summarize_source(source)
+    sent = "".join(p for p in model.prompts if p.startswith("Summarize the following"))
+    assert all(f"step_{n} = compute({n})" in sent for n in range(60)) and "return step_59" in sent
+    assert all(f"NAME_{n} = {n}" in sent for n in range(40))
+    assert all(len(p) < 300 + 60 for p in model.prompts if p.startswith("Summarize the following"))
+    assert "long_one part 1/" in "".join(model.prompts) and result["symbols"]["long_one"]
+    pieces = code_summaries._chunks("x" * 700 + "\nshort\n", 300)
+    assert [len(p.source) for p in pieces] == [300, 300, 101, 6]
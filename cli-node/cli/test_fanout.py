@@ -0,0 +1,73 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+from fastapi import HTTPException  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app  # noqa: E402
+
+
+@pytest.fixture
+def slow_upstreams(monkeypatch):
+    calls = {"context": 0, "tts": []}
+    lock = threading.Lock()
+
+    def context(files):
+        calls["context"] += 1
+        return "CTX"
+
+    def answer(text, language, files, mode, deadline, ctx=None):
+        assert ctx == "CTX"
+        if language == "fr-FR":
+            raise HTTPException(502, "Gemini returned empty text")
+        time.sleep(0.3)
+        return f"answer in {language}"
+
+    def speak(text, language, fmt, voice_id=None, style=None, deadline=None):
+        time.sleep(0.3)
+        with lock:
+            calls["tts"].append((language, voice_id))
+        return b"audio", "audio/mpeg"
+
+    monkeypatch.setattr(app, "build_context", context)
+    monkeypatch.setattr(app, "text_for_mode", answer)
+    monkeypatch.setattr(app.TTS_ROUTER, "speak", speak)
+    monkeypatch.setattr(app.TTS_ROUTER, "served_by", lambda: calls["served"])
+    calls["served"] = ("murf", "fastest")
+    return calls
+
+
+def test_locales_run_concurrently_on_one_context(slow_upstreams):
+    t0 = time.monotonic()
+    r = TestClient(app.app).post("/speak/multi", json={
+        "text": "explain app.py", "files": ["app.py"], "languages": ["en-US", "hi-IN", "es-ES", "en-US", "fr-FR"],
+        "voice_ids": {"es-ES": "es-ES-custom"}})
+    assert r.status_code == 200
+    assert time.monotonic() - t0 < 1.2              # one locale is 0.6 s; in sequence this would be 1.8 s
+    answers = {a["language"]: a for a in r.json()["answers"]}
+    assert list(answers) == ["en-US", "hi-IN", "es-ES", "fr-FR"] and slow_upstreams["context"] == 1
+    assert answers["hi-IN"]["text"] == "answer in hi-IN"
+    assert answers["hi-IN"]["voice_id"] == app._pick_voice("hi-IN", None, None)
+    assert answers["es-ES"]["voice_id"] == "es-ES-custom"
+    assert answers["fr-FR"]["error"] == "Gemini returned empty text" and answers["fr-FR"]["audio_b64"] is None
+    assert sorted(slow_upstreams["tts"]) == [("en-US", None), ("es-ES", "es-ES-custom"), ("hi-IN", None)]
+
+
+def test_unpinned_locales_can_fail_over_off_murf(slow_upstreams):
+    slow_upstreams["served"] = ("gtts", "failover")
+    r = TestClient(app.app).post("/speak/multi", json={"text": "hi", "languages": ["hi-IN"], "format": "mp3"})
+    assert r.json()["answers"][0]["voice_id"] == "gtts"
+    assert slow_upstreams["tts"] == [("hi-IN", None)]     # no Murf voice pinned, so gTTS was allowed to answer
+
+
+def test_all_locales_failing_is_an_error(slow_upstreams):
+    client = TestClient(app.app)
+    assert client.post("/speak/multi", json={"text": "hi", "languages": ["fr-FR"]}).status_code == 502
+    assert client.post("/speak/multi", json={"text": "hi", "languages": [" "]}).status_code == 422
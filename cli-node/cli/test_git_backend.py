@@ -0,0 +1,77 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import git_backend
+from git_backend import GitBackend, parse_status, speak_status
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git not installed")
+
+
+def _git(repo, *args):
+    subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True,
+                   env=dict(os.environ, GIT_AUTHOR_NAME="Ada", GIT_AUTHOR_EMAIL="ada@example.com",
+                            GIT_COMMITTER_NAME="Ada", GIT_COMMITTER_EMAIL="ada@example.com"))
+
+
+@pytest.fixture
+def repo(tmp_path):
+    _git(tmp_path, "init", "-q", "-b", "main")
+    for name in ("app.py", "old.py", "gone.py"):
+        (tmp_path / name).write_text(f"# {name}\n")
+    _git(tmp_path, "add", ".")
+    _git(tmp_path, "commit", "-q", "-m", "First commit")
+    (tmp_path / "app.py").write_text("# changed\n")
+    _git(tmp_path, "mv", "old.py", "new name.py")
+    (tmp_path / "gone.py").unlink()
+    for n in range(5):
+        (tmp_path / f"note{n}.txt").write_text("x")
+    return tmp_path
+
+
+def test_status_is_parsed_summarized_and_cached(repo, monkeypatch):
+    backend = GitBackend(str(repo))
+    try:
+        status = backend.status()
+        groups = status.groups()
+        assert status.branch == "main" and status.oid == backend.head()[1]
+        assert groups["modified"] == ["app.py"] and groups["deleted"] == ["gone.py"]
+        assert groups["staged"] == ["new name.py"] and len(groups["untracked"]) == 5
+        renamed = next(e for e in status.entries if e.kind == "2")
+        assert (renamed.path, renamed.orig) == ("new name.py", "old.py")
+        spoken = speak_status(status, top=2)
+        assert spoken.startswith("On branch main. 1 staged, 1 modified, 1 deleted, 5 untracked.")
+        assert "Untracked: note0.txt, note1.txt and 3 more." in spoken
+
+        assert backend.status() is status and backend.stats == {"status_runs": 1, "status_hits": 1}
+        _git(repo, "add", "app.py")                                  # the index changed: run again
+        assert backend.status().groups()["staged"] == ["app.py", "new name.py"]
+        monkeypatch.setattr(git_backend, "STATUS_TTL", 0)            # worktree edits show up after the TTL
+        (repo / "note0.txt").unlink()
+        assert len(backend.status().groups()["untracked"]) == 4 and backend.stats["status_runs"] == 3
+    finally:
+        backend.close()
+
+
+def test_history_comes_from_one_cat_file_process(repo):
+    _git(repo, "commit", "-q", "-am", "Second commit\n\nWith a body.")
+    backend = GitBackend(str(repo))
+    try:
+        last = backend.commit()
+        assert (last.author, last.subject) == ("Ada", "Second commit")
+        pid = backend.cat.proc.pid
+        assert [c.subject for c in backend.log(5)] == ["Second commit", "First commit"]
+        assert backend.cat.proc.pid == pid and backend.commit("no-such-ref") is None
+        assert git_backend.speak_commit(last, now=last.when + 7200).endswith("by Ada, 2 hours ago: Second commit")
+    finally:
+        backend.close()
+
+
+def test_porcelain_v2_branch_headers():
+    data = (b"# branch.oid 1234567890abcdef\0# branch.head (detached)\0# branch.upstream origin/main\0"
+            b"# branch.ab +2 -1\0u UU N... 100644 100644 100644 100644 a b c merge.py\0")
+    status = parse_status(data)
+    assert (status.branch, status.ahead, status.behind) == (None, 2, 1)
+    assert speak_status(status).startswith("Detached at 1234567, 2 ahead and 1 behind of origin/main. 1 conflicted.")
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+from github_mirror import IssueMirror, PER_PAGE
+
+
+class FakeGitHub:
+    """Minimal /repos/{repo}/issues with ETag/If-None-Match and Link pagination."""
+
+    def __init__(self, count):
+        self.issues = [{"number": n, "title": f"Issue {n}", "body": "", "labels": []}
+                       for n in range(count, 0, -1)]
+        self.hits = []
+        self.down = set()           # pages answered with 503
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                q = parse_qs(urlparse(self.path).query)
+                page = int(q.get("page", ["1"])[0])
+                items = fake.issues[(page - 1) * PER_PAGE: page * PER_PAGE]
+                body = json.dumps(items).encode()
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                fake.hits.append(page)
+                if page in fake.down:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                last = max(1, -(-len(fake.issues) // PER_PAGE))
+                base = f"http://127.0.0.1:{fake.port}/repos/o/r/issues?state=open&per_page={PER_PAGE}"
+                links = []
+                if page < last:
+                    links.append(f'<{base}&page={page + 1}>; rel="next"')
+                    links.append(f'<{base}&page={last}>; rel="last"')
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                if links:
+                    self.send_header("Link", ", ".join(links))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def api(self):
+        return f"http://127.0.0.1:{self.port}"
+
+
+@pytest.fixture
+def fake():
+    gh = FakeGitHub(250)
+    yield gh
+    gh.server.shutdown()
+
+
+def test_mirror_follows_pagination(fake, tmp_path):
+    mirror = IssueMirror("o/r", api=fake.api, path=tmp_path / "m.json")
+    issues = mirror.issues()
+    assert [i["number"] for i in issues] == list(range(250, 0, -1))
+    assert sorted(fake.hits) == [1, 2, 3]
+
+
+def test_refresh_uses_conditional_requests(fake, tmp_path):
+    path = tmp_path / "m.json"
+    IssueMirror("o/r", api=fake.api, path=path).issues()
+    mirror = IssueMirror("o/r", api=fake.api, path=path)
+    assert len(mirror.issues()) == 250
+    assert mirror.stats == {"requests": 3, "not_modified": 3}
+
+
+def test_refresh_picks_up_changed_page(fake, tmp_path):
+    mirror = IssueMirror("o/r", api=fake.api, path=tmp_path / "m.json")
+    mirror.issues()
+    fake.issues[150]["title"] = "Renamed"
+    mirror.stats.update(requests=0, not_modified=0)
+    assert any(i["title"] == "Renamed" for i in mirror.issues())
+    assert mirror.stats["not_modified"] == 2
+
+
+def test_refresh_yields_pages_in_order(fake, tmp_path):
+    mirror = IssueMirror("o/r", api=fake.api, path=tmp_path / "m.json")
+    pages = mirror.refresh()
+    first = next(pages)
+    assert first[0]["number"] == 250 and len(first) == PER_PAGE
+    assert [len(p) for p in pages] == [100, 50]
+
+
+def test_search_answers_from_mirror(fake, tmp_path):
+    mirror = IssueMirror("o/r", api=fake.api, path=tmp_path / "m.json")
+    mirror.issues()
+    fake.server.shutdown()
+    assert [i["number"] for i in mirror.search("Issue 250", refresh=False)] == [250]
+
+
+def test_pull_requests_are_left_out(fake, tmp_path):
+    fake.issues[0]["pull_request"] = {"url": "..."}
+    mirror = IssueMirror("o/r", api=fake.api, path=tmp_path / "m.json")
+    assert next(mirror.refresh())[0]["number"] == 249
+    assert 250 not in [i["number"] for i in mirror.issues()]
+
+
+def test_a_failed_refresh_leaves_the_unsent_pages_to_the_mirror(fake, tmp_path):
+    mirror = IssueMirror("o/r", api=fake.api, path=tmp_path / "m.json")
+    mirror.issues()
+    fake.down.add(3)
+    pages, sent = mirror.refresh(), []
+    with pytest.raises(requests.HTTPError):
+        for page in pages:
+            sent.append(page)
+    assert len(sent) == 2
+    rest = mirror.issues(refresh=False, after_page=len(sent))
+    assert [i["number"] for i in rest] == list(range(50, 0, -1))      # page 3 only, nothing said twice
+
+
+def test_a_304_for_a_page_the_mirror_lost_is_fetched_again(fake, tmp_path):
+    path = tmp_path / "m.json"
+    IssueMirror("o/r", api=fake.api, path=path).issues()
+    data = json.loads(path.read_text())
+    del data["pages"]["2"]["items"]                  # the validator survived, the page did not
+    path.write_text(json.dumps(data))
+    mirror = IssueMirror("o/r", api=fake.api, path=path)
+    assert [i["number"] for i in mirror.issues()] == list(range(250, 0, -1))
+    assert mirror.stats == {"requests": 4, "not_modified": 2}
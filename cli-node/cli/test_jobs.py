@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+import jobs  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+ITEMS = [{"text": "First part"}, {"text": "Second part", "id": "Intro"}, {"text": "Third part"}]
+
+
+def _wait(runner, job_id, timeout=5):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        job = runner.status(job_id)
+        if job["state"] != "running":
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_items_run_concurrently_and_land_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_ATTEMPTS", 2)
+    seen, lock = [], threading.Lock()
+    limited = {"Second part": 1}
+
+    def narrate(item, settings, deadline):
+        with lock:
+            seen.append((item["text"], deadline.priority))
+            if limited.get(item["text"]):
+                limited[item["text"]] -= 1
+                raise HTTPException(429, "quota", headers={"Retry-After": "0"})
+        time.sleep(0.1)
+        return item["text"].encode(), "audio/wav", item["text"].upper()
+
+    runner = jobs.JobRunner(narrate, tmp_path, workers=3)
+    t0 = time.monotonic()
+    job = _wait(runner, runner.submit(ITEMS, {"language": "en-US"}, client="me")["id"])
+    assert time.monotonic() - t0 < 0.3
+    assert job["state"] == "done" and job["counts"]["done"] == 3
+    assert [it["audio"] for it in job["items"]] == ["0000-first-part.wav", "0001-intro.wav", "0002-third-part.wav"]
+    assert job["items"][1]["attempts"] == 1          # the 429 wait did not use up an attempt
+    assert runner.audio_path(job["id"], 2).read_bytes() == b"Third part"
+    assert {p for _, p in seen} == {"batch"}
+    runner.close()
+
+
+def test_interrupted_job_resumes_without_redoing_finished_items(tmp_path):
+    release, third = threading.Event(), threading.Event()
+    calls = []
+
+    def stuck(item, settings, deadline):
+        calls.append(item["text"])
+        if item["text"] == "Third part":
+            third.set()
+            release.wait(5)
+            raise RuntimeError("service stopped")
+        return b"x", "audio/wav", item["text"]
+
+    first = jobs.JobRunner(stuck, tmp_path, workers=3)
+    job_id = first.submit(ITEMS, {})["id"]
+    while first.status(job_id)["counts"]["done"] < 2:
+        time.sleep(0.01)
+    assert third.wait(5)
+    first.close()
+    release.set()
+    on_disk = json.loads((tmp_path / job_id / "job.json").read_text())
+    assert on_disk["state"] == "running" and on_disk["items"][2]["state"] == "running"
+
+    second = jobs.JobRunner(lambda item, settings, deadline: (calls.append(item["text"]) or b"y", "audio/wav", ""),
+                            tmp_path, workers=2)
+    assert second.resume_all() == [job_id]
+    job = _wait(second, job_id)
+    assert job["state"] == "done"
+    assert sorted(calls[:3]) == ["First part", "Second part", "Third part"] and calls[3:] == ["Third part"]
+    second.close()
@@ -0,0 +1,61 @@
+import base64
+import json
+
+import pytest
+
+pytest.importorskip("speech_recognition")
+websockets = pytest.importorskip("websockets")
+
+import live_agent  # noqa: E402
+
+
+class FakeSocket:
+    """A session socket that drops after `cut` messages of each turn."""
+
+    def __init__(self, cut):
+        self.cut, self.sent, self.queue = cut, [], []
+
+    async def send(self, raw):
+        turn = json.loads(raw)
+        self.sent.append(turn["text"])
+        sid = turn["id"]
+        frames = [{"id": sid, "info": {"transcript": "", "sample_rate": 16000, "codec": None}}]
+        frames += [{"id": sid, "audio_b64": base64.b64encode(bytes(64)).decode()} for _ in range(3)]
+        self.queue = frames[:self.cut] if self.cut is not None else frames + [{"id": sid, "final": True}]
+
+    async def recv(self):
+        if not self.queue:
+            raise websockets.ConnectionClosed(None, None)
+        return json.dumps(self.queue.pop(0))
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """A LiveSession whose n-th connection drops after cuts[n] messages of a turn (None: never)."""
+    live = live_agent.LiveSession()
+    played, sockets, cuts = [], [], []
+
+    async def connect():
+        sockets.append(FakeSocket(cuts[len(sockets)] if len(sockets) < len(cuts) else None))
+        live.ws = sockets[-1]
+
+    monkeypatch.setattr(live, "_connect", connect)
+    monkeypatch.setattr(live, "_output", lambda rate: type("Out", (), {"write": staticmethod(played.append)}))
+    yield live, cuts, played, sockets
+    live.loop.close()
+
+
+def test_a_turn_cut_off_after_it_was_heard_is_not_replayed(session):
+    live, cuts, played, sockets = session
+    cuts.append(2)                                  # info and one chunk, then the service restarts
+    live.say("explain app.py")
+    assert len(played) == 1 and [s.sent for s in sockets] == [["explain app.py"]]
+    live.say("and the tests")                       # the next turn opens a new session
+    assert [s.sent for s in sockets] == [["explain app.py"], ["and the tests"]] and len(played) == 4
+
+
+def test_a_turn_cut_off_before_any_audio_is_retried(session):
+    live, cuts, played, sockets = session
+    cuts.append(1)                                  # info only
+    live.say("explain app.py")
+    assert [s.sent for s in sockets] == [["explain app.py"], ["explain app.py"]] and len(played) == 3
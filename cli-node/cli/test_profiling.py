@@ -0,0 +1,70 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app  # noqa: E402
+import profiling  # noqa: E402
+
+
+def _busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(i * i for i in range(500))
+
+
+def test_sampler_finds_the_busy_function():
+    prof = profiling.SamplingProfiler(interval=0.002, memory=True).start()
+    worker = threading.Thread(target=_busy_loop, args=(0.3,), name="busy worker")
+    worker.start()
+    worker.join()
+    report = prof.stop().report()
+    assert report["samples"] > 20
+    assert any(line.startswith("busy_worker;") and "test_profiling.py:_busy_loop" in line
+               for line in report["folded"].splitlines())
+    assert "test_profiling.py:_busy_loop" in [row["frame"] for row in report["top"]["total"]]
+    assert report["memory"]
+
+
+def test_admin_profile_needs_a_token_and_captures_the_next_requests(monkeypatch):
+    client = TestClient(app.app)
+    monkeypatch.delenv("VIBE_ADMIN_TOKEN", raising=False)
+    assert client.post("/admin/profile", params={"seconds": 0.1}).status_code == 403
+    monkeypatch.setenv("VIBE_ADMIN_TOKEN", "s3cret")
+    assert client.post("/admin/profile", params={"seconds": 0.1},
+                       headers={"Authorization": "Bearer nope"}).status_code == 401
+
+    out = {}
+
+    def capture():
+        out["r"] = client.post("/admin/profile", params={"route": "/health", "requests": 2, "timeout": 5},
+                               headers={"Authorization": "Bearer s3cret"})
+
+    t = threading.Thread(target=capture)
+    t.start()
+    while profiling._current is None:
+        time.sleep(0.01)
+    busy = client.post("/admin/profile", params={"seconds": 1}, headers={"X-Vibe-Admin-Token": "s3cret"})
+    assert busy.status_code == 409
+    for _ in range(2):
+        assert client.get("/health").status_code == 200
+    t.join(5)
+    report = out["r"].json()
+    assert out["r"].status_code == 200 and report["requests_profiled"] == 2 and "folded" in report
+
+
+def test_cli_profile_writes_the_service_samplers_stacks(tmp_path):
+    import cli_profile
+    prof = cli_profile.Profiler(str(tmp_path / "out" / "run"), interval=0.002).start()
+    _busy_loop(0.2)
+    summary = prof.stop()
+    assert isinstance(prof.sampler, profiling.SamplingProfiler)
+    assert "test_profiling.py:_busy_loop" in summary.split("total ms")[1]
+    assert (tmp_path / "out" / "run.folded").read_text() == prof.sampler.folded()
@@ -0,0 +1,103 @@
+import os
+import sys
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+import tts  # noqa: E402
+
+# Stand-in engine for the worker processes: writes "<voice>|<text>" and takes 0.2 s per utterance
+FAKE_PYTTSX3 = textwrap.dedent("""
+    import os, time
+
+    class _Voice:
+        def __init__(self, id, languages):
+            self.id, self.languages = id, languages
+
+    class _Engine:
+        def __init__(self):
+            self.props = {"voice": "default",
+                          "voices": [_Voice("v-en", [b"\\x05en-us"]), _Voice("v-es", ["es_ES"])]}
+            self.job = None
+
+        def getProperty(self, k):
+            return self.props[k]
+
+        def setProperty(self, k, v):
+            self.props[k] = v
+
+        def save_to_file(self, text, path):
+            self.job = (text, path)
+
+        def runAndWait(self):
+            text, path = self.job
+            if text == "crash":
+                os._exit(3)
+            time.sleep(0.2)
+            with open(path, "w") as f:
+                f.write(f"{self.props['voice']}|{text}|{os.getpid()}")
+
+    def init():
+        return _Engine()
+""")
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    (tmp_path / "pyttsx3.py").write_text(FAKE_PYTTSX3)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setenv("PYTTSX3_TMPDIR", str(tmp_path))
+    p = tts.Pyttsx3TTS(workers=2)
+    with ThreadPoolExecutor(2) as ex:      # both workers up before timing anything
+        list(ex.map(lambda _: p.speak("warm", None, "wav"), range(2)))
+    yield p
+    p.close()
+
+
+def test_voice_map_and_bytes(pool):
+    data, mime = pool.speak("hola", "es-MX", "wav")
+    assert mime == "audio/wav"
+    assert data.decode().startswith("v-es|hola|")
+    assert pool.speak("hi", "en-US", "wav")[0].startswith(b"v-en|")
+    assert pool.speak("hallo", "de-DE", "wav")[0].startswith(b"default|")
+
+
+def test_workers_run_in_parallel_and_reuse_one_file(pool, tmp_path):
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(4) as ex:
+        outs = list(ex.map(lambda i: pool.speak(f"n{i}", None, "wav")[0].decode(), range(4)))
+    assert time.monotonic() - t0 < 0.7          # 4 x 0.2 s over 2 workers, not 0.8 s serial
+    assert [o.split("|")[1] for o in outs] == ["n0", "n1", "n2", "n3"]
+    assert len({o.split("|")[2] for o in outs}) == 2
+    assert len(list(tmp_path.glob("vibe-pyttsx3-*.wav"))) == 2
+
+
+def test_crashed_worker_fails_its_job_at_once(pool):
+    t0 = time.monotonic()
+    with pytest.raises(RuntimeError, match="exited mid-synthesis"):
+        pool.speak("crash", None, "wav")
+    assert time.monotonic() - t0 < 5                # not PYTTSX3_TIMEOUT_S
+    assert pool.speak("after", None, "wav")[0].startswith(b"default|after|")
+    pool.close()                                    # and the pool can be started again
+    assert pool.speak("again", None, "wav")[0].startswith(b"default|again|")
+
+
+def test_engine_that_cannot_start_is_not_retried(tmp_path, monkeypatch):
+    (tmp_path / "pyttsx3.py").write_text("def init():\n    raise OSError('no speech driver')\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    p = tts.Pyttsx3TTS(workers=2)
+    try:
+        with pytest.raises(RuntimeError, match="no speech driver"):
+            p.speak("hi", None, "wav")
+        assert not p.supports(None, "wav")
+        time.sleep(1.5)
+        assert p._procs == {}                       # not respawned
+        with pytest.raises(RuntimeError, match="no speech driver"):
+            p.speak("hi", None, "wav")
+    finally:
+        p.close()
@@ -0,0 +1,84 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+import metrics  # noqa: E402
+import quota  # noqa: E402
+import upstream  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    metrics.reset()
+    quota.reset()
+    monkeypatch.setattr(upstream, "HEDGE_ENABLED", False)
+    yield
+    quota.reset()
+
+
+def _drain(name, priority="interactive"):
+    pool = quota.pool(name)
+    while pool.acquire(upstream.Deadline(1, priority), wait=False):
+        pass
+
+
+def test_batch_waits_behind_interactive_and_keeps_a_reserve(monkeypatch):
+    monkeypatch.setenv("Q_RPS", "20")
+    monkeypatch.setenv("Q_BURST", "10")
+    _drain("q", "batch")
+    assert quota.pool("q").keys[0].tokens == pytest.approx(3, abs=0.1)    # 30% left for interactive
+    assert quota.acquire("q", upstream.Deadline(1), wait=False) is not None
+
+    _drain("q")
+    order = []
+
+    def take(priority, client):
+        quota.acquire("q", upstream.Deadline(5, priority, client))
+        order.append((priority, client))
+
+    threads = [threading.Thread(target=take, args=("batch", "b"))]
+    threads[0].start()
+    time.sleep(0.01)
+    threads += [threading.Thread(target=take, args=("interactive", c)) for c in ("x", "x", "x", "y")]
+    for t in threads[1:]:
+        t.start()
+        time.sleep(0.002)
+    for t in threads:
+        t.join()
+    assert order[-1] == ("batch", "b")
+    assert [c for _, c in order[:4]].index("y") <= 1      # y does not wait behind all of x's calls
+    assert metrics.percentile("vibe_upstream_queue_seconds", 100, upstream="q", priority="batch") > 0.2
+
+
+def test_429_cools_the_key_and_fails_over(monkeypatch):
+    monkeypatch.setenv("Q_API_KEYS", "k1,k2:2")
+    seen = []
+
+    def call(timeout, key):
+        seen.append(key)
+        if key == "k1":
+            raise quota.RateLimited("q", 60)
+        return key
+
+    assert upstream.call_hedged("q", call, upstream.Deadline(2)) == "k2"
+    assert upstream.call_hedged("q", call, upstream.Deadline(2)) == "k2"
+    assert seen == ["k1", "k2", "k2"]
+    assert metrics.count("vibe_upstream_rate_limited_total", upstream="q", key=0) == 1
+
+    # k1 is cooling down for a minute and k2's budget of 2 calls is spent
+    with pytest.raises(HTTPException) as e:
+        upstream.call_hedged("q", call, upstream.Deadline(2))
+    assert e.value.status_code == 429 and int(e.value.headers["Retry-After"]) >= 59
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(HTTPException) as e:
+        upstream.Deadline.from_ms(1000, "urgent")
+    assert e.value.status_code == 422
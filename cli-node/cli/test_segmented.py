@@ -0,0 +1,83 @@
+import io
+import os
+import sys
+import threading
+import time
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+import segmented  # noqa: E402
+
+SR = 24000
+TEXT = " ".join(f"Sentence number {i} explains one more part of the service in plain words." for i in range(30))
+
+
+def _clip(text, rate=SR):
+    """A tone as long as the text, with 300 ms of silence on each side, like a TTS clip."""
+    t = np.arange(int(rate * len(text) / 400)) / rate
+    tone = (8000 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+    pad = np.zeros(int(rate * 0.3), np.int16)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(np.concatenate((pad, tone, pad)).tobytes())
+    return buf.getvalue()
+
+
+def test_segments_are_balanced_and_sentence_aligned():
+    parts = segmented.split_segments(TEXT, target=400, max_segments=8)
+    assert len(parts) == round(len(TEXT) / 400)
+    assert " ".join(parts) == TEXT
+    assert all(p.endswith(".") for p in parts)
+    lengths = [len(p) for p in parts]
+    assert max(lengths) - min(lengths) <= 80
+    assert segmented.split_segments("Short one.") == ["Short one."]
+
+
+def test_parallel_synthesis_joins_into_one_wav(monkeypatch):
+    def synth(text):
+        time.sleep(0.2)
+        return _clip(text), "audio/wav"
+
+    parts = segmented.split_segments(TEXT, target=400)
+    t0 = time.monotonic()
+    data, stats = segmented.synthesize(TEXT, synth, parts)
+    assert time.monotonic() - t0 < 0.2 * len(parts) / 2
+    assert stats["segments"] == len(parts)
+
+    with wave.open(io.BytesIO(data)) as w:
+        assert (w.getframerate(), w.getnchannels(), w.getsampwidth()) == (SR, 1, 2)
+        pcm = np.frombuffer(w.readframes(w.getnframes()), np.int16)
+        assert len(pcm) * 2 == len(data) - 44          # the header carries the real length
+    sound = sum(len(_clip(p)) // 2 - int(SR * 0.6) for p in parts)
+    joins = len(parts) - 1
+    expected = sound + int(SR * 0.6) + joins * SR * segmented.JOIN_PAUSE_MS // 1000    # both 300 ms edges -> one pause
+    assert abs(len(pcm) - expected) < SR * 0.02 * len(parts)
+
+    with pytest.raises(ValueError):
+        segmented.synthesize(TEXT, lambda text: (b"ID3", "audio/mpeg"), parts)
+
+
+def test_segments_from_different_voices_are_not_joined():
+    parts = segmented.split_segments(TEXT, target=400)
+    fallback = parts[1]
+    served = threading.local()
+
+    def synth(text):
+        served.name = "pyttsx3" if text == fallback else "murf"
+        return _clip(text), "audio/wav"
+
+    with pytest.raises(ValueError, match="different voices"):
+        segmented.synthesize(TEXT, synth, parts, source=lambda: served.name)
+    with pytest.raises(ValueError, match="different voices"):      # same provider name, another rate
+        segmented.synthesize(TEXT, lambda text: (_clip(text, SR if text != fallback else 16000), "audio/wav"), parts)
+    data, stats = segmented.synthesize(TEXT, lambda text: (_clip(text), "audio/wav"), parts, source=lambda: "murf")
+    assert stats["segments"] == len(parts)
+    assert segmented.wanted(TEXT, "wav") is segmented.SEGMENT_TTS and not segmented.wanted(TEXT, "wav", False)
@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+import semantic_cache  # noqa: E402
+from semantic_cache import SemanticIndex, normalize, scope_of  # noqa: E402
+
+
+def test_stt_variants_hit_within_the_same_scope(tmp_path):
+    ctx = tmp_path / "app.py"
+    ctx.write_text("print('hi')\n")
+    scope = scope_of("es-ES", "es-ES-elvira", [str(ctx)])
+    assert normalize("Um, explain the app dot py in Spanish?") == normalize("explain app.py in spanish")
+
+    index = SemanticIndex(str(tmp_path / "index.jsonl"))
+    index.add("k1", "explain app.py in spanish", scope)
+    index.add("k2", "what does quota.py do", scope)
+    match = index.lookup("Can you explain app.py in Spanish please", scope)
+    assert match.key == "k1" and match.score >= semantic_cache.THRESHOLD
+    assert index.lookup("explain tts.py in spanish", scope) is None
+    assert index.lookup("explain app.py in spanish", scope_of("fr-FR", "es-ES-elvira", [str(ctx)])) is None
+    ctx.write_text("print('changed')\n")
+    assert index.lookup("explain app.py in spanish", scope_of("es-ES", "es-ES-elvira", [str(ctx)])) is None
+
+    reloaded = SemanticIndex(str(tmp_path / "index.jsonl"))
+    assert len(reloaded) == 2 and reloaded.lookup("Explain app.py in Spanish.", scope).key == "k1"
+    assert "2 answered prompts, 2 near-duplicate hits" in semantic_cache.report(reloaded)
+
+
+def test_default_threshold_keeps_full_precision_on_the_labeled_pairs():
+    rows = {r["threshold"]: r for r in semantic_cache.evaluate(thresholds=(0.5, semantic_cache.THRESHOLD))}
+    assert rows[semantic_cache.THRESHOLD]["precision"] == 1.0
+    assert rows[semantic_cache.THRESHOLD]["hit_rate"] >= 0.8
+    assert rows[0.5]["hits"] >= rows[semantic_cache.THRESHOLD]["hits"]
+
+
+def test_numbers_identifiers_and_negations_must_agree():
+    index = SemanticIndex(threshold=0.0)                # anchors alone decide here
+    index.add("k1", "delete the cache directory", "")
+    index.add("k2", "what does line 10 of app.py do", "")
+    index.add("k3", "explain getUserName in app.py", "")
+    assert index.lookup("do not delete the cache directory", "") is None
+    assert index.lookup("what does line 100 of app.py do", "") is None
+    assert index.lookup("explain getUserId in app.py", "") is None
+    assert index.lookup("What does line 10 of app dot py do?", "").key == "k2"
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+
+import pytest
+
+import service_socket
+from bench_transport import start_service
+
+
+@pytest.fixture
+def fresh(monkeypatch):
+    monkeypatch.setattr(service_socket, "_answers", {})
+    monkeypatch.setattr(service_socket, "_sessions", {})
+
+
+def test_tcp_unless_a_local_socket_answers(fresh, monkeypatch, tmp_path):
+    monkeypatch.delenv("VIBE_UDS", raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert service_socket.socket_path(9000) == str(tmp_path / "vibe" / "9000.sock")
+    assert service_socket.uds_for("ws://127.0.0.1:9000/ws/stream") is None            # nothing listening
+    with socket.socket(socket.AF_UNIX) as srv:
+        (tmp_path / "vibe").mkdir()
+        srv.bind(str(tmp_path / "vibe" / "9001.sock"))
+        srv.listen(1)
+        assert service_socket.uds_for("http://localhost:9001/speak") == str(tmp_path / "vibe" / "9001.sock")
+        assert service_socket.uds_for("http://10.0.0.5:9001/speak") is None             # not this host
+        monkeypatch.setenv("VIBE_UDS", "off")
+        assert service_socket.socket_path(9001) is None
+
+
+def test_service_on_the_unix_socket_only(fresh, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("uvicorn")
+    websockets = pytest.importorskip("websockets")
+    with tempfile.TemporaryDirectory(prefix="vibe-") as folder:
+        proc, port, path = start_service("app:app", folder, tcp=False)
+        try:
+            monkeypatch.setenv("VIBE_UDS", path)
+            with pytest.raises(OSError):
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()     # the port stays closed
+            r = service_socket.session_for(f"http://127.0.0.1:{port}/health").get(
+                f"http://127.0.0.1:{port}/health", timeout=5)
+            assert r.json() == {"status": "ok"}
+
+            async def connect():                        # TCP is closed: this only works over the socket
+                async with await service_socket.ws_connect(f"ws://127.0.0.1:{port}/ws/stream") as ws:
+                    return ws.state.name
+
+            assert asyncio.run(connect()) == "OPEN"
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+        assert not service_socket._probe(path)
+
+
+def test_only_a_socket_of_our_own_is_trusted(fresh, monkeypatch, tmp_path):
+    folder = tmp_path / "vibe"
+    folder.mkdir(mode=0o700)
+    path = str(folder / "9002.sock")
+    monkeypatch.setenv("VIBE_UDS", path)
+    with socket.socket(socket.AF_UNIX) as srv:
+        srv.bind(path)
+        srv.listen(1)
+        assert service_socket._probe(path)
+        folder.chmod(0o777)                                 # anyone could have put it there
+        assert not service_socket._probe(path)
+        folder.chmod(0o700)
+        if os.geteuid() == 0:
+            os.chown(path, 4242, -1)                        # another user's socket
+            assert not service_socket._probe(path)
+
+
+def test_service_refuses_a_folder_it_does_not_own(monkeypatch, tmp_path):
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+    import serve
+    monkeypatch.delenv("VIBE_UDS", raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    default = tmp_path / "vibe"
+    default.mkdir(mode=0o777)
+    default.chmod(0o777)
+    serve.bind_unix(serve.socket_path(9003)).close()      # our own default folder: tightened, then used
+    assert default.stat().st_mode & 0o777 == 0o700
+
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(SystemExit, match="writable by other users"):
+        serve.bind_unix(str(shared / "9003.sock"))
+    if os.geteuid() == 0:
+        os.chown(shared, 4242, -1)
+        with pytest.raises(SystemExit, match="not a directory owned by you"):
+            serve.bind_unix(str(shared / "9003.sock"))
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+from speech_text import normalize, prepare_speech  # noqa: E402
+
+ANSWER = """## Summary
+- **`run_gemini`** in `app.py` builds the prompt, see [docs](https://example.com/docs).
+- Uses `HTTPServer` & `getUserAccountBalanceHistory`
+
+```python
+def main():
+    return run_gemini("hi")
+```
+"""
+
+
+def test_markdown_code_and_identifiers():
+    assert normalize(ANSWER) == (
+        "Summary. run gemini in app dot py builds the prompt, see docs. "
+        "Uses HTTP server and get user account balance history. "
+        "A python code sample defining main, shown in the transcript.")
+
+
+def test_locale_rules():
+    out = normalize("Open `app.py` & https://example.com 50%", "es-MX")
+    assert out == "Open app punto py y un enlace 50 por ciento."
+
+
+def test_abbreviations_and_operators_survive():
+    assert normalize("e.g. Redis, i.e. a store") == "e.g. Redis, i.e. a store."
+    assert normalize("Cost is 5*3 = 15") == "Cost is 5 times 3 = 15."
+    assert normalize("**Note:** 2^10 is *big*", "fr-FR") == "Note: 2^10 is big."
+
+
+def test_reports_chars_and_can_be_disabled():
+    spoken, chars = prepare_speech(ANSWER, "en-US")
+    assert chars == {"in": len(ANSWER), "out": len(spoken)} and chars["out"] < chars["in"]
+    assert prepare_speech(ANSWER, "en-US") == (spoken, chars)
+    assert prepare_speech(ANSWER, "en-US", enabled=False) == (ANSWER, {"in": len(ANSWER), "out": len(ANSWER)})
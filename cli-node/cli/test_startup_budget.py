@@ -0,0 +1,67 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.abspath(os.path.join(HERE, "..", "..", "local-service"))
+
+# Budgets are on top of a bare `python -c pass`, so slow machines don't fail on interpreter startup.
+HELP_BUDGET_MS = int(os.getenv("VIBE_HELP_BUDGET_MS", "600"))
+VOICES_BUDGET_MS = int(os.getenv("VIBE_VOICES_BUDGET_MS", "400"))
+SERVICE_BUDGET_MS = int(os.getenv("VIBE_SERVICE_BUDGET_MS", "2500"))
+
+
+def _best_ms(args, cwd=HERE, runs=3):
+    best = float("inf")
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=cwd, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best
+
+
+@pytest.fixture(scope="module")
+def baseline_ms():
+    return _best_ms(["-c", "pass"])
+
+
+def test_vibe_help_budget(baseline_ms):
+    pytest.importorskip("typer")
+    assert _best_ms(["vibe.py", "--help"]) - baseline_ms < HELP_BUDGET_MS
+
+
+def test_vibe_voices_budget(baseline_ms):
+    pytest.importorskip("typer")
+    assert _best_ms(["vibe.py", "voices"]) - baseline_ms < VOICES_BUDGET_MS
+
+
+def test_service_ready_budget(baseline_ms):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("uvicorn")
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port)],
+                            cwd=SERVICE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = t0 + 30
+        while time.perf_counter() < deadline:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as r:
+                    if r.status == 200:
+                        break
+            except OSError:
+                time.sleep(0.02)
+        else:
+            pytest.fail("service did not become ready")
+        assert (time.perf_counter() - t0) * 1000 - baseline_ms < SERVICE_BUDGET_MS
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
@@ -0,0 +1,89 @@
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+from fastapi import HTTPException  # noqa: E402
+
+import app  # noqa: E402
+from audio_codec import decoder, request_fields  # noqa: E402
+from transport_codec import encoder  # noqa: E402
+
+SR = 16000
+
+
+def _speechlike():
+    t = np.arange(SR) / SR
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    x = envelope * (6000 * np.sin(2 * np.pi * 220 * t) + 2500 * np.sin(2 * np.pi * 1250 * t))
+    return x.astype(np.int16)
+
+
+def _snr_db(ref, out):
+    noise = ref.astype(np.float64) - out.astype(np.float64)
+    return 10 * np.log10((ref.astype(np.float64) ** 2).sum() / (noise ** 2).sum())
+
+
+@pytest.mark.parametrize("codec, width, ratio, min_snr", [
+    ("adpcm", 2, 4, 30), ("mulaw", 2, 2, 30), ("pcm", 1, 2, 25)])
+def test_round_trip_per_frame(codec, width, ratio, min_snr):
+    pcm = _speechlike()
+    encode, decode = encoder(codec, width), decoder({"codec": codec, "sample_width": width})
+    frames = [encode(pcm[i:i + 1601].tobytes()) for i in range(0, len(pcm), 1601)]
+    out = np.frombuffer(b"".join(decode(f) for f in frames), np.int16)
+    assert len(out) == len(pcm)
+    assert sum(map(len, frames)) <= pcm.nbytes / ratio + 4 * len(frames)
+    assert _snr_db(pcm, out) > min_snr
+
+
+def test_negotiation_takes_first_supported_preference():
+    audio = app.negotiate_audio("WAV", request_fields("opus,adpcm", "16000"))
+    assert audio == {"codec": "adpcm", "sample_rate": 16000, "sample_width": 2, "source_rate": 24000}
+    assert app.negotiate_audio("WAV", {"sample_rate": [8000, 48000]})["source_rate"] == 48000
+    assert app.negotiate_audio("MP3", {"codec": "adpcm"})["codec"] is None
+    assert decoder({}) is None and encoder("pcm") is None
+    with pytest.raises(HTTPException) as err:
+        app.negotiate_audio("WAV", {"codec": "opus"})
+    assert err.value.status_code == 422
+
+
+def test_frames_are_encoded_off_the_event_loop():
+    import asyncio
+    import base64
+    import threading
+    from audio_post import PcmPostProcessor
+
+    pcm = _speechlike()
+    threads = []
+
+    def encode(chunk):
+        threads.append(threading.current_thread())
+        return encoder("adpcm")(chunk)
+
+    async def frames():
+        for i in range(0, len(pcm), 4000):
+            yield base64.b64encode(pcm[i:i + 4000].tobytes()).decode()
+
+    async def run():
+        return [f async for f in app._post_frames(frames(), PcmPostProcessor(SR, trim=False), encode)]
+
+    out = asyncio.run(run())
+    decode = decoder({"codec": "adpcm", "sample_width": 2})
+    assert len(b"".join(decode(base64.b64decode(f)) for f in out)) // 2 == len(pcm)
+    assert threads and threading.main_thread() not in threads
+
+
+def test_a_bad_codec_is_refused_before_gemini_is_asked(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    asked = []
+    monkeypatch.setattr(app.quota, "keys", lambda name: ["key"])
+    monkeypatch.setattr(app, "run_gemini", lambda *args, **kwargs: asked.append(args) or "answer")
+    with TestClient(app.app).websocket_connect("/ws/stream") as ws:
+        ws.send_json({"text": "explain app.py", "codec": "opus"})
+        assert "codec" in ws.receive_json()["error"]
+    assert asked == []
@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+import metrics  # noqa: E402
+import tts  # noqa: E402
+
+
+class Fake(tts.TTSProvider):
+    def __init__(self, name, delay=0.0, fail=False, formats=("wav", "mp3")):
+        self.name, self.delay, self.fail, self.formats = name, delay, fail, formats
+        self.calls = 0
+
+    def speak(self, text, lang, fmt, voice_id=None, style=None, deadline=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} down")
+        return self.name.encode(), "audio/wav"
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset()
+
+
+def test_routes_to_fastest_supporting_provider():
+    slow, fast, mp3 = Fake("slow", 0.05), Fake("fast", 0.0), Fake("mp3", 0.0, formats=("mp3",))
+    router = tts.TTSRouter([slow, fast, mp3])
+    for _ in range(3):
+        router.speak("hi", "en-US", "wav")
+    assert [p.name for p in router.plan("en-US", "wav")] == ["fast", "slow"]
+    assert router.speak("hi", "en-US", "wav")[0] == b"fast"
+    assert mp3.calls == 0
+    assert metrics.count("vibe_tts_routed_total", provider="fast", reason="fastest") >= 1
+
+
+def test_breaker_trips_then_probes_for_recovery(monkeypatch):
+    monkeypatch.setattr(tts, "TTS_BREAKER_COOLDOWN_S", 0.05)
+    monkeypatch.setattr(tts, "TTS_PROBE_INTERVAL_S", 0.0)     # the unmeasured murf goes first every time
+    murf, backup = Fake("murf", fail=True), Fake("backup")
+    router = tts.TTSRouter([murf, backup])
+    for _ in range(tts.TTS_BREAKER_FAILURES):
+        assert router.speak("hi", None, "wav")[0] == b"backup"
+    assert router.status()["murf"]["state"] == "open"
+    router.speak("hi", None, "wav")
+    assert murf.calls == tts.TTS_BREAKER_FAILURES     # skipped while open
+
+    time.sleep(0.06)
+    murf.fail = False
+    assert router.speak("hi", None, "wav")[0] == b"murf"
+    assert router.status()["murf"]["state"] == "closed"
+    assert metrics.count("vibe_tts_routed_total", provider="murf", reason="probe") == 1
+    assert metrics.count("vibe_tts_breaker_trips_total", provider="murf") == 1
+
+
+def test_stale_providers_are_only_probed_now_and_then(monkeypatch):
+    slow, fast = Fake("slow", 0.02), Fake("fast", 0.0)
+    router = tts.TTSRouter([slow, fast])
+    router.speak("hi", None, "wav")
+    router.speak("hi", None, "wav")
+    assert (slow.calls, fast.calls) == (1, 1)                 # each one is measured once at first
+
+    router.health["slow"].measured_at -= tts.TTS_STALE_S      # slow's estimate goes stale
+    for _ in range(5):
+        assert router.speak("hi", None, "wav")[0] == b"fast"  # measured fast still comes first
+    assert slow.calls == 1
+    router.health["slow"].probed_at -= tts.TTS_PROBE_INTERVAL_S
+    assert router.speak("hi", None, "wav")[0] == b"slow"      # one request re-measures it
+    assert router.speak("hi", None, "wav")[0] == b"fast"
+
+
+def test_pinned_voice_and_format_are_never_swapped():
+    class Voiced(Fake):
+        takes_voice_id = True
+
+    murf, gtts = Voiced("murf", fail=True), Fake("gtts")
+    router = tts.TTSRouter([murf, gtts], fallback=Fake("pyttsx3", formats=("wav",)))
+    with pytest.raises(RuntimeError, match="murf down"):
+        router.speak("hi", None, "wav", voice_id="en-US-natalie")
+    assert gtts.calls == 0 and router.fallback.calls == 0
+    assert router.speak("hi", None, "wav")[0] == b"gtts"
+
+    gtts.fail = True
+    with pytest.raises(RuntimeError, match="gtts down"):
+        router.speak("hi", None, "mp3")                       # pyttsx3 would answer in WAV
+    assert router.fallback.calls == 0
+
+
+def test_offline_fallback_is_last_resort():
+    router = tts.TTSRouter([Fake("murf", fail=True), Fake("gtts", formats=("mp3",))],
+                           fallback=Fake("pyttsx3", formats=("wav",)))
+    assert router.speak("hi", None, "wav")[0] == b"pyttsx3"
+    assert metrics.count("vibe_tts_routed_total", provider="pyttsx3", reason="last-resort") == 1
+    router.fallback.fail = True
+    with pytest.raises(RuntimeError, match="murf down.*pyttsx3 down"):
+        router.speak("hi", None, "wav")
+
+
+def test_client_errors_are_raised_without_tripping_the_breaker(monkeypatch):
+    monkeypatch.setattr(tts, "TTS_PROBE_INTERVAL_S", 0.0)     # murf goes first every time
+    class Refused(Exception):
+        status_code = 422
+
+    class Picky(Fake):
+        def speak(self, text, lang, fmt, voice_id=None, style=None, deadline=None):
+            self.calls += 1
+            raise Refused(f"No voice for {lang}")
+
+    murf, gtts = Picky("murf"), Fake("gtts")
+    router = tts.TTSRouter([murf, gtts], fallback=Fake("pyttsx3", formats=("wav",)))
+    for _ in range(tts.TTS_BREAKER_FAILURES + 2):
+        with pytest.raises(Refused):
+            router.speak("hi", "xx-YY", "wav")
+    assert router.status()["murf"] == {"state": "closed", "ewma_s": None, "error_rate": 0.0}
+    assert gtts.calls == 0 and router.fallback.calls == 0       # not failed over either
+    assert metrics.count("vibe_tts_breaker_trips_total", provider="murf") == 0
@@ -0,0 +1,82 @@
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app  # noqa: E402
+from turn_timings import TurnTimings  # noqa: E402
+
+
+def _until_final(ws):
+    msgs = [ws.receive_json()]
+    while "final" not in msgs[-1]:
+        msgs.append(ws.receive_json())
+    return msgs
+
+
+@pytest.fixture
+def fake_upstreams(monkeypatch):
+    async def frames(text, voice_id, style, fmt, deadline=None, sample_rate=44100, lease=None):
+        with deadline.span("murf connect"):
+            pass
+        deadline.mark("murf first audio")
+        for _ in range(3):
+            yield "AAAA"
+
+    def answer(text, language, files, mode, deadline):
+        with deadline.span("gemini"):
+            return "An answer."
+
+    monkeypatch.setattr(app, "murf_stream_frames", frames)
+    monkeypatch.setattr(app, "text_for_mode", answer)
+    monkeypatch.setattr(app.quota, "keys", lambda name: ["key"])
+
+
+def test_ws_turn_returns_the_server_timeline_for_the_request_id(fake_upstreams):
+    turn = TurnTimings("test", show=True)
+    with TestClient(app.app).websocket_connect("/ws/stream") as ws:
+        ws.send_json({"text": "hi", **turn.request_fields()})
+        turn.sent()
+        info = ws.receive_json()["info"]
+        turn.mark("info")
+        final = _until_final(ws)[-1]
+    assert info["request_id"] == turn.request_id == final["timings"]["request_id"]
+    stages = [s["stage"] for s in final["timings"]["stages"]]
+    assert stages[:2] == ["answer", "gemini"] and stages[-1] == "done"
+    assert {"info", "murf connect", "murf first audio", "first audio"} <= set(stages)
+
+    turn.server_timings(final)
+    rows = turn.timeline()
+    server_info = next(r for r in rows if r["side"] == "server" and r["stage"] == "info")
+    assert turn.sent_ms <= server_info["at_ms"] <= next(r["at_ms"] for r in rows if r["stage"] == "info"
+                                                         and r["side"] == "client") + 1
+    assert "network/queueing" in turn.summary()
+
+
+def test_no_timings_unless_asked(fake_upstreams):
+    with TestClient(app.app).websocket_connect("/ws/stream") as ws:
+        ws.send_json({"text": "hi"})
+        assert "request_id" not in ws.receive_json()["info"]
+        assert "timings" not in _until_final(ws)[-1]
+
+
+def test_trace_export_appends_one_line_per_stage(tmp_path):
+    path = tmp_path / "trace" / "turns.jsonl"
+    for _ in range(2):
+        turn = TurnTimings("test", trace=str(path))
+        with turn.span("file scan"):
+            pass
+        turn.sent()
+        turn.server_timings({"timings": {"stages": [{"stage": "gemini", "at_ms": 5.0, "ms": 100.0}]}})
+        turn.finish()
+        turn.finish()
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(lines) == 6 and len({line["request_id"] for line in lines}) == 2
+    server = [line for line in lines if line["side"] == "server"]
+    assert all(line["stage"] == "gemini" and line["ms"] == 100.0 and line["at_ms"] >= 5.0 for line in server)
@@ -0,0 +1,80 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+import metrics  # noqa: E402
+import upstream  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def hedging(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(upstream, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(upstream, "HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(upstream, "HEDGE_MAX_RATE", 0.5)
+
+
+def _warm(name, n=10, delay=0.01):
+    for _ in range(n):
+        upstream.call_hedged(name, lambda t, key: time.sleep(delay) or "ok", upstream.Deadline(5))
+
+
+def test_stage_gets_remaining_time():
+    seen = []
+    upstream.call_hedged("u", lambda t, key: seen.append(t), upstream.Deadline(2))
+    assert 1.5 < seen[0] <= 2
+    spent = upstream.Deadline(0.01)
+    time.sleep(0.02)
+    with pytest.raises(HTTPException) as e:
+        spent.timeout("gemini")
+    assert e.value.status_code == 504
+
+
+def test_slow_primary_is_hedged_and_backup_wins():
+    _warm("u")
+    calls = []
+    lock = threading.Lock()
+
+    def fn(timeout, key):
+        with lock:
+            calls.append(timeout)
+            first = len(calls) == 1
+        time.sleep(1.0 if first else 0.01)
+        return "primary" if first else "backup"
+
+    t0 = time.monotonic()
+    assert upstream.call_hedged("u", fn, upstream.Deadline(5)) == "backup"
+    assert time.monotonic() - t0 < 0.5
+    assert metrics.count("vibe_upstream_hedges_total", upstream="u") == 1
+    assert metrics.count("vibe_upstream_hedge_wins_total", upstream="u") == 1
+
+
+def test_hedge_rate_is_capped(monkeypatch):
+    monkeypatch.setattr(upstream, "HEDGE_MAX_RATE", 0.0)
+    _warm("u")
+    assert upstream.call_hedged("u", lambda t, key: time.sleep(0.2) or "ok", upstream.Deadline(5)) == "ok"
+    assert metrics.count("vibe_upstream_hedges_total", upstream="u") == 0
+    assert metrics.count("vibe_upstream_hedges_capped_total", upstream="u") == 1
+    assert 'vibe_upstream_hedges_capped_total{upstream="u"} 1' in metrics.render()
+
+
+def test_deadline_cuts_slow_upstream():
+    with pytest.raises(HTTPException) as e:
+        upstream.call_hedged("u", lambda t, key: time.sleep(1), upstream.Deadline(0.2))
+    assert e.value.status_code == 504
+
+
+def test_unhedged_calls_run_on_the_calling_thread(monkeypatch):
+    monkeypatch.setattr(upstream, "HEDGE_ENABLED", False)
+    _warm("u")
+    here = threading.current_thread()
+    assert upstream.call_hedged("u", lambda t, key: threading.current_thread(), upstream.Deadline(5)) is here
+    assert upstream.call_hedged("u", lambda t, key: threading.current_thread(), upstream.Deadline(5),
+                                hedge=False) is here
@@ -31,4 +31,14 @@ def test_cache_miss():
     key = make_cache_key('notfound', 'en-US', 'nofile.py', 'voice', 'style', 'WAV')
     assert load_cache(key) is None
 
+
+
+def test_similar_cache_falls_back_to_exact_without_numpy(monkeypatch):
+    import sys
+    import semantic_cache
+    import vibe_stream
+    monkeypatch.setattr(semantic_cache, "_index", None)
+    monkeypatch.setitem(sys.modules, "numpy", None)         # as if NumPy were not installed
+    assert vibe_stream._similar_index() is None
+
 # Add more tests for CLI error handling and voice selection as needed
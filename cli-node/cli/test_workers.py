@@ -0,0 +1,154 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("fastapi")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "local-service")))
+
+import lifecycle  # noqa: E402
+import shared_cache  # noqa: E402
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect  # noqa: E402
+from jobs import JobRunner  # noqa: E402
+
+# a one-turn-at-a-time socket handled the way app.py's /ws/stream is, served by serve.py in the drain test
+drain_app = FastAPI()
+
+
+@drain_app.websocket("/ws")
+async def _slow_turns(ws: WebSocket):
+    await ws.accept()
+    with lifecycle.track(ws) as live:
+        try:
+            while not live.closing:
+                req = await ws.receive_json()
+                with live.turn():
+                    await ws.send_json({"started": req["n"]})
+                    await asyncio.sleep(1.0)
+                    await ws.send_json({"final": req["n"]})
+                await live.turn_done()
+        except WebSocketDisconnect:
+            pass
+
+
+def test_cache_is_shared_between_processes(tmp_path):
+    cache = shared_cache.SharedCache(tmp_path, max_bytes=10_000)
+    key = shared_cache.make_key("tts", "Hello there.", "en-US", "wav")
+    assert cache.get("tts", key) is None
+    cache.put("tts", key, {"mime": "audio/wav"}, b"RIFF" + b"\1" * 4000)
+
+    child = ("import sys; sys.path.insert(0, sys.argv[1]); import shared_cache;"
+             "hit = shared_cache.SharedCache(sys.argv[2]).get('tts', sys.argv[3]);"
+             "print(hit.meta['mime'], len(hit.audio))")
+    out = subprocess.run([sys.executable, "-c", child, os.path.dirname(shared_cache.__file__), str(tmp_path), key],
+                         capture_output=True, text=True, check=True).stdout.split()
+    assert out == ["audio/wav", "4004"]
+
+    hit = cache.get("tts", key)
+    assert bytes(hit.audio[:4]) == b"RIFF"
+    assert cache.stats()["kinds"]["tts"] == {"hit": 2, "miss": 1, "hit_rate": 0.6667}    # both processes counted
+
+    for n in range(3):                                      # 3 more 4 KB blobs: the oldest entries go
+        cache.put("tts", f"k{n}", {"mime": "audio/wav"}, bytes([n]) * 4000)
+    stats = cache.stats()
+    assert stats["bytes"] <= 10_000 and cache.get("tts", key) is None
+    assert len(list((tmp_path / "blobs").iterdir())) == stats["entries"]
+
+
+def _settle(runner, job_id, timeout=5):
+    end = time.monotonic() + timeout
+    while runner.status(job_id)["state"] == "running" and time.monotonic() < end:
+        time.sleep(0.01)
+    return runner.status(job_id)
+
+
+def test_jobs_across_workers(tmp_path):
+    release = threading.Event()
+    calls = Counter()
+
+    def narrate(item, settings, deadline):
+        calls[item["text"]] += 1
+        release.wait(5)
+        return b"x", "audio/wav", item["text"]
+
+    items = [{"text": "One"}, {"text": "Two"}, {"text": "Three"}]
+    first, second = JobRunner(narrate, tmp_path, workers=1), JobRunner(narrate, tmp_path, workers=1)
+    try:
+        job_id = first.submit(items, {})["id"]
+        while second.status(job_id)["counts"]["running"] != 1:      # progress is read from job.json
+            time.sleep(0.01)
+        assert second.resume(job_id)["counts"]["running"] == 1     # first runs it: nothing is queued twice
+        release.set()
+        assert _settle(first, job_id)["state"] == "done" and calls == Counter(One=1, Two=1, Three=1)
+
+        release.clear()
+        job_id = first.submit(items, {})["id"]
+        while second.status(job_id)["counts"]["running"] != 1:
+            time.sleep(0.01)
+        second.cancel(job_id)                                       # asked on a worker not running it
+        release.set()
+        counts = _settle(first, job_id)["counts"]
+        assert (counts["done"], counts["cancelled"]) == (1, 2) and _settle(second, job_id)["counts"] == counts
+    finally:
+        first.close()
+        second.close()
+
+
+def test_a_dead_workers_job_is_picked_up(tmp_path):
+    release = threading.Event()
+    calls = Counter()
+
+    def narrate(item, settings, deadline):
+        calls[item["text"]] += 1
+        release.wait(5)
+        return b"x", "audio/wav", item["text"]
+
+    first, second = JobRunner(narrate, tmp_path, workers=1), JobRunner(narrate, tmp_path, workers=1)
+    try:
+        job_id = first.submit([{"text": "One"}, {"text": "Two"}], {})["id"]
+        while second.status(job_id)["counts"]["running"] != 1:
+            time.sleep(0.01)
+        assert second.resume_all() == []                            # its owner is alive
+        first.close()                                               # the worker goes away, lock and all
+        assert second.resume_all() == [job_id]
+        release.set()
+        assert _settle(second, job_id)["counts"]["done"] == 2
+        assert calls == Counter(One=2, Two=1)                       # only the item cut short runs again
+    finally:
+        first.close()
+        second.close()
+
+
+def test_stopping_worker_finishes_the_turn_then_closes_with_1012():
+    pytest.importorskip("uvicorn")
+    websockets = pytest.importorskip("websockets")
+    from bench_transport import start_service
+
+    async def run(proc, port, path):
+        url = f"ws://127.0.0.1:{port}/ws"
+        busy = await websockets.unix_connect(path, url)
+        idle = await websockets.unix_connect(path, url)
+        await busy.send('{"n": 1}')
+        assert await busy.recv() == '{"started":1}'
+        proc.send_signal(signal.SIGTERM)
+        await idle.wait_closed()
+        assert idle.close_code == 1012                      # nothing running: closed right away
+        assert await busy.recv() == '{"final":1}'           # the turn in progress still completes
+        await busy.wait_closed()
+        assert (busy.close_code, busy.close_reason) == (1012, "service restarting")
+
+    with tempfile.TemporaryDirectory(prefix="vibe-") as folder:
+        proc, port, path = start_service("test_workers:drain_app", folder, tcp=False)
+        try:
+            asyncio.run(run(proc, port, path))
+            assert proc.wait(timeout=10) in (0, -signal.SIGTERM)    # uvicorn re-raises the signal it caught
+        finally:
+            if proc.poll() is None:
+                proc.kill()
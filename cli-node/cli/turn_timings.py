@@ -0,0 +1,110 @@
+# turn_timings.py
+# --timings / --trace for the CLIs: where one turn's time goes.
+#   vibe_stream.py stream --timings "explain app.py"
+#   python live_agent.py --trace turns.jsonl
+# The client times its own stages (STT, file auto-detection, cache lookup, WS connect, time to info,
+# first audio, playback). The request carries a request_id and "timings": true, and the service sends
+# its stage timeline back in the "final" message (Gemini, Murf connect, first Murf audio, ...).
+# Server times are placed on the client clock at the moment the request was sent, so the gap between
+# the two "info" marks is network plus event-loop queueing.
+# --trace PATH appends one JSON line per stage (client and server) sharing the request id.
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+
+class TurnTimings:
+    def __init__(self, command: str, show: bool = False, trace: Optional[str] = None):
+        self.command = command
+        self.show = bool(show)
+        self.trace = trace or None
+        self.request_id = uuid.uuid4().hex[:16]
+        self.t0 = time.perf_counter()
+        self.wall = time.time()
+        self.stages: List[Dict[str, Any]] = []
+        self.server: List[Dict[str, Any]] = []
+        self.sent_ms: Optional[float] = None
+        self._done = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.show or bool(self.trace)
+
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def mark(self, stage: str, since: Optional[float] = None):
+        """A point on the turn's timeline, or a span that began at `since` (a now() value)."""
+        end = time.perf_counter()
+        entry = {"stage": stage, "at_ms": round(((since or end) - self.t0) * 1000, 1)}
+        if since is not None:
+            entry["ms"] = round((end - since) * 1000, 1)
+        self.stages.append(entry)
+
+    @contextmanager
+    def span(self, stage: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(stage, t)
+
+    def request_fields(self) -> Dict[str, Any]:
+        """Fields for the /ws/stream request (or session turn) that ask for the server's timeline."""
+        return {"request_id": self.request_id, "timings": True} if self.enabled else {}
+
+    def sent(self):
+        """Call right after the request went out: the server's clock starts (about) here."""
+        self.mark("sent")
+        self.sent_ms = self.stages[-1]["at_ms"]
+
+    def server_timings(self, final: Dict[str, Any]):
+        self.server = list((final.get("timings") or {}).get("stages") or [])
+
+    # ---- output ---------------------------------------------------------------------
+    def timeline(self) -> List[Dict[str, Any]]:
+        rows = [{"side": "client", **e} for e in self.stages]
+        shift = self.sent_ms or 0.0
+        rows += [{"side": "server", **e, "at_ms": round(e["at_ms"] + shift, 1)} for e in self.server]
+        return sorted(rows, key=lambda r: r["at_ms"])
+
+    def _at(self, side: str, stage: str) -> Optional[float]:
+        return next((r["at_ms"] for r in self.timeline() if r["side"] == side and r["stage"] == stage), None)
+
+    def summary(self) -> str:
+        lines = [f"--- Timings ({self.command}, request {self.request_id}) ---", "   at ms       ms  side    stage"]
+        for r in self.timeline():
+            ms = f"{r['ms']:8.0f}" if "ms" in r else " " * 8
+            lines.append(f"{r['at_ms']:8.0f} {ms}  {r['side']:<6}  {r['stage']}")
+        if self.sent_ms is not None:
+            for stage in ("info", "first audio"):
+                client, server = self._at("client", stage), self._at("server", stage)
+                if client is None:
+                    continue
+                line = f"time to {stage}: {client - self.sent_ms:.0f} ms"
+                if server is not None:
+                    line += f" (server {server - self.sent_ms:.0f} ms, network/queueing ~{client - server:.0f} ms)"
+                lines.append(line)
+        return "\n".join(lines)
+
+    def export(self, path: str):
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for r in self.timeline():
+                f.write(json.dumps({"ts": round(self.wall + r["at_ms"] / 1000, 3), "request_id": self.request_id,
+                                    "command": self.command, **r}) + "\n")
+
+    def finish(self):
+        """Print and/or export once, at the end of the turn."""
+        if self._done or not self.enabled:
+            return
+        self._done = True
+        if self.show:
+            print("\n" + self.summary(), file=sys.stderr)
+        if self.trace:
+            self.export(self.trace)
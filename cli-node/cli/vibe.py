@@ -1,14 +1,23 @@
 ﻿# cli/vibe.py
-import os, sys, base64, tempfile, requests, typer
+# Heavy deps (requests, websockets, pyaudio) are imported inside the commands that use them,
+# so `vibe --help` / `vibe voices` stay fast. Check with: python profile_imports.py vibe
+import os, sys, base64, tempfile, typer
 from typing import List, Optional
 import sys
 try: sys.stdout.reconfigure(encoding="utf-8")
 except Exception: pass
-import  json,  asyncio, websockets, pyaudio
 
 
 
 APP = typer.Typer(no_args_is_help=True, add_completion=False)
+
+@APP.callback()
+def _root(profile: Optional[str] = typer.Option(os.getenv("VIBE_PROFILE"), "--profile",
+                                                help="Sample the command and write PATH.folded (flamegraph) and PATH.txt")):
+    if profile:
+        import cli_profile
+        cli_profile.start(profile)
+
 @APP.command(help="Stream TTS (no external player).")
 def stream(
     prompt: str,
@@ -18,14 +27,31 @@ def stream(
     style: Optional[str] = typer.Option(None, "--style"),
     fmt: str = typer.Option("WAV", "--format"),
     files: List[str] = typer.Option(None, "--file", "-f"),
+    deadline: float = typer.Option(120.0, "--deadline", help="Seconds to wait for the answer; the service spends only what is left"),
+    codec: Optional[str] = typer.Option(os.getenv("VIBE_CODEC"), "--codec", help="Transport codec: pcm, mulaw or adpcm (comma list = preference order)"),
+    sample_rate: Optional[int] = typer.Option(None, "--sample-rate", help="Playback rate to ask for: 16000, 22050, 24000, 44100 or 48000"),
+    timings: bool = typer.Option(False, "--timings", help="Print where the turn's time went (client and service stages)"),
+    trace: Optional[str] = typer.Option(os.getenv("VIBE_TRACE"), "--trace", help="Append the turn's stage timings to this JSONL file"),
 ):
+    import json, asyncio, pyaudio
+    from audio_codec import decoder, request_fields
+    from service_socket import ws_connect
+    from turn_timings import TurnTimings
+    turn = TurnTimings("vibe stream", show=timings, trace=trace)
+
     async def _run():
-        payload = {"text": prompt, "language": lang, "voice_id": voice, "style": style, "format": fmt, "files": files}
-        async with websockets.connect(api_ws) as ws:
+        payload = {"text": prompt, "language": lang, "voice_id": voice, "style": style, "format": fmt, "files": files,
+                   "deadline_ms": int(deadline * 1000), **request_fields(codec, sample_rate), **turn.request_fields()}
+        connect_t = turn.now()
+        async with await ws_connect(api_ws) as ws:
+            turn.mark("ws connect", connect_t)
             await ws.send(json.dumps(payload))
+            turn.sent()
             pa = None
             stream = None
             first_chunk = True
+            decode = None
+            play_t = None
             try:
                 while True:
                     msg = await ws.recv()
@@ -34,7 +60,9 @@ def stream(
                         typer.secho("Error: " + data["error"], fg="red")
                         break
                     if "info" in data:
+                        turn.mark("info")
                         info = data["info"]
+                        decode = decoder(info)
                         print("\n--- Transcript ---\n" + info.get("transcript","").strip() + "\n")
                         # init audio device
                         pa = pyaudio.PyAudio()
@@ -44,24 +72,35 @@ def stream(
                         )
                         continue
                     if "audio_b64" in data:
+                        if play_t is None:
+                            turn.mark("first audio")
+                            play_t = turn.now()
                         chunk = base64.b64decode(data["audio_b64"])
+                        if decode:
+                            chunk = decode(chunk)
                         # skip WAV header on the very first frame
-                        if first_chunk and len(chunk) > 44:
+                        elif first_chunk and len(chunk) > 44:
                             chunk = chunk[44:]
                             first_chunk = False
                         if stream:
                             stream.write(chunk)
                         continue
                     if data.get("final"):
+                        turn.server_timings(data)
                         break
             finally:
                 if stream:
                     stream.stop_stream()
                     stream.close()
+                if play_t is not None:
+                    turn.mark("playback", play_t)
                 if pa:
                     pa.terminate()
 
-    asyncio.run(_run())
+    try:
+        asyncio.run(_run())
+    finally:
+        turn.finish()
 
 def _abs_existing(paths: Optional[List[str]]) -> Optional[List[str]]:
     if not paths:
@@ -85,6 +124,80 @@ def _play_inline_windows_wav(wav_bytes: bytes) -> bool:
     except Exception:
         return False
 
+def _speak_streaming(url: str, payload: dict, save: Optional[str], timeout: float = 120.0):
+    """POST to /speak/stream and play PCM as it arrives (constant memory, no base64)."""
+    import pyaudio
+    from service_socket import session_for
+    payload = dict(payload, format="wav")
+    with session_for(url).post(url, json=payload, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        t_b64 = r.headers.get("X-Vibe-Transcript-B64")
+        if t_b64:
+            print("\n--- Transcript ---\n" + base64.b64decode(t_b64).decode("utf-8").strip() + "\n")
+        rate = int(r.headers.get("X-Sample-Rate", 44100))
+        channels = int(r.headers.get("X-Channels", 1))
+
+        pa = pyaudio.PyAudio()
+        out = pa.open(format=pyaudio.paInt16, channels=channels, rate=rate, output=True)
+        f = open(save, "wb") if save else None
+        header = b""
+        carry = b""
+        try:
+            for chunk in r.iter_content(chunk_size=4096):
+                if f:
+                    f.write(chunk)
+                # our own streaming WAV header is exactly 44 bytes
+                if len(header) < 44:
+                    need = 44 - len(header)
+                    header += chunk[:need]
+                    chunk = chunk[need:]
+                chunk = carry + chunk
+                # PyAudio wants whole 16-bit frames
+                cut = len(chunk) - (len(chunk) % (2 * channels))
+                carry = chunk[cut:]
+                if cut:
+                    out.write(chunk[:cut])
+        finally:
+            out.stop_stream()
+            out.close()
+            pa.terminate()
+            if f:
+                # now the length is known: patch RIFF/data sizes so the file is a normal WAV
+                size = f.tell()
+                if size >= 44:
+                    f.seek(4); f.write((size - 8).to_bytes(4, "little"))
+                    f.seek(40); f.write((size - 44).to_bytes(4, "little"))
+                f.close()
+                print(f"(Saved: {os.path.abspath(save)})")
+
+def _speak_many(url: str, payload: dict, save: Optional[str], timeout: float = 120.0):
+    """One prompt, several locales: show each transcript, then play (Windows + WAV) or save each answer."""
+    from service_socket import session_for
+    r = session_for(url).post(url, json=payload, timeout=timeout)
+    r.raise_for_status()
+    data = r.json()
+    stem, ext = os.path.splitext(save) if save else (None, "")
+    failed = 0
+    for ans in data["answers"]:
+        lang = ans["language"]
+        if ans.get("error"):
+            failed += 1
+            typer.secho(f"[{lang}] {ans['error']}", fg="red")
+            continue
+        print(f"\n--- {lang} ({ans.get('voice_id')}, {ans.get('seconds', 0):.1f}s) ---\n" + (ans.get("text") or "").strip() + "\n")
+        audio = base64.b64decode(ans["audio_b64"])
+        is_wav = "wav" in (ans.get("mime") or "")
+        if is_wav and sys.platform.startswith("win") and not save and _play_inline_windows_wav(audio):
+            continue
+        out = f"{stem}.{lang}{ext or ('.wav' if is_wav else '.mp3')}" if save else \
+            tempfile.NamedTemporaryFile(suffix=f".{lang}" + (".wav" if is_wav else ".mp3"), delete=False).name
+        with open(out, "wb") as f:
+            f.write(audio)
+        print(f"Saved: {os.path.abspath(out)}")
+    print(f"({len(data['answers'])} locales in {data['seconds']:.1f}s)")
+    if failed == len(data["answers"]):
+        raise typer.Exit(code=1)
+
 @APP.command(help="Send a prompt and speak the answer inline (no external player).")
 def main(
     prompt: str = typer.Argument(..., help="Your prompt"),
@@ -95,8 +208,12 @@ def main(
     style: Optional[str] = typer.Option(None, "--style", help="Optional TTS style"),
     files: List[str] = typer.Option(None, "--file", "-f", help="File(s) to include as context", show_default=False),
     save: Optional[str] = typer.Option(None, "--save", help="Optional path to save audio"),
+    stream_audio: bool = typer.Option(False, "--stream", help="Use /speak/stream and play audio while it downloads"),
+    deadline: float = typer.Option(120.0, "--deadline", help="Seconds to wait for the answer; the service spends only what is left"),
+    langs: Optional[str] = typer.Option(None, "--langs", help="Answer in several locales at once, e.g. en-US,hi-IN,es-ES (uses /speak/multi)"),
 ):
-    payload = {"text": prompt, "format": fmt}
+    # The service gets the budget minus a little slack for the response to travel back
+    payload = {"text": prompt, "format": fmt, "deadline_ms": int(max(deadline - 1, 1) * 1000)}
     if lang:  payload["language"] = lang
     if voice: payload["voice_id"] = voice
     if style: payload["style"] = style
@@ -104,7 +221,18 @@ def main(
     if abs_files:
         payload["files"] = abs_files
 
-    r = requests.post(api, json=payload, timeout=120)
+    if langs:
+        payload.pop("language", None)
+        payload["languages"] = [l.strip() for l in langs.split(",") if l.strip()]
+        _speak_many(api.rstrip("/") + "/multi", payload, save, timeout=deadline)
+        return
+
+    if stream_audio:
+        _speak_streaming(api.rstrip("/") + "/stream", payload, save, timeout=deadline)
+        return
+
+    from service_socket import session_for
+    r = session_for(api).post(api, json=payload, timeout=deadline)
     r.raise_for_status()
     data = r.json()
 
@@ -151,6 +279,167 @@ def main(
     elif not sys.platform.startswith("win"):
         print("Tip: inline playback is implemented for Windows only. Saved instead.")
 
+@APP.command(help="List all available Murf voices from voices.json")
+def voices(
+    voices_path: str = os.path.join(os.path.dirname(__file__), '../../local-service/voices.json')
+):
+    import json
+    try:
+        with open(voices_path, encoding="utf-8") as f:
+            catalog = json.load(f)
+    except Exception as e:
+        typer.secho(f"Could not load voices.json: {e}", fg="red")
+        raise typer.Exit(code=1)
+
+    for locale, entries in catalog.items():
+        typer.secho(f"\nLocale: {locale}", fg="cyan")
+        for v in entries:
+            typer.echo(f"  {v.get('name', v['id'])} (id: {v['id']}) | Styles: {', '.join(v.get('styles', []))}")
+
+# ---- batch narration jobs (service: POST /jobs) -------------------------------------
+JOBS = typer.Typer(no_args_is_help=True, add_completion=False,
+                   help="Batch narration: queue many texts/files on the service and follow the job.")
+APP.add_typer(JOBS, name="jobs")
+JOBS_API = os.getenv("VIBE_JOBS_API", "http://127.0.0.1:8001/jobs")
+SKIP_DIRS = {".git", ".venv", "venv", "node_modules", "__pycache__", "_cache", "dist", "build"}
+
+def _markdown_sections(path: str) -> List[dict]:
+    """One verbatim text item per heading section of a markdown file."""
+    import re
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        parts = re.split(r"(?m)^(?=#{1,6}\s)", f.read())
+    items = []
+    for part in parts:
+        title, _, body = part.strip().partition("\n")
+        if body.strip():
+            items.append({"text": part.strip(), "id": title.lstrip("#").strip() or os.path.basename(path)})
+    return items
+
+def _job_items(paths: List[str], texts: List[str], glob: str, sections: bool) -> List[dict]:
+    import fnmatch
+    items = [{"text": t} for t in texts or []]
+    for p in paths or []:
+        found = [p]
+        if os.path.isdir(p):
+            found = []
+            for root, dirs, names in os.walk(p):
+                dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and not d.startswith("."))
+                found += [os.path.join(root, n) for n in sorted(names) if fnmatch.fnmatch(n, glob)]
+        for f in found:
+            if not os.path.isfile(f):
+                typer.secho(f"Skipping {f}: not a file", fg="yellow")
+            elif sections and f.lower().endswith((".md", ".markdown")):
+                items += _markdown_sections(f)
+            else:
+                items.append({"file": os.path.abspath(f), "id": os.path.relpath(f, p if os.path.isdir(p) else os.path.dirname(f) or ".")})
+    return items
+
+def _job_line(item: dict) -> str:
+    state = item["state"]
+    extra = f"{item.get('seconds', 0):.1f}s" if state == "done" else item.get("error", "")
+    return f"  #{item['index']:<3} {state:<9} {item['audio']}  {extra}".rstrip()
+
+def _follow(api: str, job_id: str, interval: float, out: Optional[str]) -> dict:
+    import time
+    from service_socket import session_for
+    http = session_for(api)
+    seen = {}
+    while True:
+        job = http.get(f"{api}/{job_id}", timeout=30).json()
+        for it in job["items"]:
+            if it["state"] in ("done", "failed", "cancelled") and seen.get(it["index"]) != it["state"]:
+                seen[it["index"]] = it["state"]
+                typer.secho(_job_line(it), fg="red" if it["state"] == "failed" else None)
+        c = job["counts"]
+        if job["state"] != "running":
+            break
+        print(f"  … {c['done']}/{job['total']} done, {c['running']} running, {c['queued']} queued", end="\r", flush=True)
+        time.sleep(interval)
+    c = job["counts"]
+    typer.secho(f"Job {job_id}: {job['state']} ({c['done']}/{job['total']} done, {c['failed']} failed)",
+                fg="green" if job["state"] == "done" else "yellow")
+    print(f"Audio on the service: {job['dir']}")
+    if out:
+        os.makedirs(out, exist_ok=True)
+        for it in job["items"]:
+            if it["state"] == "done":
+                r = http.get(f"{api}/{job_id}/items/{it['index']}/audio", timeout=60)
+                r.raise_for_status()
+                with open(os.path.join(out, it["audio"]), "wb") as f:
+                    f.write(r.content)
+        print(f"Downloaded to: {os.path.abspath(out)}")
+    return job
+
+@JOBS.command("submit", help="Queue files (Gemini walkthroughs), markdown sections or texts for narration.")
+def jobs_submit(
+    paths: List[str] = typer.Argument(None, help="Files or directories (directories are walked with --glob)"),
+    texts: List[str] = typer.Option(None, "--text", "-t", help="Text to narrate as written (repeatable)"),
+    glob: str = typer.Option("*.py", "--glob", help="File pattern when walking directories"),
+    sections: bool = typer.Option(False, "--sections", help="Narrate markdown files section by section, as written"),
+    lang: Optional[str] = typer.Option(None, "--lang", "-l"),
+    voice: Optional[str] = typer.Option(None, "--voice-id"),
+    style: Optional[str] = typer.Option(None, "--style"),
+    fmt: str = typer.Option("wav", "--format", help="wav or mp3"),
+    sample_rate: Optional[int] = typer.Option(None, "--sample-rate"),
+    api: str = typer.Option(JOBS_API, "--api"),
+    follow: bool = typer.Option(True, "--follow/--no-follow", help="Stay and report progress until the job ends"),
+    out: Optional[str] = typer.Option(None, "--out", help="Download the finished audio into this directory"),
+    interval: float = typer.Option(2.0, "--interval"),
+):
+    from service_socket import session_for
+    items = _job_items(paths, texts, glob, sections)
+    if not items:
+        typer.secho("Nothing to narrate.", fg="red")
+        raise typer.Exit(code=1)
+    payload = {"items": items, "format": fmt}
+    for k, v in (("language", lang), ("voice_id", voice), ("style", style), ("sample_rate", sample_rate)):
+        if v:
+            payload[k] = v
+    r = session_for(api).post(api, json=payload, timeout=60)
+    if r.status_code >= 400:
+        typer.secho(f"Error {r.status_code}: {r.text[:400]}", fg="red")
+        raise typer.Exit(code=1)
+    job = r.json()
+    print(f"Job {job['id']}: {job['total']} item(s) queued")
+    if follow:
+        job = _follow(api, job["id"], interval, out)
+        if job["state"] == "failed":
+            raise typer.Exit(code=1)
+
+@JOBS.command("follow", help="Report a job's progress until it ends.")
+def jobs_follow(job_id: str, api: str = typer.Option(JOBS_API, "--api"),
+                out: Optional[str] = typer.Option(None, "--out", help="Download the finished audio into this directory"),
+                interval: float = typer.Option(2.0, "--interval")):
+    if _follow(api, job_id, interval, out)["state"] == "failed":
+        raise typer.Exit(code=1)
+
+@JOBS.command("list", help="List jobs on the service.")
+def jobs_list(api: str = typer.Option(JOBS_API, "--api")):
+    from service_socket import session_for
+    for job in session_for(api).get(api, timeout=30).json()["jobs"]:
+        c = job["counts"]
+        print(f"{job['id']}  {job['state']:<9} {c['done']}/{job['total']} done, {c['failed']} failed")
+
+@JOBS.command("cancel", help="Stop a job; items already narrated are kept.")
+def jobs_cancel(job_id: str, api: str = typer.Option(JOBS_API, "--api")):
+    from service_socket import session_for
+    r = session_for(api).post(f"{api}/{job_id}/cancel", timeout=30)
+    r.raise_for_status()
+    print(f"Job {job_id}: {r.json()['state']}")
+
+@JOBS.command("resume", help="Run a job's unfinished, failed or cancelled items again.")
+def jobs_resume(job_id: str, api: str = typer.Option(JOBS_API, "--api"),
+                follow: bool = typer.Option(True, "--follow/--no-follow"),
+                out: Optional[str] = typer.Option(None, "--out"),
+                interval: float = typer.Option(2.0, "--interval")):
+    from service_socket import session_for
+    r = session_for(api).post(f"{api}/{job_id}/resume", timeout=30)
+    r.raise_for_status()
+    job = r.json()
+    print(f"Job {job_id}: {job['counts']['queued']} item(s) queued again")
+    if follow and _follow(api, job_id, interval, out)["state"] == "failed":
+        raise typer.Exit(code=1)
+
 def main():
     APP()
 
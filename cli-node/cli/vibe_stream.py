@@ -3,19 +3,24 @@ def _to_str_or_none(val):
         return None
     return val
 # cli/vibe_stream.py
-import os, json, base64, asyncio, websockets, typer
+# websockets/pyaudio and the log file are set up inside `stream`, not at import,
+# so `--help` and `voices` don't pay for them. Check with: python profile_imports.py vibe_stream
+import os, json, typer
 import logging
 
-# Setup logging (file and console)
 LOG_FILE = os.path.join(os.path.dirname(__file__), 'vibe_cli.log')
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+
+def _setup_logging():
+    # file and console
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s',
+        handlers=[
+            logging.FileHandler(LOG_FILE, encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
 from cache_utils import make_cache_key, cache_exists, load_cache, save_cache
 from typing import Optional, List
 import re
@@ -57,6 +62,15 @@ APP = typer.Typer(no_args_is_help=True, add_completion=False)
 
 VOICE_ID_FILE = os.path.join(os.path.dirname(__file__), '.last_voice_id')
 
+def _similar_index():
+    """The similar-prompt index, or None (exact cache only) when NumPy is not installed."""
+    try:
+        import semantic_cache
+        return semantic_cache.get_index()
+    except ImportError as e:
+        typer.secho(f"[CACHE] Similar-prompt cache off: {e.name or e} is not installed.", fg="yellow")
+        return None
+
 @APP.command(help="Stream TTS from the local FastAPI WS (/ws/stream) with inline playback (no external player).")
 def stream(
     prompt: str = typer.Argument(None, help="Prompt for TTS (leave blank to use --stt-input)"),
@@ -68,11 +82,25 @@ def stream(
     files: List[str] = typer.Option(None, "--file", "-f", help="Optional file(s) for context", show_default=False),
     stt_input: bool = typer.Option(False, "--stt-input", help="Use Google STT to capture spoken prompt"),
     show_transcript: bool = typer.Option(True, "--show-transcript/--hide-transcript", help="Show transcript in console (default: on)"),
+    verbatim: bool = typer.Option(False, "--verbatim", help="Speak the prompt as-is (no Gemini rewrite, no cache)"),
+    normalize: bool = typer.Option(True, "--normalize/--no-normalize", help="Let the service strip markdown/code from the spoken text (transcript is unchanged)"),
+    codec: Optional[str] = typer.Option(os.getenv("VIBE_CODEC"), "--codec", help="Transport codec: pcm, mulaw or adpcm (comma list = preference order)"),
+    sample_rate: Optional[int] = typer.Option(None, "--sample-rate", help="Playback rate to ask for: 16000, 22050, 24000, 44100 or 48000"),
+    deadline: float = typer.Option(60.0, "--deadline", help="Seconds to wait for the answer to start playing; the service spends only what is left"),
+    profile: Optional[str] = typer.Option(os.getenv("VIBE_PROFILE"), "--profile", help="Sample this run and write PATH.folded (flamegraph) and PATH.txt"),
+    timings: bool = typer.Option(False, "--timings", help="Print where the turn's time went (client and service stages)"),
+    trace: Optional[str] = typer.Option(os.getenv("VIBE_TRACE"), "--trace", help="Append the turn's stage timings to this JSONL file"),
+    similar: bool = typer.Option(os.getenv("VIBE_SEMANTIC_CACHE", "0") == "1", "--similar-cache/--exact-cache",
+                                 help="Also reuse answers to near-identical earlier prompts (needs NumPy; see cache-report)"),
 ):
     """
     Connects to your FastAPI proxy at /ws/stream which relays to Murf's WS API.
     Plays audio inline using PyAudio; never launches an external media player.
     """
+    import base64, asyncio
+    from audio_codec import decoder, request_fields
+    from service_socket import ws_connect
+    _setup_logging()
 
 
     # Ensure all possibly OptionInfo variables are safe before any logic
@@ -82,6 +110,17 @@ def stream(
     voice = _to_str_or_none(voice)
     style = _to_str_or_none(style)
     fmt = _to_str_or_none(fmt)
+    verbatim = bool(_to_str_or_none(verbatim))
+    deadline = float(_to_str_or_none(deadline) or 60.0)
+    normalize = _to_str_or_none(normalize) is not False
+    codec = _to_str_or_none(codec)
+    sample_rate = _to_str_or_none(sample_rate)
+    profile = _to_str_or_none(profile)
+    if profile:
+        import cli_profile
+        cli_profile.start(profile)
+    from turn_timings import TurnTimings
+    turn = TurnTimings("vibe_stream stream", show=_to_str_or_none(timings) is True, trace=_to_str_or_none(trace))
 
     try:
         import pyaudio
@@ -102,11 +141,12 @@ def stream(
         pause = typer.prompt("Pause threshold (seconds, default 2.5)", default=2.5, type=float)
         recognizer.pause_threshold = pause
         typer.secho(f"Pause threshold set to {pause} seconds.", fg="yellow")
-        with sr.Microphone() as source:
+        with sr.Microphone() as source, turn.span("stt capture"):
             typer.secho("Speak now...", fg="cyan")
             audio = recognizer.listen(source)
         try:
-            prompt = recognizer.recognize_google(audio)
+            with turn.span("stt recognition"):
+                prompt = recognizer.recognize_google(audio)
             typer.secho(f"Recognized: {prompt}", fg="green")
         except sr.UnknownValueError:
             typer.secho("Could not understand audio.", fg="red")
@@ -129,8 +169,8 @@ def stream(
         except Exception:
             pass
 
-    # Auto-detect language from prompt if not set
-    detected_lang = extract_lang_from_prompt(prompt) if prompt else None
+    # Auto-detect language from prompt if not set (verbatim text is not an instruction)
+    detected_lang = extract_lang_from_prompt(prompt) if prompt and not verbatim else None
     lang_to_use = lang or detected_lang
     if detected_lang and not lang:
         typer.secho(f"Detected language from prompt: {detected_lang}", fg="yellow")
@@ -139,11 +179,12 @@ def stream(
     file_pattern = re.compile(r"([\w\-\.]+\.py)", re.IGNORECASE)
     found_files = []
     repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-    if prompt:
-        for match in file_pattern.findall(prompt):
-            for root, dirs, filenames in os.walk(repo_root):
-                if match in filenames:
-                    found_files.append(os.path.abspath(os.path.join(root, match)))
+    if prompt and not verbatim:
+        with turn.span("file scan"):
+            for match in file_pattern.findall(prompt):
+                for root, dirs, filenames in os.walk(repo_root):
+                    if match in filenames:
+                        found_files.append(os.path.abspath(os.path.join(root, match)))
     if found_files:
         # Ensure files is a list before combining
         if not isinstance(files, list) or files is None:
@@ -162,7 +203,10 @@ def stream(
             files = []
         files = [f for f in files if isinstance(f, str)]
         payload = {"text": prompt, "language": lang_to_use, "voice_id": voice,
-                   "style": style, "format": fmt, "files": files}
+                   "style": style, "format": fmt, "files": files,
+                   "mode": "verbatim" if verbatim else "answer",
+                   "deadline_ms": int(deadline * 1000), "normalize": normalize,
+                   **request_fields(codec, sample_rate), **turn.request_fields()}
         # Prepare cache key
         file_path = files[0] if files else None
         # Ensure all values are JSON serializable (non-destructive)
@@ -174,18 +218,35 @@ def stream(
             _to_str_or_none(style),
             _to_str_or_none(fmt)
         )
-        if cache_exists(key):
-            cached = load_cache(key)
+        scope = None
+        with turn.span("cache lookup"):
+            cached = load_cache(key) if not verbatim and cache_exists(key) else None
+            index = _similar_index() if similar and not verbatim else None
+            if index is not None:
+                # STT rarely hears a question the same way twice: try earlier prompts that are close enough
+                import semantic_cache
+                scope = semantic_cache.scope_of(lang_to_use, voice, files)
+                match = None if cached else index.lookup(prompt, scope)
+                if match and cache_exists(match.key):
+                    cached = load_cache(match.key)
+                    logging.info(f"Similar-prompt cache hit ({match.score:.2f}) for key: {match.key}")
+                    typer.secho(f"[CACHE] Same question as \"{match.prompt}\" (similarity {match.score:.2f}).", fg="green")
+        if cached:
             logging.info(f"Cache hit for key: {key}")
             typer.secho("[CACHE] Loaded transcript and audio from cache.", fg="green")
             if show_transcript:
                 print("\n--- Transcript ---\n" + cached["transcript"] + "\n")
             return
-        async with websockets.connect(api_ws) as ws:
+        connect_t = turn.now()
+        async with await ws_connect(api_ws) as ws:
+            turn.mark("ws connect", connect_t)
             await ws.send(json.dumps(payload))
+            turn.sent()
             pa = None
             stream = None
             first = True
+            decode = None
+            play_t = None
             try:
                 while True:
                     msg = await ws.recv()
@@ -197,6 +258,7 @@ def stream(
                         break
 
                     if "info" in data:
+                        turn.mark("info")
                         info = data["info"]
                         transcript = (info.get("transcript") or "").strip()
                         if transcript:
@@ -204,6 +266,7 @@ def stream(
                             if show_transcript:
                                 print("\n--- Transcript ---\n" + transcript + "\n")
                             cached_transcript = transcript
+                        decode = decoder(info)
                         # Initialize audio device
                         pa = pyaudio.PyAudio()
                         stream = pa.open(
@@ -215,9 +278,15 @@ def stream(
                         continue
 
                     if "audio_b64" in data:
+                        if play_t is None:
+                            turn.mark("first audio")
+                            play_t = turn.now()
                         chunk = base64.b64decode(data["audio_b64"])
+                        if decode:
+                            # compact codec: every frame is a self-contained block, no WAV header
+                            chunk = decode(chunk)
                         # Skip the WAV header in the very first chunk
-                        if first and len(chunk) > 44:
+                        elif first and len(chunk) > 44:
                             chunk = chunk[44:]
                             first = False
                         if stream:
@@ -226,24 +295,46 @@ def stream(
                         continue
 
                     if data.get("final"):
+                        turn.server_timings(data)
                         # Save transcript and dummy audio_b64 to cache (real audio caching for streaming is complex)
-                        if 'cached_transcript' in locals():
+                        if 'cached_transcript' in locals() and not verbatim:
                             save_cache(key, cached_transcript, None, info.get("mime", "audio/wav"))
+                            if scope is not None:
+                                index.add(key, prompt, scope)
                             logging.info(f"Saved transcript to cache for key: {key}")
                             typer.secho("[CACHE] Saved transcript to cache.", fg="yellow")
                         break
             finally:
                 if stream:
-                    stream.stop_stream()
+                    stream.stop_stream()        # returns once the buffered audio has played
                     stream.close()
+                if play_t is not None:
+                    turn.mark("playback", play_t)
                 if pa:
                     pa.terminate()
 
-    asyncio.run(_run())
+    try:
+        asyncio.run(_run())
+    finally:
+        turn.finish()
+
+def speak(text: str, lang: Optional[str] = "en-US", voice: Optional[str] = None, style: Optional[str] = None):
+    """
+    Speak already-final text (git output, issue lists, agent results) without the Gemini round trip.
+    Queued on the shared background speaker (speaker.py), so this returns immediately.
+    """
+    from speaker import speak as queue_speech
+    queue_speech(text, lang=lang, voice=voice, style=style)
+
+@APP.command("cache-report", help="Precision / hit rate of the similar-prompt cache per threshold, and what it has served")
+def cache_report():
+    import semantic_cache
+    typer.echo(semantic_cache.report())
+    typer.echo(f"Threshold: {semantic_cache.THRESHOLD} (VIBE_SEMANTIC_THRESHOLD)")
 
 @APP.command(help="List all available Murf voices from voices.json")
 def voices(
-    voices_path: str = os.path.join(os.path.dirname(__file__), '../local-service/voices.json')
+    voices_path: str = os.path.join(os.path.dirname(__file__), '../../local-service/voices.json')
 ):
     """
     Prints all available voices, their IDs, locales, and styles.
@@ -264,7 +355,7 @@ def voices(
 
 @APP.command(help="Interactively select a Murf voice and print its ID")
 def select_voice(
-    voices_path: str = os.path.join(os.path.dirname(__file__), '../local-service/voices.json')
+    voices_path: str = os.path.join(os.path.dirname(__file__), '../../local-service/voices.json')
 ):
     """
     Prompts the user to select a voice from voices.json and prints the chosen voice ID. Saves selection for future use.
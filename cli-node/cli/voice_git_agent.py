@@ -6,7 +6,24 @@
 import os
 import subprocess
 import speech_recognition as sr
-from vibe_stream import stream as murf_stream
+from speaker import speak
+import git_backend
+
+# Read-only queries are answered by the persistent backend as short spoken summaries
+LOCAL_QUERIES = {
+    "git status": lambda repo: git_backend.speak_status(repo.status()),
+    "git log -1": lambda repo: git_backend.speak_commit(repo.commit()),
+    "git log -5": lambda repo: git_backend.speak_log(repo.log(5)),
+}
+
+def answer_locally(command):
+    query = LOCAL_QUERIES.get(command)
+    if query is None:
+        return None
+    try:
+        return query(git_backend.get_backend())
+    except subprocess.CalledProcessError as e:
+        return f"Error: {(e.stderr or b'').decode('utf-8', 'replace').strip() or e}"
 
 def run_git_command(command):
     try:
@@ -35,9 +52,11 @@ def parse_intent(text):
             return None, "Please specify a branch name."
     if "show last commit" in text:
         return ["git log -1"], "Showing last commit."
+    if "recent commits" in text or "log" in text.split():
+        return ["git log -5"], "Showing recent commits."
     if "push" in text:
         return ["git push"], "Pushing changes to origin."
-    return None, "Command not recognized. Try: status, commit, create branch, show last commit, push."
+    return None, "Command not recognized. Try: status, commit, create branch, show last commit, recent commits, push."
 
 def listen_google():
     recognizer = sr.Recognizer()
@@ -71,16 +90,18 @@ def main():
         commands, feedback = parse_intent(command_text)
         if not commands:
             print(feedback)
-            murf_stream(prompt=feedback, lang="en", stt_input=False)
+            speak(feedback)
             continue
         results = []
         for cmd in commands:
             print(f"Running: {cmd}")
-            res = run_git_command(cmd)
+            res = answer_locally(cmd)
+            if res is None:
+                res = run_git_command(cmd)
             results.append(res)
         output = feedback + "\n" + "\n".join(results)
         print(output)
-        murf_stream(prompt=output, lang="en", stt_input=False)
+        speak(output)
 
 if __name__ == "__main__":
     main()
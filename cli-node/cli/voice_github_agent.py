@@ -5,12 +5,14 @@
 import os
 import requests
 import speech_recognition as sr
-from vibe_stream import stream as murf_stream
+from speaker import speak
+from github_mirror import GITHUB_API, TIMEOUT, IssueMirror, format_issues
 
 GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
 GITHUB_REPO = os.environ.get("GITHUB_REPO", "owner/repo")  # e.g., "octocat/Hello-World"
-GITHUB_API = "https://api.github.com"
-HEADERS = {"Authorization": f"token {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3+json"}
+
+# list/search are answered from a local mirror refreshed with conditional requests
+MIRROR = IssueMirror(GITHUB_REPO, token=GITHUB_TOKEN)
 
 
 
@@ -23,7 +25,7 @@ def get_command():
 
 def create_issue(title):
     url = f"{GITHUB_API}/repos/{GITHUB_REPO}/issues"
-    resp = requests.post(url, headers=HEADERS, json={"title": title})
+    resp = MIRROR.session.post(url, json={"title": title}, timeout=TIMEOUT)
     if resp.status_code == 201:
         return f"Issue created: {title}"
     else:
@@ -31,20 +33,42 @@ def create_issue(title):
 
 
 def list_issues():
-    url = f"{GITHUB_API}/repos/{GITHUB_REPO}/issues"
-    resp = requests.get(url, headers=HEADERS)
-    if resp.status_code == 200:
-        issues = resp.json()
-        if not issues:
-            return "No open issues."
-        return "Open issues:\n" + "\n".join(f"#{i['number']}: {i['title']}" for i in issues)
-    else:
-        return f"Failed to list issues: {resp.text}"
+    """Yield spoken chunks: page 1 as soon as it lands, later pages as they finish loading."""
+    seen = sent = 0
+    try:
+        for page in MIRROR.refresh():
+            sent += 1
+            if page:
+                yield ("Open issues:\n" if not seen else "") + format_issues(page)
+                seen += len(page)
+        if not seen:
+            yield "No open issues."
+    except requests.RequestException as e:
+        # only the pages not spoken yet come from the mirror
+        cached = MIRROR.issues(refresh=False, after_page=sent)
+        if not cached:
+            yield f"GitHub stopped answering after {seen} issues." if seen else f"Failed to list issues: {e}"
+            return
+        where = "the rest" if seen else "showing"
+        yield f"GitHub is unreachable, {where} {len(cached)} issues from the local mirror:\n" + format_issues(cached)
+
+
+def search_issues(query):
+    try:
+        found = MIRROR.search(query)
+    except requests.RequestException:
+        found = MIRROR.search(query, refresh=False)
+    if not found:
+        return f"No open issues match '{query}'."
+    return f"{len(found)} issues match '{query}':\n" + format_issues(found)
 
 
 def parse_intent(text):
     text = text.lower()
     import re
+    m = re.search(r"(?:search|find) issues? (?:about |for |with )?(.+)", text)
+    if m:
+        return "search", m.group(1).strip('"')
     # Support more natural language for creating issues
     create_patterns = [
         r"create issue[:]? (.+)",
@@ -75,11 +99,16 @@ def main():
         if intent == "create" and arg:
             result = create_issue(arg)
         elif intent == "list":
-            result = list_issues()
+            for chunk in list_issues():
+                print(chunk)
+                speak(chunk)
+            continue
+        elif intent == "search" and arg:
+            result = search_issues(arg)
         else:
-            result = "Command not recognized. Try: 'create issue <title>' or 'list issues'."
+            result = "Command not recognized. Try: 'create issue <title>', 'list issues' or 'search issues <words>'."
         print(result)
-        murf_stream(prompt=result, lang="en", stt_input=False)
+        speak(result)
 
 if __name__ == "__main__":
     main()
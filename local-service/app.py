@@ -1,19 +1,34 @@
 # app.py — Murf-only, adds /ws/stream (WebSocket) + keeps /speak (REST)
-import os, io, json, base64, asyncio
+import os, io, re, json, hmac, time, uuid, base64, asyncio, logging, struct, threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 
-import requests
-import websockets
-from fastapi import FastAPI, HTTPException, Response, Query, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Request, Response, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 
-# LLM (Gemini) for text generation before TTS
-import google.generativeai as genai
+import lifecycle
+import metrics
+import profiling
+import quota
+import segmented
+import shared_cache
+from audio_post import CLIENT_RATES, TRIM_SILENCE, PcmPostProcessor, process_wav
+from jobs import JobRunner
+from speech_text import prepare_speech
+from transport_codec import CODECS, encoder
+from tts import GTtsTTS, MurfTTS, Pyttsx3TTS, TTSRouter
+from upstream import Deadline, call_hedged
 
+# LLM (Gemini) for text generation before TTS. google.generativeai (~0.6 s), requests and
+# websockets are imported on first use so the service is ready to accept connections quickly.
+genai = None
+
+log = logging.getLogger("uvicorn.error")
 app = FastAPI(title="Vibe Orchestrator (Murf-only + Streaming)")
+app.add_middleware(profiling.ProfileMiddleware)
 
 # ========= Models =========
 class SpeakIn(BaseModel):
@@ -23,11 +38,66 @@ class SpeakIn(BaseModel):
     style: Optional[str] = Field(None, description="Voice style (Conversational, Promo, Calm, …)")
     format: Optional[str] = Field(None, description="'wav' or 'mp3' (default wav)")
     files: Optional[List[str]] = Field(None, description="Optional file paths for brief context")
+    mode: Optional[str] = Field(None, description="'answer' (default: Gemini writes the reply) or 'verbatim' (speak text as-is)")
+    deadline_ms: Optional[int] = Field(None, description="Time budget the client will wait, in ms (default VIBE_DEADLINE_S)")
+    normalize: Optional[bool] = Field(None, description="Clean markdown/code/identifiers before TTS (default VIBE_SPEECH_NORMALIZE)")
+    sample_rate: Optional[int] = Field(None, description="Resample WAV/PCM output to this rate (16000, 22050, 24000, 44100, 48000)")
+    trim: Optional[bool] = Field(None, description="Trim leading/trailing silence (default VIBE_TRIM_SILENCE)")
+    max_pause_ms: Optional[int] = Field(None, description="Shorten internal pauses longer than this (needs trim)")
+    priority: Optional[str] = Field(None, description="'interactive' (default) or 'batch': batch work yields upstream quota")
+    client_id: Optional[str] = Field(None, description="Who is asking, for fair queuing (default: the client address)")
+    segment: Optional[bool] = Field(None, description="Synthesize long WAV answers in parallel sentence segments (default VIBE_SEGMENT_TTS)")
 
 class SpeakOut(BaseModel):
     audio_b64: str
     mime: str
     text: str
+    speech_chars: Optional[Dict[str, int]] = None
+    post: Optional[Dict[str, float]] = None
+    segmented: Optional[Dict[str, float]] = None
+    voice_id: Optional[str] = None      # the Murf voice that spoke, or "gtts"/"pyttsx3" after a failover
+
+class SpeakManyIn(SpeakIn):
+    languages: List[str] = Field(..., description="Locales to answer in, e.g. ['en-US', 'hi-IN', 'es-ES']")
+    voice_ids: Optional[Dict[str, str]] = Field(None, description="Voice per locale (default: picked for each locale)")
+
+class LocaleOut(BaseModel):
+    language: str
+    voice_id: Optional[str] = None
+    text: Optional[str] = None
+    audio_b64: Optional[str] = None
+    mime: Optional[str] = None
+    speech_chars: Optional[Dict[str, int]] = None
+    post: Optional[Dict[str, float]] = None
+    segmented: Optional[Dict[str, float]] = None
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+
+class SpeakManyOut(BaseModel):
+    answers: List[LocaleOut]
+    seconds: float
+
+class JobItemIn(BaseModel):
+    text: Optional[str] = Field(None, description="Text to narrate (spoken as written unless mode is 'answer')")
+    file: Optional[str] = Field(None, description="Absolute path of a file to walk through (Gemini explains it; text overrides the prompt)")
+    id: Optional[str] = Field(None, description="Name used for the item's audio file")
+    language: Optional[str] = None
+    voice_id: Optional[str] = None
+    style: Optional[str] = None
+    mode: Optional[str] = None
+
+class JobIn(BaseModel):
+    items: List[JobItemIn] = Field(..., description="What to narrate, one audio file per item")
+    language: Optional[str] = Field(None, description="Default locale for the items")
+    voice_id: Optional[str] = None
+    style: Optional[str] = None
+    format: Optional[str] = Field(None, description="'wav' (default) or 'mp3'")
+    mode: Optional[str] = Field(None, description="Default for text items: 'verbatim' (default) or 'answer'")
+    normalize: Optional[bool] = None
+    sample_rate: Optional[int] = None
+    trim: Optional[bool] = None
+    max_pause_ms: Optional[int] = None
+    client_id: Optional[str] = Field(None, description="Who the job's upstream calls queue as (default: the client address)")
 
 # ========= Voice catalog loader =========
 ROOT = Path(__file__).parent
@@ -103,10 +173,62 @@ def _pick_voice(locale: Optional[str], style: Optional[str], override: Optional[
 
 # ========= Gemini (text generation) =========
 def _ensure_gemini():
-    key = os.getenv("GEMINI_API_KEY")
-    if not key:
+    global genai
+    keys = quota.keys("gemini")
+    if not keys:
         raise HTTPException(500, "GEMINI_API_KEY not set")
-    genai.configure(api_key=key)
+    if genai is None:
+        import google.generativeai as genai
+    genai.configure(api_key=keys[0])
+
+_GEMINI_CLIENTS: Dict[str, Any] = {}
+_GEMINI_CLIENTS_LOCK = threading.Lock()
+
+class _GeminiOnKey:
+    """
+    generate_content / start_chat like a GenerativeModel, on one pooled API key. genai.configure holds a
+    single key for the whole process, so the requests go through that key's own service client.
+    """
+    def __init__(self, client, name: str, system_instruction: Optional[str] = None):
+        self.client = client
+        self.name = name if name.startswith("models/") else f"models/{name}"
+        self.system_instruction = system_instruction
+
+    def generate_content(self, contents, request_options: Optional[Dict[str, Any]] = None):
+        request = genai.protos.GenerateContentRequest(
+            model=self.name, contents=genai.types.content_types.to_contents(contents),
+            system_instruction=genai.types.content_types.to_content(self.system_instruction)
+            if self.system_instruction else None)
+        resp = self.client.generate_content(request, **(request_options or {}))
+        return genai.types.GenerateContentResponse.from_response(resp)
+
+    def start_chat(self, history=()):
+        return _GeminiChat(self, history)
+
+class _GeminiChat:
+    """The part of genai.ChatSession a session turn uses: send_message and the history after it."""
+    def __init__(self, model: _GeminiOnKey, history):
+        self.model = model
+        self.history = genai.types.content_types.to_contents(list(history))
+
+    def send_message(self, text: str, request_options: Optional[Dict[str, Any]] = None):
+        asked = genai.protos.Content(role="user", parts=[genai.protos.Part(text=text)])
+        resp = self.model.generate_content(self.history + [asked], request_options)
+        if resp.candidates:
+            self.history += [asked, resp.candidates[0].content]
+        return resp
+
+def _gemini_model(key: str, name: str = "gemini-1.5-flash", **kwargs) -> _GeminiOnKey:
+    """
+    A model of its own on one pooled API key. Every attempt gets a new one, so a hedged or concurrent
+    call never changes another one's key; the per-key service clients behind them are shared.
+    """
+    with _GEMINI_CLIENTS_LOCK:
+        client = _GEMINI_CLIENTS.get(key)
+        if client is None:
+            from google.ai import generativelanguage as glm
+            client = _GEMINI_CLIENTS[key] = glm.GenerativeServiceClient(client_options={"api_key": key})
+    return _GeminiOnKey(client, name, **kwargs)
 
 LANG_NAMES = {
     "en": "English","fr":"French","de":"German","es":"Spanish","it":"Italian",
@@ -118,52 +240,67 @@ def _base_lang(code: str) -> str:
     code = _norm(code).lower()
     return code.split("-")[0] if code else "en"
 
-def run_gemini(prompt: str, language: Optional[str], files: Optional[List[str]]) -> str:
-    _ensure_gemini()
-    model = genai.GenerativeModel("gemini-1.5-flash")
-
-    ctx_parts: List[str] = []
-    import re
-    def clean_code(code: str) -> str:
-        # Remove docstrings and quoted blocks (triple quotes)
-        code = re.sub(r'"""[\s\S]*?"""', '', code)
-        code = re.sub(r"'''[\s\S]*?'''", '', code)
-        # Remove single/double quoted lines
-        code = re.sub(r'^\s*["\"][^"\"]*["\"]\s*$', '', code, flags=re.MULTILINE)
-        lines = code.splitlines()
-        cleaned = []
-        for line in lines:
-            l = line.strip()
-            # Remove lines that are only asterisks, hyphens, slashes, or boilerplate
-            if l in ("*", "-", "--", "***", "#", "# ...", "# Copyright", "# License", "/", "//", "///", "////", "\\", "\\\\"):
-                continue
-            if l.startswith("#") and ("copyright" in l.lower() or "license" in l.lower()):
-                continue
-            if l == "" or l == "...":
-                continue
-            # Remove lines that are mostly slashes or separators
-            if re.match(r'^[#/\\\-\s]+$', l):
-                continue
-            # Remove lines that start and end with quotes
-            if (l.startswith("'") and l.endswith("'")) or (l.startswith('"') and l.endswith('"')):
-                continue
-            cleaned.append(line)
-        return "\n".join(cleaned)
+def clean_code(code: str) -> str:
+    # Remove docstrings and quoted blocks (triple quotes)
+    code = re.sub(r'"""[\s\S]*?"""', '', code)
+    code = re.sub(r"'''[\s\S]*?'''", '', code)
+    # Remove single/double quoted lines
+    code = re.sub(r'^\s*["\"][^"\"]*["\"]\s*$', '', code, flags=re.MULTILINE)
+    lines = code.splitlines()
+    cleaned = []
+    for line in lines:
+        l = line.strip()
+        # Remove lines that are only asterisks, hyphens, slashes, or boilerplate
+        if l in ("*", "-", "--", "***", "#", "# ...", "# Copyright", "# License", "/", "//", "///", "////", "\\", "\\\\"):
+            continue
+        if l.startswith("#") and ("copyright" in l.lower() or "license" in l.lower()):
+            continue
+        if l == "" or l == "...":
+            continue
+        # Remove lines that are mostly slashes or separators
+        if re.match(r'^[#/\\\-\s]+$', l):
+            continue
+        # Remove lines that start and end with quotes
+        if (l.startswith("'") and l.endswith("'")) or (l.startswith('"') and l.endswith('"')):
+            continue
+        cleaned.append(line)
+    return "\n".join(cleaned)
 
-    for p in (files or [])[:3]:
-        try:
-            with open(p, "r", encoding="utf-8", errors="ignore") as f:
-                raw = f.read(5000)
-                ctx_parts.append(clean_code(raw))
-        except Exception as e:
-            ctx_parts.append(f"[{p} error: {e}]")
-    ctx = "\n\n".join(ctx_parts)
+# Cleaned file context per path, valid while (mtime, size) match: unchanged files are read and cleaned
+# once. One entry per path (an edit replaces it), least recently used paths go past CTX_CACHE_MAX.
+CTX_CACHE_MAX = int(os.getenv("VIBE_CTX_CACHE_MAX", "256"))
+_CTX_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+_CTX_LOCK = threading.Lock()
+
+def file_context(path: str) -> str:
+    try:
+        st = os.stat(path)
+        key, stamp = os.path.abspath(path), (st.st_mtime_ns, st.st_size)
+        with _CTX_LOCK:
+            hit = _CTX_CACHE.get(key)
+            if hit and hit[0] == stamp:
+                _CTX_CACHE.move_to_end(key)
+                return hit[1]
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            text = clean_code(f.read(5000))
+        with _CTX_LOCK:
+            _CTX_CACHE[key] = (stamp, text)
+            _CTX_CACHE.move_to_end(key)
+            while len(_CTX_CACHE) > CTX_CACHE_MAX:
+                _CTX_CACHE.popitem(last=False)
+        return text
+    except Exception as e:
+        return f"[{path} error: {e}]"
+
+def build_context(files: Optional[List[str]]) -> str:
+    return "\n\n".join(file_context(p) for p in (files or [])[:3])
 
+def system_prompt(language: Optional[str]) -> str:
     loc = _norm(language or "en-US").lower()
     base = _base_lang(loc)
     lang_name = LANG_NAMES.get(base, base)
 
-    system = (
+    return (
         f"You are Vibe, a multilingual coding copilot and senior software engineer.\n"
         f"IMPORTANT: Reply entirely in {lang_name} ({loc}). "
         "Speak in a natural, conversational way, as if mentoring a junior developer.\n"
@@ -174,21 +311,170 @@ def run_gemini(prompt: str, language: Optional[str], files: Optional[List[str]])
         "- If information is missing (e.g., repo URL), ask once, then stop.\n"
         "- If asked for code, provide only the relevant code, not the entire file.\n"
     )
+
+def run_gemini(prompt: str, language: Optional[str], files: Optional[List[str]],
+               deadline: Optional[Deadline] = None, ctx: Optional[str] = None) -> str:
+    """ctx: file context already built by the caller (build_context(files)), e.g. shared by several locales."""
+    deadline = deadline or Deadline()
+    if ctx is None:
+        ctx = build_context(files)
+    system = system_prompt(language)
     user = f"User:\n{prompt}"
     if ctx:
         user += f"\n\nContext:\n{ctx}"
 
-    resp = model.generate_content(f"{system}\n\n{user}")
+    # the same prompt and file context asked on any worker is answered once per host
+    cache = shared_cache.get_cache()
+    key = shared_cache.make_key("answer", "gemini-1.5-flash", f"{system}\n\n{user}")
+    if cache:
+        hit = cache.get("answer", key)
+        if hit:
+            return hit.meta["text"]
+
+    _ensure_gemini()
+    # generate_content is idempotent, so a slow attempt may be hedged
+    resp = call_hedged("gemini", lambda t, key: _gemini_model(key).generate_content(
+        f"{system}\n\n{user}", request_options={"timeout": t}), deadline)
     text = (getattr(resp, "text", "") or "").strip()
     if not text:
         raise HTTPException(502, "Gemini returned empty text")
+    if cache:
+        cache.put("answer", key, {"text": text})
     return text
 
+SPEAK_MODES = ("answer", "verbatim")
+
+def _check_mode(mode: Optional[str]) -> str:
+    m = _norm(mode).lower() or "answer"
+    if m not in SPEAK_MODES:
+        raise HTTPException(422, f"Unknown mode '{mode}'. Use one of: {', '.join(SPEAK_MODES)}")
+    return m
+
+def text_for_mode(text: str, language: Optional[str], files: Optional[List[str]], mode: Optional[str],
+                  deadline: Optional[Deadline] = None, ctx: Optional[str] = None) -> str:
+    """'answer' runs the prompt through Gemini; 'verbatim' is already-final text (git output, issue lists)."""
+    if _check_mode(mode) == "verbatim":
+        return text
+    return run_gemini(text, language, files, deadline, ctx)
+
+# ========= Conversation sessions (/ws/stream session mode) =========
+SESSION_MAX_TURNS = int(os.getenv("VIBE_SESSION_MAX_TURNS", "20"))
+GEMINI_CACHE_MODEL = "models/gemini-1.5-flash-001"
+
+class VibeSession:
+    """
+    State for one multi-turn client connection: the chosen voice, the cleaned file context
+    and the Gemini chat. The preamble + context go upstream once as the system instruction
+    (or an explicit context cache); each turn sends only the new user message.
+    Turns run concurrently: each one is sent with the history as it stood when the turn started,
+    and its exchange is added to the history when its answer arrives.
+    """
+    def __init__(self, cfg: Dict[str, Any]):
+        self.language = _norm(cfg.get("language") or "en-US")
+        self.style = _norm(cfg.get("style"))
+        self.voice_override = _norm(cfg.get("voice_id"))
+        self.format = (cfg.get("format") or "WAV").upper()
+        self.files = list(cfg.get("files") or [])
+        self.context = build_context(self.files)
+        self.voice = _pick_voice(self.language, self.style, self.voice_override)
+        self._voices = {self.language.upper(): self.voice}
+        self._system: Optional[str] = None
+        self._cached_model = None
+        self._history: List[Any] = []
+        self._cache = None
+        self._chat_lock = threading.Lock()      # guards _system / _history, never held across a call
+
+    def voice_for(self, language: Optional[str]) -> str:
+        lang = _norm(language) or self.language
+        if lang.upper() not in self._voices:
+            self._voices[lang.upper()] = _pick_voice(lang, self.style, self.voice_override)
+        return self._voices[lang.upper()]
+
+    def _context_cache(self, system: str):
+        # Opt-in explicit context cache; Gemini rejects prefixes below its minimum size,
+        # in which case the plain system_instruction is used (implicit prefix caching still applies)
+        if os.getenv("GEMINI_CONTEXT_CACHE") == "1":
+            try:
+                import datetime
+                from google.generativeai import caching
+                self._cache = caching.CachedContent.create(
+                    model=GEMINI_CACHE_MODEL, system_instruction=system,
+                    ttl=datetime.timedelta(minutes=30))
+                return genai.GenerativeModel.from_cached_content(cached_content=self._cache)
+            except Exception:
+                self._cache = None
+        return None
+
+    def answer(self, text: str, language: Optional[str], files: Optional[List[str]], mode: Optional[str],
+               deadline: Optional[Deadline] = None) -> str:
+        if _check_mode(mode) == "verbatim":
+            return text
+        deadline = deadline or Deadline()
+        user = f"User:\n{text}"
+        lang = _norm(language)
+        if lang and lang.upper() != self.language.upper():
+            user = f"(Reply in {LANG_NAMES.get(_base_lang(lang), lang)} ({lang.lower()}) for this turn.)\n" + user
+        extra = [p for p in (files or []) if p not in self.files]
+        if extra:
+            user += f"\n\nContext:\n{build_context(extra)}"
+
+        with self._chat_lock:
+            if self._system is None:
+                _ensure_gemini()
+                system = system_prompt(self.language)
+                if self.context:
+                    system += f"\nContext:\n{self.context}"
+                self._cached_model = self._context_cache(system)
+                self._system = system
+            history = list(self._history)
+        # not hedged: a chat turn appends to the history. An explicit context cache
+        # belongs to the key that created it (the first one), so those turns stay on it.
+        pin = quota.keys("gemini")[0] if self._cached_model is not None else None
+
+        def send(t, key):
+            model = self._cached_model if pin else _gemini_model(key, system_instruction=self._system)
+            chat = model.start_chat(history=history)
+            return chat, chat.send_message(user, request_options={"timeout": t})
+        chat, resp = call_hedged("gemini", send, deadline, hedge=False, pin=pin)
+        with self._chat_lock:
+            self._history.extend(chat.history[len(history):])
+            # keep the history we carry bounded
+            if len(self._history) > 2 * SESSION_MAX_TURNS:
+                self._history = self._history[-2 * SESSION_MAX_TURNS:]
+        out = (getattr(resp, "text", "") or "").strip()
+        if not out:
+            raise HTTPException(502, "Gemini returned empty text")
+        return out
+
+    def close(self):
+        if self._cache is not None:
+            try:
+                self._cache.delete()
+            except Exception:
+                pass
+
 # ========= Murf REST (non-stream) =========
+_murf_http = None
+_murf_http_lock = threading.Lock()
+
+def murf_http():
+    """One pooled HTTP session for Murf REST, so parallel segments reuse kept-alive TLS connections."""
+    global _murf_http
+    with _murf_http_lock:
+        if _murf_http is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            size = max(4, 2 * segmented.SEGMENT_WORKERS)
+            session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=size))
+            _murf_http = session
+        return _murf_http
+
 def murf_generate(text: str, language: Optional[str], voice_id: Optional[str],
-                  fmt: Optional[str], style: Optional[str]) -> (str, str):
-    api_key = os.getenv("MURF_API_KEY")
-    if not api_key:
+                  fmt: Optional[str], style: Optional[str], deadline: Optional[Deadline] = None) -> (str, str):
+    import requests
+    deadline = deadline or Deadline()
+    if not quota.keys("murf"):
         raise HTTPException(500, "MURF_API_KEY not set")
 
     fmt_norm = (fmt or "wav").lower()
@@ -207,8 +493,15 @@ def murf_generate(text: str, language: Optional[str], voice_id: Optional[str],
     if style:
         payload["speechCustomization"] = {"style": style}
 
-    headers = {"api-key": api_key, "Content-Type": "application/json"}
-    r = requests.post(url, json=payload, headers=headers, timeout=45)
+    def post(timeout: float, api_key: str):
+        r = murf_http().post(url, json=payload, headers={"api-key": api_key, "Content-Type": "application/json"},
+                          timeout=timeout)
+        if r.status_code == 429:
+            raise quota.RateLimited("murf", quota.parse_retry_after(r.headers.get("Retry-After")), r.text[:200])
+        return r
+
+    # same text + voice gives the same audio, so the POST is safe to hedge
+    r = call_hedged("murf", post, deadline)
     try:
         r.raise_for_status()
     except requests.HTTPError as e:
@@ -220,7 +513,7 @@ def murf_generate(text: str, language: Optional[str], voice_id: Optional[str],
         # fallback if only a URL was returned
         audio_url = data.get("audioFile") or data.get("audio_file")
         if audio_url:
-            audio = requests.get(audio_url, timeout=45).content
+            audio = murf_http().get(audio_url, timeout=deadline.timeout("murf audio")).content
             b64 = base64.b64encode(audio).decode("utf-8")
 
     if not b64:
@@ -229,115 +522,762 @@ def murf_generate(text: str, language: Optional[str], voice_id: Optional[str],
     mime = "audio/wav" if fmt_norm == "wav" else "audio/mpeg"
     return b64, mime
 
+# One-shot synthesis goes through the router: Murf REST first, gTTS when Murf is slow or failing,
+# offline pyttsx3 as the last resort. Decisions and provider health are in /metrics (vibe_tts_*).
+TTS_ROUTER = TTSRouter([MurfTTS(murf_generate), GTtsTTS()], fallback=Pyttsx3TTS())
+
+@app.on_event("startup")
+def _warm_offline_tts():
+    # start the pyttsx3 worker processes in the background so the first fallback doesn't pay engine init
+    if TTS_ROUTER.fallback.supports(None, "wav"):
+        TTS_ROUTER.fallback.start()
+
+# Per-worker warmup: the lazy imports, the Murf connection pool, the Gemini client, the shared cache's
+# database and the voice table are set up before the first request instead of during it. "block" holds
+# startup until done (serve.py --workers, so a worker only accepts once warm); "background" (the default)
+# keeps startup fast for a single process; "0" skips it.
+WARMUP = os.getenv("VIBE_WARMUP", "background").lower()
+metrics.describe("vibe_warmup_seconds", "Time this worker spent warming up")
+
+def _warmup():
+    t0 = time.monotonic()
+    try:
+        import websockets  # noqa: F401  (imported lazily by /ws/stream)
+        murf_http()
+        if quota.keys("gemini"):
+            _ensure_gemini()
+        cache = shared_cache.get_cache()
+        if cache:
+            cache.stats()
+        _pick_voice("en-US", None, None)
+    except Exception as e:
+        log.warning("warmup incomplete: %s", e)
+    metrics.gauge("vibe_warmup_seconds", round(time.monotonic() - t0, 3))
+
+@app.on_event("startup")
+async def _warm_worker():
+    if WARMUP == "block":
+        await asyncio.to_thread(_warmup)
+    elif WARMUP not in ("0", "off"):
+        threading.Thread(target=_warmup, name="warmup", daemon=True).start()
+
+@app.on_event("shutdown")
+def _close_tts():
+    TTS_ROUTER.close()
+
 # ========= Murf WebSocket proxy (/ws/stream) =========
 MURF_WS = "wss://api.murf.ai/v1/speech/stream-input"
 SAMPLE_RATE = 44100
 CHANNEL = "MONO"
+MURF_RATES = (24000, 44100, 48000)   # rates Murf's stream produces directly; others are resampled
+# Once audio is flowing the deadline no longer applies (the clip can outlast it); a stalled stream is cut
+MURF_FRAME_TIMEOUT_S = float(os.getenv("MURF_FRAME_TIMEOUT_S", "15"))
+
+async def murf_stream_frames(text: str, voice_id: str, style: Optional[str], fmt: str,
+                             deadline: Optional[Deadline] = None, sample_rate: int = SAMPLE_RATE,
+                             lease: Optional[quota.Lease] = None):
+    """
+    Yield base64 audio frames from Murf's streaming WS as they arrive.
+    Connecting and the first frame must fit in the deadline; later frames get MURF_FRAME_TIMEOUT_S each.
+    The API key comes from a quota lease (pass one in to queue before committing to a response);
+    a 429 on connect cools that key and tries the next lease.
+    """
+    import websockets
+    deadline = deadline or Deadline()
+    with deadline.span("murf connect"):
+        while True:
+            lease = lease or await quota.acquire_async("murf", deadline)
+            qs = f"?api-key={lease.key}&sample_rate={sample_rate}&channel_type={CHANNEL}&format={fmt}"
+            try:
+                murf = await websockets.connect(MURF_WS + qs, open_timeout=deadline.timeout("murf connect"))
+                break
+            except Exception as e:
+                backoff = quota.retry_after(e)
+                if backoff is None:
+                    raise
+                lease.rate_limited(backoff)
+                lease = None
+    async with murf:
+        # optional voice config
+        voice_cfg = {
+            "voice_config": {
+                "voiceId": voice_id,
+                "style": style or "Conversational",
+                "rate": 0, "pitch": 0, "variation": 1
+            }
+        }
+        await murf.send(json.dumps(voice_cfg))
+
+        # now the text
+        await murf.send(json.dumps({"text": text, "end": True}))
+
+        first = True
+        while True:
+            wait_s = deadline.timeout("murf first audio") if first else MURF_FRAME_TIMEOUT_S
+            try:
+                data = json.loads(await asyncio.wait_for(murf.recv(), wait_s))
+            except asyncio.TimeoutError:
+                stage = "murf first audio" if first else "murf audio"
+                metrics.inc("vibe_deadline_exceeded_total", stage=stage)
+                raise HTTPException(504, f"Deadline exceeded waiting for {stage}")
+            if "audio" in data:
+                if first:
+                    deadline.mark("murf first audio")
+                first = False
+                yield data["audio"]
+            if data.get("final"):
+                break
+
+def _strip_wav_header(chunk: bytes) -> bytes:
+    # Murf puts a RIFF header in front of the first frame; keep only the PCM after "data"+size
+    if not chunk.startswith(b"RIFF"):
+        return chunk
+    i = chunk.find(b"data", 12)
+    return chunk[i + 8:] if i >= 0 else chunk[44:]
+
+def _first_supported(value: Any, allowed, what: str, cast=str):
+    # a single value or a preference list; the first one we support wins
+    prefs = value if isinstance(value, list) else [value]
+    for v in prefs:
+        try:
+            v = cast(v)
+        except (TypeError, ValueError):
+            continue
+        if v in allowed:
+            return v
+    raise HTTPException(422, f"Unsupported {what} {value}. Use one of: {', '.join(map(str, allowed))}")
+
+def negotiate_audio(fmt: str, req: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Transport for a WAV stream from the client's "codec", "sample_rate" and "sample_width"
+    (each a value or a preference list). Murf is asked for the chosen rate when it can produce it.
+    """
+    if fmt.upper() not in ("WAV", "PCM"):
+        return {"codec": None, "sample_rate": SAMPLE_RATE, "sample_width": 2, "source_rate": SAMPLE_RATE}
+    codec = _first_supported(req.get("codec") or "pcm", CODECS, "codec", lambda c: str(c).lower())
+    rate = _first_supported(req.get("sample_rate") or SAMPLE_RATE, CLIENT_RATES, "sample_rate", int)
+    width = 2
+    if codec == "pcm":
+        width = _first_supported(req.get("sample_width") or 2, (2, 1), "sample_width", int)
+    source = min((r for r in MURF_RATES if r >= rate), default=SAMPLE_RATE)   # fewest samples to resample
+    return {"codec": codec, "sample_rate": rate, "sample_width": width, "source_rate": source}
+
+def _post_for(audio: Dict[str, Any], trim: Any, max_pause_ms: Any) -> Optional[PcmPostProcessor]:
+    """Post-processor for a negotiated PCM stream, or None when frames can be forwarded as Murf sends them."""
+    if audio["codec"] is None:
+        return None
+    trim = TRIM_SILENCE if trim is None else bool(trim)
+    if not trim and audio["sample_rate"] == audio["source_rate"] and encoder(audio["codec"], audio["sample_width"]) is None:
+        return None
+    return PcmPostProcessor(audio["source_rate"], audio["sample_rate"], trim=trim,
+                            max_pause_ms=int(max_pause_ms or 0) or None)
+
+async def _post_frames(frames, post: PcmPostProcessor, encode=None):
+    """
+    Murf's base64 WAV frames -> post-processed base64 frames. Plain 16-bit PCM gets a fresh WAV header
+    on the first frame sent; with a transport codec every frame is encoded on its own and has no header.
+    """
+    header = b"" if encode else _wav_stream_header(post.out_rate)
+    first = True
+    async for b64 in frames:
+        chunk = base64.b64decode(b64)
+        if first:
+            chunk = _strip_wav_header(chunk)
+            first = False
+        out = post.process(chunk)
+        if out is chunk and not header and encode is None:
+            yield b64           # passed through untouched: reuse the frame as received
+        elif out:
+            if encode:
+                out = await asyncio.to_thread(encode, out)      # ADPCM is a Python loop: keep it off the event loop
+            if header:
+                out, header = header + out, b""
+            yield base64.b64encode(out).decode("ascii")
+    out = post.flush()
+    if encode and out:
+        out = await asyncio.to_thread(encode, out)
+    out = header + out
+    if out:
+        yield base64.b64encode(out).decode("ascii")
+
+def _audio_info(audio: Dict[str, Any]) -> Dict[str, Any]:
+    info = {"sample_rate": audio["sample_rate"]}
+    if audio["codec"]:
+        info.update(codec=audio["codec"], sample_width=audio["sample_width"])
+    return info
+
+def _wav_stream_header(sample_rate: int, channels: int = 1, sample_width: int = 2) -> bytes:
+    # Unknown length up front -> max sizes, the convention streaming-aware decoders accept
+    byte_rate = sample_rate * channels * sample_width
+    return (b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVEfmt "
+            + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate,
+                          channels * sample_width, sample_width * 8)
+            + b"data" + struct.pack("<I", 0xFFFFFFFF))
+
+def _final(post: Optional[PcmPostProcessor], deadline: Deadline, timings: bool) -> Dict[str, Any]:
+    """The last message of a streamed answer; with "timings" it carries the server-side stage timeline."""
+    msg: Dict[str, Any] = {"final": True}
+    if post:
+        msg["post"] = post.stats()
+    if timings:
+        deadline.mark("done")
+        msg["timings"] = deadline.timings()
+    return msg
+
+async def _send_frames(send, frames, deadline: Deadline, extra: Dict[str, Any]):
+    first = True
+    async for b64 in frames:
+        await send({**extra, "audio_b64": b64})
+        if first:
+            deadline.mark("first audio")
+            first = False
+
+def _client_of(conn, client_id: Optional[str]) -> str:
+    """Who a request counts as for fair queuing: the id it sends, else its address."""
+    return _norm(client_id) or (conn.client.host if conn.client else "")
+
+async def _ws_turn(local_ws: WebSocket, req: Dict[str, Any]) -> bool:
+    """Answer one request on an open client socket. Returns False if it was rejected."""
+    text   = _norm(req.get("text"))
+    lang   = _norm(req.get("language") or "en-US")
+    style  = _norm(req.get("style"))
+    fmt    = (req.get("format") or "WAV").upper()
+    voice  = _norm(req.get("voice_id"))
+    files  = req.get("files") or []
+
+    if not text:
+        await local_ws.send_json({"error": "Missing 'text'."})
+        return False
+    deadline = Deadline.from_ms(req.get("deadline_ms"), req.get("priority"), _client_of(local_ws, req.get("client_id")),
+                                _norm(req.get("request_id")) or uuid.uuid4().hex[:16])
+    timings = bool(req.get("timings"))
+
+    # Everything that can refuse the request is checked before Gemini is asked
+    if not quota.keys("murf"):
+        await local_ws.send_json({"error": "MURF_API_KEY not set"})
+        return False
+    chosen = _pick_voice(lang, style, voice)
+    audio = negotiate_audio(fmt, req)
+    post = _post_for(audio, req.get("trim"), req.get("max_pause_ms"))
+
+    # Instructions go through Gemini first; mode "verbatim" speaks the text as-is
+    with deadline.span("answer"):
+        text_to_speak = await asyncio.to_thread(text_for_mode, text, lang, files, req.get("mode"), deadline)
+
+    # The transcript stays as written; Murf gets the speakable version
+    spoken, chars = prepare_speech(text_to_speak, lang, req.get("normalize"))
+
+    # Tell the client what we’re about to stream
+    await local_ws.send_json({
+        "info": {
+            "transcript": text_to_speak,
+            "voice_id": chosen,
+            "mime": "audio/wav" if fmt == "WAV" else "audio/mpeg",
+            "channel": CHANNEL,
+            "format": fmt,
+            "speech_chars": chars,
+            **_audio_info(audio),
+            **({"request_id": deadline.request_id} if timings else {})
+        }
+    })
+    deadline.mark("info")
+
+    # forward streaming frames to the client (untouched unless trimming/resampling/encoding is on)
+    frames = murf_stream_frames(spoken, chosen, style, fmt, deadline, audio["source_rate"])
+    encode = encoder(audio["codec"], audio["sample_width"]) if audio["codec"] else None
+    await _send_frames(local_ws.send_json, _post_frames(frames, post, encode) if post else frames, deadline, {})
+    await local_ws.send_json(_final(post, deadline, timings))
+    return True
+
+async def _ws_session(local_ws: WebSocket, cfg: Dict[str, Any], live: lifecycle.Live):
+    """Session mode: many turns on one socket, each tagged with a client-chosen stream id."""
+    session = VibeSession(cfg)
+    audio = negotiate_audio(session.format, cfg)
+    encode = encoder(audio["codec"], audio["sample_width"]) if audio["codec"] else None
+    client = _client_of(local_ws, cfg.get("client_id"))
+    if not quota.keys("murf"):
+        await local_ws.send_json({"error": "MURF_API_KEY not set"})
+        await local_ws.close()
+        return
+
+    send_lock = asyncio.Lock()
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def send(msg: Dict[str, Any]):
+        async with send_lock:
+            await local_ws.send_json(msg)
+
+    async def turn(sid: str, req: Dict[str, Any]):
+        try:
+            text = _norm(req.get("text"))
+            if not text:
+                await send({"id": sid, "error": "Missing 'text'."})
+                return
+            deadline = Deadline.from_ms(req.get("deadline_ms"), req.get("priority", cfg.get("priority")), client,
+                                        _norm(req.get("request_id")) or uuid.uuid4().hex[:16])
+            timings = bool(req.get("timings", cfg.get("timings")))
+            with deadline.span("answer"):
+                spoken = await asyncio.to_thread(session.answer, text, req.get("language"),
+                                                 req.get("files"), req.get("mode"), deadline)
+            voice = session.voice_for(req.get("language"))
+            norm = req.get("normalize", cfg.get("normalize"))
+            said, chars = prepare_speech(spoken, req.get("language") or session.language, norm)
+            post = _post_for(audio, cfg.get("trim"), cfg.get("max_pause_ms"))
+            await send({"id": sid, "info": {
+                "transcript": spoken,
+                "voice_id": voice,
+                "mime": "audio/wav" if session.format == "WAV" else "audio/mpeg",
+                "channel": CHANNEL,
+                "format": session.format,
+                "speech_chars": chars,
+                **_audio_info(audio),
+                **({"request_id": deadline.request_id} if timings else {})
+            }})
+            deadline.mark("info")
+            frames = murf_stream_frames(said, voice, session.style, session.format, deadline, audio["source_rate"])
+            await _send_frames(send, _post_frames(frames, post, encode) if post else frames, deadline, {"id": sid})
+            await send({"id": sid, **_final(post, deadline, timings)})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await send({"id": sid, "error": str(e)})
+        finally:
+            tasks.pop(sid, None)
+
+    async def counted(sid: str, req: Dict[str, Any]):
+        with live.turn():
+            await turn(sid, req)
+        await live.turn_done()
+
+    await send({"session": {
+        "language": session.language,
+        "voice_id": session.voice,
+        "channel": CHANNEL,
+        "format": session.format,
+        **_audio_info(audio)
+    }})
+    counter = 0
+    try:
+        while True:
+            req = await local_ws.receive_json()
+            if req.get("end"):
+                await local_ws.close()
+                break
+            counter += 1
+            sid = str(req.get("id") or counter)
+            if req.get("cancel"):
+                t = tasks.get(sid)
+                if t:
+                    t.cancel()
+                    await send({"id": sid, "cancelled": True})
+                continue
+            if sid in tasks:
+                await send({"id": sid, "error": f"Stream id '{sid}' is already in use."})
+                continue
+            if lifecycle.draining:      # this worker is stopping: the client reconnects to another one
+                await send({"id": sid, "error": lifecycle.RESTART_REASON})
+                continue
+            tasks[sid] = asyncio.create_task(counted(sid, req))
+    finally:
+        for t in list(tasks.values()):
+            t.cancel()
+        session.close()
 
 @app.websocket("/ws/stream")
 async def ws_stream(local_ws: WebSocket):
     """
     Client connects here, sends a single JSON:
     {
-      "text": "...", "language": "es-ES", "voice_id": "...", "style": "Conversational", "format": "WAV"
+      "text": "...", "language": "es-ES", "voice_id": "...", "style": "Conversational", "format": "WAV",
+      "mode": "answer" | "verbatim",   (optional, default "answer")
+      "deadline_ms": 60000,            (optional: how long the client will wait; every upstream stage gets what is left)
+      "priority": "batch", "client_id": "ci-runner"
+                                       (optional: upstream quota class, default "interactive", and who to
+                                        queue fairly as, default the client address; see quota.py)
+      "normalize": false,              (optional: send the text to TTS without speech cleanup)
+      "sample_rate": 16000, "trim": true, "max_pause_ms": 600
+                                       (optional, WAV only: resample / trim silence / shorten long pauses)
+      "codec": ["adpcm", "mulaw", "pcm"], "sample_width": 2
+                                       (optional, WAV only: transport encoding, first supported wins;
+                                        sample_rate may also be a preference list)
+      "timings": true, "request_id": "3f2a..."
+                                       (optional: echo request_id in "info" and put the server's stage
+                                        timeline in "final", see Deadline.mark)
+      "keep_open": true                (optional: socket stays open for further requests)
     }
-    We forward to Murf WS and echo back frames:
-      {"info": {...}} (once, transcript + chosen voice)
+    We forward to Murf WS and echo back frames (with codec "mulaw"/"adpcm" or sample_width 1 each
+    audio_b64 is a self-contained encoded block without a WAV header; see transport_codec.py):
+      {"info": {...}} (once: transcript, chosen voice, and the negotiated sample_rate / codec / sample_width)
       {"audio_b64": "..."} (many)
-      {"final": true} (once)
-    """
-    await local_ws.accept()
-    try:
-        first = await local_ws.receive_json()
-        text   = _norm(first.get("text"))
-        lang   = _norm(first.get("language") or "en-US")
-        style  = _norm(first.get("style"))
-        fmt    = (first.get("format") or "WAV").upper()
-        voice  = _norm(first.get("voice_id"))
-        files  = first.get("files") or []
-
-        if not text:
-            await local_ws.send_json({"error": "Missing 'text'."})
-            await local_ws.close()
-            return
-
-        # If the text looks like an instruction (your normal use), generate with Gemini first
-        # (If you already pass ready-to-speak text, comment the next line)
-        text_to_speak = run_gemini(text, lang, files)
-
-        chosen = _pick_voice(lang, style, voice)
-        api_key = os.getenv("MURF_API_KEY")
-        if not api_key:
-            await local_ws.send_json({"error": "MURF_API_KEY not set"})
-            await local_ws.close()
-            return
-
-        # Tell the client what we’re about to stream
-        await local_ws.send_json({
-            "info": {
-                "transcript": text_to_speak,
-                "voice_id": chosen,
-                "mime": "audio/wav" if fmt == "WAV" else "audio/mpeg",
-                "sample_rate": SAMPLE_RATE,
-                "channel": CHANNEL,
-                "format": fmt
-            }
-        })
-
-        qs = f"?api-key={api_key}&sample_rate={SAMPLE_RATE}&channel_type={CHANNEL}&format={fmt}"
-        async with websockets.connect(MURF_WS + qs) as murf:
-            # optional voice config
-            voice_cfg = {
-                "voice_config": {
-                    "voiceId": chosen,
-                    "style": style or "Conversational",
-                    "rate": 0, "pitch": 0, "variation": 1
-                }
-            }
-            await murf.send(json.dumps(voice_cfg))
+      {"final": true, "post"?: {"removed_ms", ...}, "timings"?: {"request_id", "stages": [{"stage", "at_ms", "ms"?}]}}
+                           (once; "post" when audio was trimmed/resampled, "timings" when asked for)
+    With keep_open, each later JSON message is another request answered the same way, and
+    errors are reported per request instead of closing the socket.
 
-            # now the text
-            await murf.send(json.dumps({"text": text_to_speak, "end": True}))
+    Session mode: the first message is {"session": {"language", "voice_id", "style", "format", "files", "normalize",
+    "sample_rate", "trim", "max_pause_ms", "codec", "sample_width", "priority", "client_id", "timings"}}
+    and is answered with {"session": {...}}. After that every message is a turn
+    {"id": "t1", "text": "...", "mode"?, "language"?, "files"?, "deadline_ms"?, "normalize"?, "priority"?, "request_id"?, "timings"?} (or {"id", "cancel": true}, {"end": true});
+    turns run concurrently and every frame they produce carries the turn's "id". The server keeps
+    the conversation history, the prepared file context and the chosen voice for the connection.
 
-            # forward streaming frames to the client
-            while True:
-                resp = await murf.recv()
-                data = json.loads(resp)
-                if "audio" in data:
-                    await local_ws.send_json({"audio_b64": data["audio"]})
-                if data.get("final"):
-                    await local_ws.send_json({"final": True})
-                    break
-
-    except WebSocketDisconnect:
-        pass
-    except Exception as e:
+    When the worker is stopping (serve.py), a turn in progress still gets its "final"; the socket is then
+    closed with code 1012 ("service restarting") and the client should reconnect.
+    """
+    await local_ws.accept()
+    with lifecycle.track(local_ws) as live:
         try:
-            await local_ws.send_json({"error": str(e)})
-        finally:
-            await local_ws.close()
+            req = await local_ws.receive_json()
+            if "session" in req:
+                await _ws_session(local_ws, req.get("session") or {}, live)
+                return
+            keep_open = bool(req.get("keep_open"))
+            while True:
+                try:
+                    with live.turn():
+                        ok = await _ws_turn(local_ws, req)
+                except WebSocketDisconnect:
+                    raise
+                except Exception as e:
+                    if not keep_open:
+                        raise
+                    await local_ws.send_json({"error": str(e)})
+                    ok = True
+                await live.turn_done()
+                if live.closing:
+                    return
+                if not keep_open:
+                    if not ok:
+                        await local_ws.close()
+                    return
+                req = await local_ws.receive_json()
+
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            if live.closing:
+                return
+            try:
+                await local_ws.send_json({"error": str(e)})
+            finally:
+                await local_ws.close()
 
 # ========= REST API (non-stream) =========
 @app.get("/")
 def root():
-    return {"ok": True, "endpoints": ["/health", "/voices/which?lang=es-ES&style=Promo", "/speak", "WS: /ws/stream"]}
+    return {"ok": True, "endpoints": ["/health", "/voices/which?lang=es-ES&style=Promo", "/speak", "/speak/stream", "/speak/multi", "/jobs", "/metrics", "/admin/profile", "WS: /ws/stream"]}
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_text():
+    cache = shared_cache.get_cache()
+    if cache:
+        stats = cache.stats()           # host-wide: every worker counts into the same database
+        for kind, counts in stats["kinds"].items():
+            metrics.gauge("vibe_cache_hit_rate", counts["hit_rate"], kind=kind)
+        metrics.gauge("vibe_cache_entries", stats["entries"])
+        metrics.gauge("vibe_cache_bytes", stats["bytes"])
+    return metrics.render()
+
 @app.get("/voices/which")
 def voices_which(lang: str = Query("en-US"), style: Optional[str] = Query(None)):
     vid = _pick_voice(lang, style, None)
     return {"lang": lang, "style": style, "voice_id": vid}
 
+def _synthesize(answer: str, language: Optional[str], voice_id: Optional[str], inp: SpeakIn,
+                deadline: Deadline) -> SpeakOut:
+    """TTS (one-shot) via the provider router, on the speakable version of the text, plus post-processing."""
+    # an unknown locale is the client's 422 here, not a provider failure the router would fail over on
+    _pick_voice(language, inp.style, voice_id)
+    spoken, chars = prepare_speech(answer, language, inp.normalize)
+    fmt = (inp.format or "wav").lower()
+    if fmt not in ("wav", "mp3"):
+        fmt = "wav"
+
+    split = segmented.wanted(spoken, fmt, inp.segment)
+    cache = shared_cache.get_cache()
+    key = shared_cache.make_key("tts", spoken, language, fmt, voice_id, inp.style, split)
+    hit = cache.get("tts", key) if cache else None
+    if hit:
+        audio, mime, seg_stats, voice = hit.audio, hit.meta["mime"], hit.meta.get("segmented"), hit.meta.get("voice")
+    else:
+        served: List[tuple] = []
+        audio, mime, seg_stats = _tts_audio(spoken, language, fmt, voice_id, inp, deadline, split, served)
+        voice = _voice_used(served, language, inp.style, voice_id)
+        # a failover or last-resort voice is good enough for this answer, not for every later one
+        if cache and served and all(reason in ("fastest", "probe") for _, reason in served):
+            cache.put("tts", key, {"mime": mime, "segmented": seg_stats, "voice": voice}, audio)
+    post = None
+    trim = TRIM_SILENCE if inp.trim is None else inp.trim
+    if mime == "audio/wav" and (inp.sample_rate or trim):
+        rate = _first_supported(inp.sample_rate or SAMPLE_RATE, CLIENT_RATES, "sample_rate", int) if inp.sample_rate else None
+        audio, post = process_wav(bytes(audio), rate, trim, inp.max_pause_ms)
+    return SpeakOut(audio_b64=base64.b64encode(audio).decode("utf-8"), mime=mime, text=answer,
+                    speech_chars=chars, post=post, segmented=seg_stats, voice_id=voice)
+
+def _voice_used(served: List[tuple], language: Optional[str], style: Optional[str],
+                voice_id: Optional[str]) -> Optional[str]:
+    # Murf's voice id when Murf spoke (it picks the locale's default unless one was given), else the provider
+    names = {s[0] for s in served if s}
+    if names == {"murf"}:
+        return _pick_voice(language, style, voice_id)
+    return names.pop() if len(names) == 1 else None
+
+def _tts_audio(spoken: str, language: Optional[str], fmt: str, voice_id: Optional[str], inp: SpeakIn,
+               deadline: Deadline, split: bool, served: List[tuple]):
+    """(audio, mime, segment stats or None); `served` collects (provider, reason) for every TTS call made."""
+    def tts(text: str):
+        try:
+            out = TTS_ROUTER.speak(text, language, fmt, voice_id=voice_id, style=inp.style, deadline=deadline)
+        except RuntimeError as e:
+            raise HTTPException(502, str(e))
+        served.append(TTS_ROUTER.served_by())
+        return out
+
+    seg_stats = None
+    if split:
+        # long answer: sentence segments in parallel, joined with crossfades (see segmented.py)
+        try:
+            audio, seg_stats = segmented.synthesize(spoken, tts, source=lambda: (TTS_ROUTER.served_by() or ("",))[0])
+            mime = "audio/wav"
+        except HTTPException as e:
+            if e.status_code < 500 or e.status_code == 504:
+                raise
+            seg_stats = None
+        except ValueError:
+            seg_stats = None            # a segment came back in another format or voice: do it in one call
+    if seg_stats is None:
+        served.clear()                  # only the one-call audio is returned
+        audio, mime = tts(spoken)
+    return audio, mime, seg_stats
+
 @app.post("/speak", response_model=SpeakOut)
-def speak(inp: SpeakIn):
-    # 1) LLM -> text in target language
-    answer = run_gemini(inp.text, inp.language, inp.files)
-    # 2) Murf (one-shot)
-    b64, mime = murf_generate(answer, inp.language, inp.voice_id, inp.format, inp.style)
-    return SpeakOut(audio_b64=b64, mime=mime, text=answer)
+def speak(inp: SpeakIn, request: Request):
+    deadline = Deadline.from_ms(inp.deadline_ms, inp.priority, _client_of(request, inp.client_id))
+    # 1) LLM -> text in target language (or the text itself in verbatim mode)
+    answer = text_for_mode(inp.text, inp.language, inp.files, inp.mode, deadline)
+    # 2) TTS
+    return _synthesize(answer, inp.language, inp.voice_id, inp, deadline)
+
+FANOUT_MAX_LOCALES = int(os.getenv("VIBE_FANOUT_MAX_LOCALES", "8"))
+
+@app.post("/speak/multi", response_model=SpeakManyOut)
+async def speak_multi(inp: SpeakManyIn, request: Request):
+    """
+    One prompt answered in several locales. The file context is read once; each locale's Gemini answer
+    and TTS then run concurrently under one deadline (the quota scheduler keeps them within the upstream
+    limits), so the wall-clock time is about that of the slowest locale. Voices are picked per locale
+    unless voice_ids names one. A locale that fails carries "error"; if all fail the first error is raised.
+    """
+    t0 = time.monotonic()
+    locales = list(dict.fromkeys(_norm(loc) for loc in inp.languages if _norm(loc)))
+    if not locales:
+        raise HTTPException(422, "Give at least one locale in 'languages'.")
+    if len(locales) > FANOUT_MAX_LOCALES:
+        raise HTTPException(422, f"Too many locales ({len(locales)}); the limit is {FANOUT_MAX_LOCALES}.")
+    _check_mode(inp.mode)
+    deadline = Deadline.from_ms(inp.deadline_ms, inp.priority, _client_of(request, inp.client_id))
+    ctx = await asyncio.to_thread(build_context, inp.files)
+
+    def one(locale: str) -> LocaleOut:
+        started = time.monotonic()
+        answer = text_for_mode(inp.text, locale, inp.files, inp.mode, deadline, ctx)
+        # unpinned locales leave the voice to the router, so they can still fail over off Murf
+        out = _synthesize(answer, locale, (inp.voice_ids or {}).get(locale), inp, deadline)
+        return LocaleOut(language=locale, seconds=round(time.monotonic() - started, 3), **out.model_dump())
+
+    results = await asyncio.gather(*(asyncio.to_thread(one, loc) for loc in locales), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if len(errors) == len(results):
+        raise errors[0]
+    answers = [r if not isinstance(r, BaseException) else
+               LocaleOut(language=loc, error=getattr(r, "detail", None) or str(r))
+               for loc, r in zip(locales, results)]
+    return SpeakManyOut(answers=answers, seconds=round(time.monotonic() - t0, 3))
+
+@app.post("/speak/stream")
+async def speak_stream(inp: SpeakIn, request: Request):
+    """
+    Chunked variant of /speak for HTTP-only clients. Audio is relayed as Murf produces it:
+      format "wav" (default): WAV header with streaming (max) sizes, then 16-bit PCM
+      format "pcm": raw 16-bit little-endian PCM, layout in X-Sample-Rate / X-Channels / X-Sample-Width
+    sample_rate / trim / max_pause_ms post-process the audio on the way through (see audio_post.py).
+    The transcript is sent up front in X-Vibe-Transcript-B64 (base64 UTF-8); X-Vibe-Speech-Chars is
+    "<chars before>/<chars after>" speech normalization.
+    """
+    fmt = (inp.format or "wav").lower()
+    if fmt not in ("wav", "pcm"):
+        raise HTTPException(422, "Streaming /speak supports format 'wav' or 'pcm'.")
+    if not quota.keys("murf"):
+        raise HTTPException(500, "MURF_API_KEY not set")
+
+    deadline = Deadline.from_ms(inp.deadline_ms, inp.priority, _client_of(request, inp.client_id))
+    answer = await asyncio.to_thread(text_for_mode, inp.text, inp.language, inp.files, inp.mode, deadline)
+    # queue for Murf before the response starts, so a quota refusal is still a proper 429
+    lease = await quota.acquire_async("murf", deadline)
+    chosen = _pick_voice(inp.language, inp.style, inp.voice_id)
+    spoken, chars = prepare_speech(answer, inp.language, inp.normalize)
+    audio = negotiate_audio("WAV", {"sample_rate": inp.sample_rate})
+    post = _post_for(audio, inp.trim, inp.max_pause_ms)
+    rate = audio["sample_rate"]
+
+    async def body():
+        if fmt == "wav":
+            yield _wav_stream_header(rate)
+        first = True
+        async for b64 in murf_stream_frames(spoken, chosen, inp.style, "WAV", deadline, audio["source_rate"], lease):
+            chunk = base64.b64decode(b64)
+            if first:
+                chunk = _strip_wav_header(chunk)
+                first = False
+            if post:
+                chunk = post.process(chunk)
+            if chunk:
+                yield chunk
+        if post:
+            tail = post.flush()
+            if tail:
+                yield tail
+
+    headers = {
+        "X-Vibe-Transcript-B64": base64.b64encode(answer.encode("utf-8")).decode("ascii"),
+        "X-Vibe-Voice-Id": chosen,
+        "X-Vibe-Speech-Chars": f"{chars['in']}/{chars['out']}",
+        "X-Sample-Rate": str(rate),
+        "X-Channels": "1",
+        "X-Sample-Width": "2",
+    }
+    media = "audio/wav" if fmt == "wav" else "audio/pcm"
+    return StreamingResponse(body(), media_type=media, headers=headers)
+
+# ========= Batch narration jobs =========
+JOB_FILE_PROMPT = "Give a short spoken walkthrough of this file: what it is for and how its main parts fit together."
+
+def narrate_item(item: Dict[str, Any], settings: Dict[str, Any], deadline: Deadline):
+    """One job item -> (audio, mime, transcript), through the same Gemini / speech text / TTS router path as /speak."""
+    lang = item.get("language") or settings.get("language")
+    if item.get("file"):
+        text, files, mode = item.get("text") or JOB_FILE_PROMPT, [item["file"]], "answer"
+    else:
+        text, files, mode = item["text"], None, item.get("mode") or settings.get("mode") or "verbatim"
+    answer = text_for_mode(text, lang, files, mode, deadline)
+    spoken, _ = prepare_speech(answer, lang, settings.get("normalize"))
+    fmt = "mp3" if (settings.get("format") or "wav").lower() == "mp3" else "wav"
+    audio, mime = TTS_ROUTER.speak(spoken, lang, fmt, voice_id=item.get("voice_id") or settings.get("voice_id"),
+                                   style=item.get("style") or settings.get("style"), deadline=deadline)
+    trim = TRIM_SILENCE if settings.get("trim") is None else settings["trim"]
+    if mime == "audio/wav" and (settings.get("sample_rate") or trim):
+        audio, _ = process_wav(audio, settings.get("sample_rate"), trim, settings.get("max_pause_ms"))
+    return audio, mime, answer
+
+JOBS = JobRunner(narrate_item)
+
+@app.on_event("startup")
+def _resume_jobs():
+    # jobs that were running when the service stopped carry on; finished items are not redone.
+    # With several workers a job goes to whichever takes its lock first, and a worker that dies
+    # leaves its jobs to the next sweep of another one.
+    JOBS.resume_all()
+    JOBS.watch()
+
+@app.on_event("shutdown")
+def _close_jobs():
+    JOBS.close()
+
+def _job_or_404(fn, job_id: str, *args):
+    try:
+        return fn(job_id, *args)
+    except KeyError:
+        raise HTTPException(404, f"No job '{job_id}'")
+
+@app.post("/jobs", status_code=202)
+def submit_job(inp: JobIn, request: Request):
+    """
+    Queue a batch narration job. Items are narrated in the background at "batch" priority and written to
+    VIBE_JOBS_DIR/<id>/; follow progress with GET /jobs/{id}. Text items are spoken as written by default,
+    file items get a Gemini walkthrough of the file.
+    """
+    settings = inp.model_dump(exclude={"items", "client_id"}, exclude_none=True)
+    _check_mode(settings.get("mode"))
+    if inp.sample_rate:
+        _first_supported(inp.sample_rate, CLIENT_RATES, "sample_rate", int)
+    items = []
+    for i, it in enumerate(inp.items):
+        item = it.model_dump(exclude_none=True)
+        if item.get("mode"):
+            _check_mode(item["mode"])
+        if item.get("file") and not os.path.isfile(item["file"]):
+            raise HTTPException(422, f"Item {i}: file not found: {item['file']}")
+        items.append(item)
+    try:
+        return JOBS.submit(items, settings, _client_of(request, inp.client_id))
+    except ValueError as e:
+        raise HTTPException(422, str(e))
+
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": JOBS.list()}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return _job_or_404(JOBS.status, job_id)
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    return _job_or_404(JOBS.cancel, job_id)
+
+@app.post("/jobs/{job_id}/resume")
+def resume_job(job_id: str):
+    """Run the job's unfinished, failed and cancelled items again; finished items are kept."""
+    return _job_or_404(JOBS.resume, job_id)
+
+@app.get("/jobs/{job_id}/items/{index}/audio")
+def job_audio(job_id: str, index: int):
+    path = _job_or_404(JOBS.audio_path, job_id, index)
+    if path is None or not path.exists():
+        raise HTTPException(404, f"Item {index} of job '{job_id}' has no audio yet")
+    return FileResponse(str(path), media_type="audio/mpeg" if path.suffix == ".mp3" else "audio/wav",
+                        filename=path.name)
+
+# ========= Admin: on-demand profiling =========
+def _require_admin(request: Request):
+    token = os.getenv("VIBE_ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(403, "Admin endpoints are disabled; set VIBE_ADMIN_TOKEN to enable them")
+    given = request.headers.get("authorization", "")
+    given = given[7:] if given.lower().startswith("bearer ") else request.headers.get("x-vibe-admin-token", "")
+    if not hmac.compare_digest(given.encode(), token.encode()):
+        raise HTTPException(401, "Bad or missing admin token", headers={"WWW-Authenticate": "Bearer"})
+
+@app.post("/admin/profile")
+async def admin_profile(request: Request,
+                        seconds: Optional[float] = Query(None, gt=0, description="Sample the whole process for this long"),
+                        route: Optional[str] = Query(None, description="Or profile the next requests to this path ('/speak', '/ws/*')"),
+                        requests: int = Query(1, ge=1, description="How many requests to the route"),
+                        timeout: float = Query(60, gt=0, description="Give up waiting for route requests after this long"),
+                        idle: bool = Query(False, description="Keep samples of threads that are only waiting"),
+                        memory: bool = Query(True, description="Trace allocations (tracemalloc) during the capture"),
+                        format: str = Query("json", description="'json' (top frames, memory, folded) or 'folded'")):
+    """
+    Sampling profile of the running service (see profiling.py), behind VIBE_ADMIN_TOKEN
+    (Authorization: Bearer <token>). The folded output feeds flamegraph.pl / speedscope / inferno.
+    """
+    _require_admin(request)
+    if (seconds is None) == (route is None):
+        raise HTTPException(422, "Give either 'seconds' or 'route'")
+    if format not in ("json", "folded"):
+        raise HTTPException(422, "format must be 'json' or 'folded'")
+    capture = profiling.Capture(seconds=seconds, route=route, requests=requests, idle=idle, memory=memory)
+    try:
+        report = await profiling.run(capture, timeout)
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
+    if format == "folded":
+        return PlainTextResponse(report["folded"])
+    return report
 
 # ========= Optional static =========
 STATIC_DIR = ROOT / "static"
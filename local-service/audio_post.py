@@ -0,0 +1,223 @@
+# audio_post.py — block-by-block post-processing for 16-bit mono PCM on its way to the client
+#   * trims leading and trailing silence (a short pad is kept at both ends)
+#   * optionally shortens internal pauses longer than max_pause_ms
+#   * resamples to the rate the client asked for (windowed-sinc low-pass when downsampling)
+# Silence is judged per 10 ms window by peak level. Audio is only held back while it might be
+# silence; a block that starts and ends loud at the native rate is returned as the same object.
+import io
+import os
+import wave
+from typing import Dict, List, Optional
+
+import metrics
+
+TRIM_SILENCE = os.getenv("VIBE_TRIM_SILENCE", "1") != "0"
+SILENCE_DBFS = float(os.getenv("VIBE_SILENCE_DBFS", "-45"))
+PAD_MS = 40              # kept before the first and after the last sound
+WINDOW_MS = 10
+CLIENT_RATES = (16000, 22050, 24000, 44100, 48000)
+
+metrics.describe("vibe_audio_removed_ms_total", "Audio removed by post-processing, by part (lead, pause, trail)")
+
+
+class PcmPostProcessor:
+    def __init__(self, in_rate: int, out_rate: Optional[int] = None, trim: bool = True,
+                 max_pause_ms: Optional[int] = None, silence_dbfs: float = SILENCE_DBFS):
+        import numpy as np
+        self.np = np
+        self.in_rate = in_rate
+        self.out_rate = out_rate or in_rate
+        self.trim = trim
+        self.window = max(1, in_rate * WINDOW_MS // 1000)
+        self.pad = in_rate * PAD_MS // 1000
+        self.max_pause = in_rate * max_pause_ms // 1000 if max_pause_ms else None
+        self.threshold = int(32768 * 10 ** (silence_dbfs / 20))
+        self.started = not trim
+        self.held: List = []          # int16 arrays of a silent run that may turn out to be trailing
+        self.held_len = 0
+        self.carry = b""              # odd byte left over from a block
+        self.removed = {"lead": 0, "pause": 0, "trail": 0}
+        self._resampler = _Resampler(in_rate, self.out_rate) if self.out_rate != in_rate else None
+
+    # ---- public ---------------------------------------------------------------------
+    def process(self, chunk: bytes) -> bytes:
+        """Feed one block of PCM; returns what can be sent now (possibly b"" or `chunk` itself)."""
+        if self.carry or len(chunk) % 2:
+            chunk = self.carry + bytes(chunk)
+            cut = len(chunk) - len(chunk) % 2
+            chunk, self.carry = chunk[:cut], chunk[cut:]
+        if not chunk:
+            return b""
+        if not self.trim and self._resampler is None:
+            return chunk
+        x = self.np.frombuffer(chunk, dtype=self.np.int16)
+        out = self._trim(x, chunk) if self.trim else [x]
+        if len(out) == 1 and out[0] is chunk:
+            if self._resampler is None:
+                return chunk                                   # pass-through: no copy
+            out = [x]
+        return self._emit(out)
+
+    def flush(self) -> bytes:
+        """End of stream: drop trailing silence (keeping the pad) and drain the resampler."""
+        tail = []
+        if self.held_len:
+            run = self.np.concatenate(self.held)
+            keep = min(self.pad, len(run))
+            tail.append(run[:keep])
+            self.removed["trail"] += len(run) - keep
+            self.held, self.held_len = [], 0
+        data = self._emit(tail) if tail else b""
+        if self._resampler is not None:
+            data += self._resampler.flush()
+        for part, n in self.removed.items():
+            if n:
+                metrics.inc("vibe_audio_removed_ms_total", n * 1000 / self.in_rate, part=part)
+        return data
+
+    def stats(self) -> Dict[str, float]:
+        n = sum(self.removed.values())
+        return {"removed_samples": n, "removed_ms": round(n * 1000 / self.in_rate, 1),
+                **{f"{k}_ms": round(v * 1000 / self.in_rate, 1) for k, v in self.removed.items()},
+                "sample_rate": self.out_rate}
+
+    # ---- internals ------------------------------------------------------------------
+    def _loud_windows(self, x):
+        np = self.np
+        w = self.window
+        full = len(x) // w * w
+        peaks = np.abs(x[:full].reshape(-1, w).astype(np.int32)).max(axis=1) if full else np.empty(0, np.int32)
+        if full < len(x):
+            peaks = np.append(peaks, np.abs(x[full:].astype(np.int32)).max())
+        return np.flatnonzero(peaks >= self.threshold)
+
+    def _trim(self, x, chunk):
+        """Split x into what can go out now; silent stretches are held until we know what they are."""
+        loud = self._loud_windows(x)
+        w = self.window
+        if not self.started:
+            if not len(loud):
+                self.removed["lead"] += len(x)
+                return []
+            start = max(0, loud[0] * w - self.pad)
+            self.removed["lead"] += start
+            self.started = True
+            if start:
+                x, chunk = x[start:], None
+                loud = self._loud_windows(x)
+        if not len(loud):
+            self.held.append(x)
+            self.held_len += len(x)
+            return []
+        first, last = loud[0] * w, min(len(x), (loud[-1] + 1) * w)
+        out = []
+        if self.held_len or first:
+            out.append(self._pause(self.held + [x[:first]]))
+            self.held, self.held_len = [], 0
+        if last < len(x):
+            self.held.append(x[last:])
+            self.held_len += len(x) - last
+        if not out and last == len(x) and chunk is not None:
+            return [chunk]
+        out.append(x[first:last])
+        return out
+
+    def _pause(self, parts):
+        run = self.np.concatenate(parts) if len(parts) > 1 else parts[0]
+        if self.max_pause is None or len(run) <= self.max_pause:
+            return run
+        half = self.max_pause // 2
+        self.removed["pause"] += len(run) - 2 * half
+        return self.np.concatenate((run[:half], run[len(run) - half:]))
+
+    def _emit(self, parts) -> bytes:
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return b""
+        x = parts[0] if len(parts) == 1 else self.np.concatenate(parts)
+        if self._resampler is not None:
+            return self._resampler.process(x)
+        return x.tobytes()
+
+
+class _Resampler:
+    """Streaming resampler: exact output positions k * in/out, linear interpolation, FIR anti-alias."""
+    TAPS = 63
+
+    def __init__(self, in_rate: int, out_rate: int):
+        import numpy as np
+        self.np = np
+        self.in_rate, self.out_rate = in_rate, out_rate
+        self.k = 0          # next output sample index
+        self.base = 0       # global index of the first input sample in self.prev
+        self.prev = np.zeros(0, dtype=np.float64)
+        self.fir = None
+        if out_rate < in_rate:
+            cutoff = 0.45 * out_rate / in_rate           # cycles/sample, a little under Nyquist
+            n = np.arange(self.TAPS) - (self.TAPS - 1) / 2
+            h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(self.TAPS)
+            self.fir = h / h.sum()
+            self.hist = np.zeros(self.TAPS - 1, dtype=np.float64)
+            self.delay = (self.TAPS - 1) // 2
+            self.skip = self.delay          # the filter's group delay: drop its pre-roll
+
+    def _filter(self, x):
+        np = self.np
+        buf = np.concatenate((self.hist, x))
+        self.hist = buf[len(buf) - (self.TAPS - 1):]
+        y = np.convolve(buf, self.fir, mode="valid")
+        if self.skip:
+            cut = min(self.skip, len(y))
+            y, self.skip = y[cut:], self.skip - cut
+        return y
+
+    def process(self, x) -> bytes:
+        np = self.np
+        x = x.astype(np.float64)
+        if self.fir is not None:
+            x = self._filter(x)
+        buf = np.concatenate((self.prev, x))
+        return self._interp(buf, final=False)
+
+    def flush(self) -> bytes:
+        if self.fir is None:
+            return self._interp(self.prev, final=True) if len(self.prev) else b""
+        tail = self._filter(self.np.zeros(self.delay))     # push the filter's delay out
+        return self._interp(self.np.concatenate((self.prev, tail)), final=True)
+
+    def _interp(self, buf, final: bool) -> bytes:
+        np = self.np
+        if not len(buf):
+            return b""
+        last = self.base + len(buf) - (1 if final else 2)   # keep one sample to interpolate against
+        k_end = last * self.out_rate // self.in_rate + 1 if last >= 0 else self.k
+        ks = np.arange(self.k, max(self.k, k_end))
+        pos = ks * self.in_rate / self.out_rate - self.base
+        y = np.interp(pos, np.arange(len(buf)), buf)
+        self.k = max(self.k, k_end)
+        drop = max(0, min(len(buf) - 1, int(self.k * self.in_rate // self.out_rate) - self.base))
+        self.prev = buf[drop:]
+        self.base += drop
+        return np.clip(np.rint(y), -32768, 32767).astype(np.int16).tobytes()
+
+
+def process_wav(data: bytes, out_rate: Optional[int] = None, trim: bool = True,
+                max_pause_ms: Optional[int] = None):
+    """Whole-file variant for one-shot WAV: returns (wav bytes, stats); non-16-bit-mono input is returned as-is."""
+    try:
+        with wave.open(io.BytesIO(data)) as w:
+            if w.getsampwidth() != 2 or w.getnchannels() != 1:
+                return data, None
+            rate = w.getframerate()
+            pcm = w.readframes(w.getnframes())
+    except (wave.Error, EOFError):
+        return data, None
+    post = PcmPostProcessor(rate, out_rate, trim=trim, max_pause_ms=max_pause_ms)
+    pcm = post.process(pcm) + post.flush()
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(post.out_rate)
+        w.writeframes(pcm)
+    return buf.getvalue(), post.stats()
@@ -0,0 +1,375 @@
+# jobs.py — batch narration: many texts/files -> audio files on disk, processed in the background
+# A job is a directory under VIBE_JOBS_DIR holding job.json (settings + per-item state) and one audio
+# file per finished item. job.json is rewritten atomically after every state change, so a job cut short
+# by a restart resumes where it stopped: finished items whose audio is on disk are not redone.
+# Items run on a bounded worker pool (VIBE_JOB_WORKERS) at "batch" priority, so the upstream quota
+# scheduler (quota.py) serves interactive turns first; a 429 puts the item back to sleep for Retry-After.
+# With several service workers (serve.py --workers) a job runs in the worker holding its lock file
+# (owner.lock, with the pid). Only that worker writes job.json; the others read it from disk and leave a
+# "cancel"/"resume" marker file that the owner applies. A lock nobody holds means the job's worker died
+# (or the service stopped): whichever worker takes the lock next, at startup or in watch(), resumes it.
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from upstream import Deadline
+
+JOBS_DIR = Path(os.getenv("VIBE_JOBS_DIR") or Path(__file__).parent / "_jobs")
+JOB_WORKERS = int(os.getenv("VIBE_JOB_WORKERS", "4"))
+JOB_ATTEMPTS = int(os.getenv("VIBE_JOB_ATTEMPTS", "3"))           # per item, not counting 429 waits
+JOB_ITEM_DEADLINE_S = float(os.getenv("VIBE_JOB_ITEM_DEADLINE_S", "300"))
+JOB_MAX_ITEMS = int(os.getenv("VIBE_JOB_MAX_ITEMS", "1000"))
+JOB_SWEEP_S = float(os.getenv("VIBE_JOB_SWEEP_S", "30"))        # how often watch() looks for orphaned jobs
+
+try:
+    import fcntl
+except ImportError:     # no file locks (Windows): one service process, so every job is this process's
+    fcntl = None
+
+metrics.describe("vibe_job_items_total", "Batch narration items finished, by outcome")
+metrics.describe("vibe_job_item_seconds", "Time to narrate one batch item (all attempts)")
+metrics.describe("vibe_jobs_active", "Batch jobs with items still to do")
+
+# narrate(item, settings, deadline) -> (audio bytes, mime, transcript); supplied by app.py
+Narrate = Callable[[Dict[str, Any], Dict[str, Any], Deadline], Tuple[bytes, str, str]]
+
+ITEM_STATES = ("queued", "running", "done", "failed", "cancelled")
+_PROGRESS_FIELDS = ("index", "state", "attempts", "audio", "error", "mime", "bytes", "transcript", "seconds")
+MARKERS = ("cancel", "resume")      # requests left in the job directory for the worker that owns the job
+
+
+def _slug(text: str, limit: int = 40) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", text).strip("-").lower()[:limit].strip("-") or "item"
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class JobRunner:
+    def __init__(self, narrate: Narrate, root: Path = JOBS_DIR, workers: int = JOB_WORKERS):
+        self.narrate = narrate
+        self.root = Path(root)
+        self.workers = workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._cancel: Dict[str, threading.Event] = {}
+        self._active = set()              # (job id, item index) being narrated by this process
+        self._owned: Dict[str, IO] = {}   # jobs this process runs -> their held lock file; others are re-read
+        self._mtimes: Dict[str, int] = {}  # when their job.json changes
+        self._closing = threading.Event()
+
+    # ---- public ---------------------------------------------------------------------
+    def submit(self, items: List[Dict[str, Any]], settings: Dict[str, Any], client: str = "") -> Dict[str, Any]:
+        """Create a job from items ({"text"} or {"file"}, plus per-item overrides) and start it."""
+        if not items:
+            raise ValueError("A job needs at least one item.")
+        if len(items) > JOB_MAX_ITEMS:
+            raise ValueError(f"Too many items ({len(items)}); the limit is {JOB_MAX_ITEMS}.")
+        for i, item in enumerate(items):
+            if not (item.get("text") or item.get("file")):
+                raise ValueError(f"Item {i} needs 'text' or 'file'.")
+        job_id = time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        ext = "mp3" if (settings.get("format") or "wav").lower() == "mp3" else "wav"
+        job = {
+            "id": job_id, "state": "running", "created": time.time(), "client": client or "",
+            "settings": settings,
+            "items": [{"index": i, **item, "state": "queued", "attempts": 0,
+                       "audio": f"{i:04d}-{_slug(item.get('id') or Path(item.get('file') or '').stem or item.get('text', ''))}.{ext}"}
+                      for i, item in enumerate(items)],
+        }
+        (self.root / job_id).mkdir(parents=True, exist_ok=True)
+        self._own(job_id)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._save(job)
+        self._start(job)
+        return self.status(job_id)
+
+    def status(self, job_id: str, items: bool = True) -> Dict[str, Any]:
+        job = self._load(job_id)
+        with self._lock:
+            counts = {s: 0 for s in ITEM_STATES}
+            for it in job["items"]:
+                counts[it["state"]] += 1
+            out = {k: v for k, v in job.items() if k != "items"}
+            out.update(total=len(job["items"]), counts=counts, dir=str(self.root / job_id))
+            if items:
+                out["items"] = [dict(it) for it in job["items"]]
+        return out
+
+    def list(self) -> List[Dict[str, Any]]:
+        ids = sorted(p.name for p in self.root.iterdir() if (p / "job.json").exists()) if self.root.exists() else []
+        return [self.status(j, items=False) for j in ids]
+
+    def audio_path(self, job_id: str, index: int) -> Optional[Path]:
+        job = self._load(job_id)
+        if not 0 <= index < len(job["items"]) or job["items"][index]["state"] != "done":
+            return None
+        return self.root / job_id / job["items"][index]["audio"]
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        """Cancel the queued items (items mid-call finish). From any worker: the job's owner applies it."""
+        self._load(job_id)
+        self._request(job_id, "cancel", b"")
+        return self.status(job_id)
+
+    def resume(self, job_id: str, retry_failed: bool = True) -> Dict[str, Any]:
+        """Queue every item that is not done (or whose audio went missing) again; done items are kept."""
+        self._load(job_id)
+        self._request(job_id, "resume", b"1" if retry_failed else b"0")
+        return self.status(job_id)
+
+    def resume_all(self) -> List[str]:
+        """Pick up running jobs that no live worker owns (the service stopped, or a worker died)."""
+        resumed = []
+        for summary in self.list():
+            job_id = summary["id"]
+            if summary["state"] == "running" and job_id not in self._owned and self._own(job_id):
+                if self._jobs[job_id]["state"] == "running":      # as re-read under the lock
+                    self._resume_here(job_id, retry_failed=False)
+                    resumed.append(job_id)
+                self._release_if_idle(job_id)
+            self._poll(job_id)
+        return resumed
+
+    def watch(self, interval: float = JOB_SWEEP_S):
+        """Run resume_all() every `interval` seconds in the background, so a dead worker's jobs carry on."""
+        def loop():
+            while not self._closing.wait(interval):
+                try:
+                    self.resume_all()
+                except Exception:
+                    pass        # a job directory half written or removed meanwhile: next round
+        threading.Thread(target=loop, name="vibe-job-watch", daemon=True).start()
+
+    def close(self):
+        self._closing.set()
+        for ev in list(self._cancel.values()):
+            ev.set()
+        if self._pool is not None:
+            # items mid-call stay "running" on disk and are picked up by resume_all() next time
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        with self._lock:
+            for job_id in list(self._owned):
+                self._release(job_id)
+
+    # ---- internals ------------------------------------------------------------------
+    def _own(self, job_id: str) -> bool:
+        """Take the job's lock file; True if this process runs the job, now or already."""
+        with self._lock:
+            if job_id in self._owned:
+                return True
+            f = open(self.root / job_id / "owner.lock", "a+")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    f.close()
+                    return False
+            f.truncate(0)
+            f.write(str(os.getpid()))
+            f.flush()
+            self._owned[job_id] = f
+            path = self.root / job_id / "job.json"
+            if path.exists():       # the last owner may have got further than the copy read before
+                self._jobs[job_id] = json.loads(path.read_text(encoding="utf-8"))
+            return True
+
+    def _release(self, job_id: str):
+        """Give up the job's lock file; call with the lock held."""
+        f = self._owned.pop(job_id, None)
+        if f is not None:
+            f.close()
+            self._mtimes.pop(job_id, None)
+
+    def _release_if_idle(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job_id in self._owned and job is not None and job["state"] != "running" \
+                    and not any(j == job_id for j, _ in self._active):
+                self._release(job_id)
+
+    def _request(self, job_id: str, marker: str, data: bytes):
+        """Leave a cancel/resume for the job's owner (replacing the other one), then apply it if that is us."""
+        folder = self.root / job_id
+        for other in MARKERS:
+            if other != marker:
+                try:
+                    (folder / other).unlink()
+                except OSError:
+                    pass
+        _write_atomic(folder / marker, data)
+        self._poll(job_id)
+
+    def _poll(self, job_id: str):
+        """
+        Apply a marker left for the job if this process runs it or can take it over; otherwise its owner
+        will. Owners poll before and after every item, and once more after they let go of a finished job.
+        """
+        folder = self.root / job_id
+        if not any((folder / m).exists() for m in MARKERS) or not self._own(job_id):
+            return
+        for marker in MARKERS:
+            try:
+                data = (folder / marker).read_bytes()
+                (folder / marker).unlink()
+            except OSError:
+                continue
+            if marker == "cancel":
+                self._cancel_here(job_id)
+            else:
+                self._resume_here(job_id, retry_failed=data == b"1")
+        self._release_if_idle(job_id)
+
+    def _cancel_here(self, job_id: str):
+        job = self._jobs[job_id]
+        self._cancel.setdefault(job_id, threading.Event()).set()
+        with self._lock:
+            for it in job["items"]:
+                if it["state"] == "queued":
+                    it["state"] = "cancelled"
+            self._finish_if_idle(job)
+            self._save(job)
+
+    def _resume_here(self, job_id: str, retry_failed: bool):
+        job = self._jobs[job_id]
+        self._cancel.pop(job_id, None)
+        with self._lock:
+            again = ("queued", "running", "cancelled") + (("failed",) if retry_failed else ())
+            for it in job["items"]:
+                if (job_id, it["index"]) in self._active:
+                    continue
+                if it["state"] == "done" and not (self.root / job_id / it["audio"]).exists():
+                    it["state"] = "queued"
+                elif it["state"] in again:
+                    it["state"], it["attempts"] = "queued", 0
+                    it.pop("error", None)
+            job["state"] = "running"
+            self._finish_if_idle(job)
+            self._save(job)
+        self._start(job)
+
+    def _load(self, job_id: str) -> Dict[str, Any]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job_id not in self._owned:
+                path = self.root / job_id / "job.json"
+                if not re.fullmatch(r"[\w-]+", job_id) or not path.exists():
+                    raise KeyError(job_id)
+                mtime = path.stat().st_mtime_ns
+                if job is None or self._mtimes.get(job_id) != mtime:
+                    job = self._jobs[job_id] = json.loads(path.read_text(encoding="utf-8"))
+                    self._mtimes[job_id] = mtime
+            return job
+
+    def _save(self, job: Dict[str, Any]):
+        """Persist job.json; call with the lock held. Only the owner writes it (not after close())."""
+        if job["id"] not in self._owned:
+            return
+        _write_atomic(self.root / job["id"] / "job.json", json.dumps(job, ensure_ascii=False, indent=1).encode("utf-8"))
+
+    def _start(self, job: Dict[str, Any]):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="vibe-job")
+            todo = [it["index"] for it in job["items"] if it["state"] == "queued"]
+            self._refresh_gauge()
+        for i in todo:
+            self._pool.submit(self._run_item, job["id"], i)
+
+    def _refresh_gauge(self):
+        metrics.gauge("vibe_jobs_active", sum(1 for j in self._owned if self._jobs.get(j, {}).get("state") == "running"))
+
+    def _finish_if_idle(self, job: Dict[str, Any]):
+        if any(it["state"] in ("queued", "running") for it in job["items"]):
+            return
+        states = {it["state"] for it in job["items"]}
+        job["state"] = "failed" if "failed" in states else "cancelled" if "cancelled" in states else "done"
+        job["finished"] = time.time()
+        self._refresh_gauge()
+
+    def _set(self, job: Dict[str, Any], item: Dict[str, Any], **changes):
+        """Update one item (None removes a field) and persist the job."""
+        with self._lock:
+            for k, v in changes.items():
+                if v is None:
+                    item.pop(k, None)
+                else:
+                    item[k] = v
+            self._finish_if_idle(job)
+            self._save(job)
+
+    def _run_item(self, job_id: str, index: int):
+        self._poll(job_id)
+        job = self._load(job_id)
+        item = job["items"][index]
+        cancel = self._cancel.setdefault(job_id, threading.Event())
+        with self._lock:
+            if (job_id not in self._owned or item["state"] != "queued" or cancel.is_set()
+                    or (job_id, index) in self._active):
+                return
+            self._active.add((job_id, index))
+        try:
+            self._narrate_item(job, item, cancel)
+        finally:
+            with self._lock:
+                self._active.discard((job_id, index))
+            if not self._closing.is_set():
+                self._release_if_idle(job_id)
+                self._poll(job_id)      # a marker left while this process still held the lock
+
+    def _narrate_item(self, job: Dict[str, Any], item: Dict[str, Any], cancel: threading.Event):
+        job_id = job["id"]
+        self._set(job, item, state="running")
+        t0 = time.monotonic()
+        spec = {k: v for k, v in item.items() if k not in _PROGRESS_FIELDS}
+        while True:
+            if self._closing.is_set():
+                return      # left "running": resume_all() picks it up on the next start
+            if cancel.is_set():
+                self._set(job, item, state="cancelled")
+                metrics.inc("vibe_job_items_total", outcome="cancelled")
+                return
+            deadline = Deadline(JOB_ITEM_DEADLINE_S, "batch", job.get("client") or f"job:{job_id}")
+            try:
+                audio, mime, transcript = self.narrate(spec, job["settings"], deadline)
+            except Exception as e:
+                if self._closing.is_set():
+                    return      # the failure is likely the shutdown itself; retry on the next start
+                status = getattr(e, "status_code", None)
+                if status == 429:
+                    # out of upstream quota: wait it out without spending an attempt
+                    retry = float((getattr(e, "headers", None) or {}).get("Retry-After", 5))
+                    cancel.wait(min(retry, JOB_ITEM_DEADLINE_S))
+                    continue
+                attempts = item["attempts"] + 1
+                error = getattr(e, "detail", None) or str(e)
+                if attempts >= JOB_ATTEMPTS or status in (400, 404, 422):
+                    self._set(job, item, state="failed", attempts=attempts, error=error)
+                    metrics.inc("vibe_job_items_total", outcome="failed")
+                    return
+                self._set(job, item, attempts=attempts, error=error)
+                cancel.wait(2 ** attempts)
+                continue
+            if self._closing.is_set():
+                return      # another worker may own the job by now
+            path = self.root / job_id / item["audio"]
+            _write_atomic(path, audio)
+            self._set(job, item, state="done", attempts=item["attempts"] + 1, mime=mime, bytes=len(audio),
+                      transcript=transcript, seconds=round(time.monotonic() - t0, 3), error=None)
+            metrics.inc("vibe_job_items_total", outcome="done")
+            metrics.observe("vibe_job_item_seconds", time.monotonic() - t0)
+            return
@@ -0,0 +1,78 @@
+# lifecycle.py — live WebSocket connections, so a worker can drain them before it exits
+# uvicorn's own shutdown cuts every open socket with 1012 straight away, mid-answer included.
+# serve.py instead calls drain() first: listeners are already closed, idle connections are closed
+# with 1012 ("service restarting", so clients reconnect to another worker), and connections in the
+# middle of a turn finish it and are closed right after. Whatever is still busy after VIBE_DRAIN_S
+# is left to uvicorn's normal shutdown.
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Set
+
+DRAIN_S = float(os.getenv("VIBE_DRAIN_S", "30"))
+RESTART_CODE = 1012
+RESTART_REASON = "service restarting"
+
+log = logging.getLogger("uvicorn.error")
+
+
+class Live:
+    """One accepted socket: how many turns it has running."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.turns = 0
+        self.closing = False
+
+    async def close(self):
+        if self.closing:
+            return
+        self.closing = True
+        try:
+            await self.ws.close(code=RESTART_CODE, reason=RESTART_REASON)
+        except Exception:
+            pass                                   # the client went away first
+
+    @contextmanager
+    def turn(self):
+        self.turns += 1
+        try:
+            yield
+        finally:
+            self.turns -= 1
+
+    async def turn_done(self):
+        """Call after a turn's last message: while draining, an idle socket is closed now."""
+        if draining and self.turns == 0:
+            await self.close()
+
+
+connections: Set[Live] = set()
+draining = False
+
+
+@contextmanager
+def track(ws):
+    live = Live(ws)
+    connections.add(live)
+    try:
+        yield live
+    finally:
+        connections.discard(live)
+
+
+async def drain(timeout: float = DRAIN_S) -> int:
+    """Close idle sockets, wait for busy ones to finish their turn; returns how many were still open."""
+    global draining
+    draining = True
+    if connections:
+        log.info("Draining %d WebSocket connection(s)", len(connections))
+    end = time.monotonic() + timeout
+    while connections and time.monotonic() < end:
+        for live in list(connections):
+            if live.turns == 0:
+                await live.close()
+        await asyncio.sleep(0.05)
+    return len(connections)
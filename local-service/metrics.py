@@ -0,0 +1,107 @@
+# metrics.py — small in-process metrics registry, served by app.py at /metrics
+# Counters, gauges and latency summaries, rendered in the Prometheus text format.
+# Summaries also keep a window of recent samples so callers can ask for a percentile.
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+WINDOW = 256  # recent samples kept per summary for percentile queries
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, tuple], float] = defaultdict(float)
+_gauges: Dict[Tuple[str, tuple], float] = {}
+_sums: Dict[Tuple[str, tuple], List[float]] = {}          # key -> [count, sum]
+_recent: Dict[Tuple[str, tuple], Deque[float]] = {}
+_help: Dict[str, str] = {}
+
+
+def _key(name: str, labels: Dict[str, str]) -> Tuple[str, tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name: str, text: str):
+    _help[name] = text
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels):
+    k = _key(name, labels)
+    with _lock:
+        cs = _sums.setdefault(k, [0, 0.0])
+        cs[0] += 1
+        cs[1] += value
+        _recent.setdefault(k, deque(maxlen=WINDOW)).append(value)
+
+
+def count(name: str, **labels) -> float:
+    k = _key(name, labels)
+    with _lock:
+        if k in _counters:
+            return _counters[k]
+        return _sums.get(k, [0, 0.0])[0]
+
+
+def percentile(name: str, p: float, min_samples: int = 1, **labels) -> Optional[float]:
+    """p-th percentile (0-100) of the recent samples, or None with fewer than min_samples."""
+    with _lock:
+        xs = sorted(_recent.get(_key(name, labels), ()))
+    if not xs or len(xs) < min_samples:
+        return None
+    i = min(len(xs) - 1, max(0, int(round(p / 100 * (len(xs) - 1)))))
+    return xs[i]
+
+
+def _fmt(name: str, labels: tuple, suffix: str = "") -> str:
+    if not labels:
+        return name + suffix
+    inner = ",".join('%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels)
+    return f"{name}{suffix}{{{inner}}}"
+
+
+def render() -> str:
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        sums = sorted((k, list(v)) for k, v in _sums.items())
+    out: List[str] = []
+    seen = set()
+    for (name, labels), v in counters:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                out.append(f"# HELP {name} {_help[name]}")
+            out.append(f"# TYPE {name} counter")
+        out.append(f"{_fmt(name, labels)} {v:g}")
+    for (name, labels), v in gauges:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                out.append(f"# HELP {name} {_help[name]}")
+            out.append(f"# TYPE {name} gauge")
+        out.append(f"{_fmt(name, labels)} {v:g}")
+    for (name, labels), (n, total) in sums:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                out.append(f"# HELP {name} {_help[name]}")
+            out.append(f"# TYPE {name} summary")
+        out.append(f"{_fmt(name, labels, '_count')} {n}")
+        out.append(f"{_fmt(name, labels, '_sum')} {total:.6f}")
+    return "\n".join(out) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _sums.clear()
+        _recent.clear()
@@ -1,4 +1,4 @@
-import os, base64, json, math, struct, requests
+import os, base64, json, math, struct, time, requests
 
 MURF_TTS_URL = os.getenv("MURF_TTS_URL", "").strip()
 MURF_API_KEY = os.getenv("MURF_API_KEY", "").strip()
@@ -20,7 +20,10 @@ def _tone_wav_b64(freq=440, ms=250, sr=22050):
     hdr = b"RIFF" + struct.pack("<I", 36+len(data)) + b"WAVEfmt " + struct.pack("<IHHIIHH", 16, 1, 1, sr, byte_rate, block_align, 16) + b"data" + struct.pack("<I", len(data))
     return base64.b64encode(hdr + data).decode("utf-8")
 
-def synth_to_file_b64(text: str, voice_id: str, language: str, fmt: str = "mp3", sample_rate: int = 22050):
+def synth_to_file_b64(text: str, voice_id: str, language: str, fmt: str = "mp3", sample_rate: int = 22050,
+                      timeout: float = 60):
+    # timeout: seconds left in the caller's deadline; shared by the synth call and the audio download
+    deadline = time.monotonic() + timeout
     # Debug bypass: return a local tone so you can test end to end without Murf
     if os.getenv("MURF_DEBUG", "0") == "1":
         return _tone_wav_b64(), "audio/wav"
@@ -44,7 +47,7 @@ def synth_to_file_b64(text: str, voice_id: str, language: str, fmt: str = "mp3",
     }
 
     try:
-        resp = requests.post(MURF_TTS_URL, headers=headers, data=json.dumps(payload), timeout=60)
+        resp = requests.post(MURF_TTS_URL, headers=headers, data=json.dumps(payload), timeout=timeout)
     except Exception as e:
         raise MurfError(f"Network error calling Murf: {e}")
 
@@ -61,7 +64,10 @@ def synth_to_file_b64(text: str, voice_id: str, language: str, fmt: str = "mp3",
     if isinstance(data, dict) and "audio" in data:
         return data["audio"], f"audio/{fmt}"
     if isinstance(data, dict) and "audio_url" in data:
-        a = requests.get(data["audio_url"], timeout=60)
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise MurfError("Deadline exceeded before downloading Murf audio")
+        a = requests.get(data["audio_url"], timeout=left)
         a.raise_for_status()
         return base64.b64encode(a.content).decode("utf-8"), f"audio/{fmt}"
 
@@ -0,0 +1,204 @@
+# profiling.py — on-demand sampling profiler behind /admin/profile
+# A background thread reads every thread's Python stack (sys._current_frames) every INTERVAL_S and
+# counts identical stacks. The result is in the "folded" format flamegraph.pl, speedscope and
+# inferno read: "thread;file.py:outer;file.py:inner <samples>" per line. Threads parked in a lock,
+# a selector or an executor queue are left out unless idle=True, so the graph shows where time goes.
+# tracemalloc runs for the same window and its top allocation sites come back alongside.
+# Pure Python, no native profiler; the cost is one stack walk per thread per sample.
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+INTERVAL_S = float(os.getenv("VIBE_PROFILE_INTERVAL_MS", "5")) / 1000
+MAX_SECONDS = float(os.getenv("VIBE_PROFILE_MAX_S", "120"))
+MAX_DEPTH = 64
+MEMORY_TOP = 25
+
+# innermost Python frames of a thread that is only waiting
+IDLE_LEAVES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("selectors.py", "select"),
+    ("queue.py", "get"), ("thread.py", "_worker"), ("connection.py", "_poll"), ("socket.py", "accept"),
+    ("socket.py", "readinto"), ("ssl.py", "read"),
+}
+
+
+def _label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = INTERVAL_S, idle: bool = False, memory: bool = True):
+        self.interval = interval
+        self.idle = idle
+        self.memory = memory
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._traced = False
+        self._snapshot = None
+
+    def start(self) -> "SamplingProfiler":
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(16)
+            self._traced = True
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="vibe-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        if self.memory and tracemalloc.is_tracing():
+            self._snapshot = tracemalloc.take_snapshot().filter_traces(
+                (tracemalloc.Filter(False, tracemalloc.__file__),))
+            if self._traced:
+                tracemalloc.stop()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                code = frame.f_code
+                if not self.idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}").replace(";", ":").replace(" ", "_"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    # ---- output ---------------------------------------------------------------------
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def top(self, n: int = 25) -> Dict[str, List[Dict[str, Any]]]:
+        """Hottest frames: self = innermost frame of a sample, total = anywhere on the stack."""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for f in set(frames):
+                total[f] += count
+        scale = self.elapsed * 1000 / max(self.samples, 1)     # the real period; the GIL stretches the interval
+        return {kind: [{"frame": f, "samples": c, "ms": round(c * scale, 1)} for f, c in counter.most_common(n)]
+                for kind, counter in (("self", own), ("total", total))}
+
+    def memory_top(self, n: int = MEMORY_TOP) -> List[Dict[str, Any]]:
+        if self._snapshot is None:
+            return []
+        return [{"where": f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}",
+                 "size_kb": round(s.size / 1024, 1), "count": s.count}
+                for s in self._snapshot.statistics("lineno")[:n]]
+
+    def report(self) -> Dict[str, Any]:
+        return {"duration_s": round(self.elapsed, 3), "interval_ms": self.interval * 1000,
+                "period_ms": round(self.elapsed * 1000 / max(self.samples, 1), 2), "samples": self.samples,
+                "top": self.top(), "memory": self.memory_top(), "folded": self.folded()}
+
+
+class Capture:
+    """
+    One admin-requested capture: either a fixed number of seconds, or the next `requests` requests to
+    `route`. In route mode the sampler runs from the first matching request until the last one ends.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, route: Optional[str] = None, requests: int = 1,
+                 idle: bool = False, memory: bool = True):
+        self.seconds = seconds
+        self.route = route
+        self.remaining = max(1, requests)
+        self.active = 0
+        self.profiled = 0
+        self.profiler = SamplingProfiler(idle=idle, memory=memory)
+        self.done = asyncio.Event()
+        self._running = False
+
+    def matches(self, path: str) -> bool:
+        return self.route is not None and self.remaining > 0 and (
+            path == self.route or (self.route.endswith("*") and path.startswith(self.route[:-1])))
+
+    def begin(self):
+        if not self._running:
+            self._running = True
+            self.profiler.start()
+
+    def request_started(self):
+        self.remaining -= 1
+        self.active += 1
+        self.profiled += 1
+        self.begin()
+
+    def request_finished(self):
+        self.active -= 1
+        if self.remaining <= 0 and self.active == 0:
+            self.finish()
+
+    def finish(self):
+        if self._running:
+            self._running = False
+            self.profiler.stop()
+        self.done.set()
+
+
+_current: Optional[Capture] = None
+
+
+async def run(capture: Capture, timeout: float) -> Dict[str, Any]:
+    """Run one capture to completion (or timeout); only one capture may run at a time."""
+    global _current
+    if _current is not None:
+        raise RuntimeError("A profile capture is already running")
+    _current = capture
+    try:
+        if capture.seconds:
+            capture.begin()
+            await asyncio.sleep(min(capture.seconds, MAX_SECONDS))
+            capture.finish()
+        else:
+            try:
+                await asyncio.wait_for(capture.done.wait(), min(timeout, MAX_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        capture.finish()        # also when the admin request is cancelled
+        _current = None
+    out = capture.profiler.report()
+    if capture.route:
+        out.update(route=capture.route, requests_profiled=capture.profiled)
+    return out
+
+
+class ProfileMiddleware:
+    """ASGI middleware: HTTP requests and WebSocket sessions to the capture's route are profiled."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        capture = _current
+        if capture is None or scope["type"] not in ("http", "websocket") or not capture.matches(scope["path"]):
+            return await self.app(scope, receive, send)
+        capture.request_started()
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            capture.request_finished()
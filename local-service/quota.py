@@ -0,0 +1,315 @@
+# quota.py — scheduler in front of the upstream clients (Gemini, Murf)
+# Every upstream call first takes a lease here. The lease names the API key to use, and it is granted only when:
+#   * the key's token bucket has a token ({NAME}_RPS per second, bursts up to {NAME}_BURST)
+#   * the key's budget ({NAME}_KEY_BUDGET calls per VIBE_KEY_BUDGET_WINDOW_S) is not spent
+#   * the key is not cooling down after the upstream answered 429
+# Interactive requests go first. Batch requests go only while no interactive request is waiting, and they never
+# take the last VIBE_BATCH_RESERVE of a bucket, so a burst of batch work can't starve voice turns.
+# Within a priority, clients take turns (round-robin), so one busy client can't starve the others.
+# Keys: {NAME}_API_KEYS="k1,k2:500" (":500" is that key's own budget) or the single {NAME}_API_KEY.
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi import HTTPException
+
+import metrics
+
+PRIORITIES = ("interactive", "batch")      # dispatch order
+DEFAULT_RPS = {"gemini": 2.0, "murf": 5.0}  # other upstreams are unlimited unless {NAME}_RPS is set
+DEFAULT_BURST = 10
+BATCH_RESERVE = float(os.getenv("VIBE_BATCH_RESERVE", "0.3"))   # share of each bucket kept for interactive
+BUDGET_WINDOW_S = float(os.getenv("VIBE_KEY_BUDGET_WINDOW_S", "86400"))
+RATE_LIMIT_COOLDOWN_S = float(os.getenv("VIBE_RATE_LIMIT_COOLDOWN_S", "30"))  # when a 429 has no Retry-After
+
+metrics.describe("vibe_upstream_queue_seconds", "Time upstream calls waited for a quota lease")
+metrics.describe("vibe_upstream_queued", "Upstream calls waiting for a quota lease")
+metrics.describe("vibe_upstream_key_calls_total", "Leases granted, by API key (index in the pool)")
+metrics.describe("vibe_upstream_rate_limited_total", "429 answers from upstreams, by API key")
+metrics.describe("vibe_upstream_rejected_total", "Calls refused by the scheduler (answered 429), by reason")
+
+
+class RateLimited(Exception):
+    """An upstream answered 429. retry_after is its hint in seconds, or None when it gave none."""
+
+    def __init__(self, upstream: str, retry_after: Optional[float] = None, detail: str = ""):
+        super().__init__(f"{upstream} rate limit{': ' + detail if detail else ''}")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Any) -> Optional[float]:
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None          # HTTP-date form: fall back to the default cooldown
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """
+    Seconds to back off if exc is an upstream 429, or None for any other error. Recognizes RateLimited,
+    google.api_core's ResourceExhausted, and a refused websockets handshake.
+    """
+    if isinstance(exc, RateLimited):
+        return exc.retry_after if exc.retry_after is not None else RATE_LIMIT_COOLDOWN_S
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "code", None)
+    if status is None:
+        status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    try:
+        if int(status) != 429:
+            return None
+    except (TypeError, ValueError):
+        return None
+    headers = getattr(response, "headers", None) or {}
+    hint = parse_retry_after(headers.get("Retry-After"))
+    return hint if hint is not None else RATE_LIMIT_COOLDOWN_S
+
+
+class ApiKey:
+    """One key's token bucket, budget window and 429 cooldown. Only its index appears in metrics."""
+
+    def __init__(self, index: int, secret: Optional[str], rate: float, burst: float, budget: int):
+        now = time.monotonic()
+        self.index = index
+        self.secret = secret
+        self.rate = rate                   # tokens per second; 0 = unlimited
+        self.burst = burst
+        self.budget = budget               # calls per BUDGET_WINDOW_S; 0 = unlimited
+        self.tokens = burst
+        self.stamp = now
+        self.used = 0
+        self.window_start = now
+        self.cool_until = 0.0
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if now - self.window_start >= BUDGET_WINDOW_S:
+            self.used = 0
+            self.window_start = now
+
+    def ready_in(self, now: float, reserve: float) -> float:
+        """Seconds until this key can serve a call that must leave `reserve` tokens behind."""
+        self._refill(now)
+        wait = max(0.0, self.cool_until - now)
+        if self.budget and self.used >= self.budget:
+            wait = max(wait, self.window_start + BUDGET_WINDOW_S - now)
+        if self.rate > 0:
+            need = min(self.burst, 1 + reserve)
+            if self.tokens < need:
+                wait = max(wait, (need - self.tokens) / self.rate)
+        return wait
+
+    def take(self):
+        if self.rate > 0:
+            self.tokens -= 1
+        self.used += 1
+
+
+class Lease:
+    """Permission for one upstream call with `key` (None when the upstream has no keys configured)."""
+
+    def __init__(self, pool: "UpstreamPool", key: ApiKey):
+        self.pool = pool
+        self._key = key
+        self.key = key.secret
+        self.key_id = key.index
+
+    def rate_limited(self, retry_after_s: float):
+        """The upstream answered 429 for this key: keep it out of rotation for retry_after_s."""
+        self.pool.cool(self._key, retry_after_s)
+
+
+class _Ticket:
+    __slots__ = ("priority", "client", "pin", "lease")
+
+    def __init__(self, priority: str, client: str, pin: Optional[str]):
+        self.priority = priority
+        self.client = client
+        self.pin = pin
+        self.lease: Optional[Lease] = None
+
+
+class UpstreamPool:
+    def __init__(self, name: str, keys: List[ApiKey]):
+        self.name = name
+        self.keys = keys
+        self.cond = threading.Condition()
+        # priority -> client -> that client's waiting tickets; dict order is the round-robin order
+        self.waiting: Dict[str, "OrderedDict[str, Deque[_Ticket]]"] = {p: OrderedDict() for p in PRIORITIES}
+
+    def _reserve(self, priority: str, key: ApiKey) -> float:
+        return BATCH_RESERVE * key.burst if priority == "batch" else 0.0
+
+    def _best_key(self, now: float, priority: str, pin: Optional[str]) -> Optional[ApiKey]:
+        best = None
+        for k in self.keys:
+            if pin is not None and k.secret != pin:
+                continue
+            if k.ready_in(now, self._reserve(priority, k)) == 0 and (best is None or k.tokens > best.tokens):
+                best = k
+        return best
+
+    def _ready_in(self, now: float, priority: str, pin: Optional[str]) -> float:
+        waits = [k.ready_in(now, self._reserve(priority, k)) for k in self.keys if pin is None or k.secret == pin]
+        return min(waits) if waits else math.inf
+
+    def _dispatch(self, now: float):
+        """Grant leases in priority order, one per client per pass. Call with the lock held."""
+        granted = False
+        for priority in PRIORITIES:
+            queue = self.waiting[priority]
+            progress = True
+            while queue and progress:
+                progress = False
+                for client in list(queue):
+                    tickets = queue[client]
+                    key = self._best_key(now, priority, tickets[0].pin)
+                    if key is None:
+                        continue
+                    ticket = tickets.popleft()
+                    del queue[client]
+                    if tickets:
+                        queue[client] = tickets          # back of the rotation
+                    key.take()
+                    ticket.lease = Lease(self, key)
+                    metrics.inc("vibe_upstream_key_calls_total", upstream=self.name, key=key.index)
+                    granted = True
+                    progress = True
+            if queue:
+                break        # strict priority: nothing lower goes while this class is waiting
+        if granted:
+            self.cond.notify_all()
+
+    def _remove(self, ticket: _Ticket):
+        queue = self.waiting[ticket.priority]
+        tickets = queue.get(ticket.client)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del queue[ticket.client]
+        self.cond.notify_all()
+
+    def _gauge(self, priority: str):
+        metrics.gauge("vibe_upstream_queued", sum(map(len, self.waiting[priority].values())),
+                      upstream=self.name, priority=priority)
+
+    def acquire(self, deadline, wait: bool = True, pin: Optional[str] = None,
+                cancel: Optional[threading.Event] = None) -> Optional[Lease]:
+        """
+        Wait for a lease for deadline.priority / deadline.client. Raises 429 when no key can serve the call before
+        the deadline (budget spent, cooling down, rate too low) and 504 when the deadline runs out in the queue.
+        With wait=False, returns None instead of queueing.
+        """
+        priority = getattr(deadline, "priority", "interactive")
+        client = getattr(deadline, "client", "") or ""
+        t0 = time.monotonic()
+        ticket = _Ticket(priority, client, pin)
+        with self.cond:
+            self.waiting[priority].setdefault(client, deque()).append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._dispatch(now)
+                    if ticket.lease is not None:
+                        break
+                    if not wait or (cancel is not None and cancel.is_set()):
+                        self._remove(ticket)
+                        return None
+                    left = deadline.remaining()
+                    ready = self._ready_in(now, priority, pin)
+                    if ready > left:
+                        self._remove(ticket)
+                        reason = "cooldown" if any(k.cool_until > now + left for k in self.keys) else (
+                            "budget" if any(k.budget and k.used >= k.budget for k in self.keys) else "rate")
+                        metrics.inc("vibe_upstream_rejected_total", upstream=self.name, priority=priority,
+                                    reason=reason)
+                        raise too_many_requests(self.name, ready)
+                    if left <= 0:
+                        self._remove(ticket)
+                        metrics.inc("vibe_deadline_exceeded_total", stage=f"{self.name} quota")
+                        raise HTTPException(504, f"Deadline exceeded waiting for {self.name} quota")
+                    self._gauge(priority)
+                    self.cond.wait(min(left, ready or 0.05))    # 0: a higher class holds the keys
+            finally:
+                self._gauge(priority)
+        metrics.observe("vibe_upstream_queue_seconds", time.monotonic() - t0, upstream=self.name, priority=priority)
+        return ticket.lease
+
+    def cool(self, key: ApiKey, seconds: float):
+        with self.cond:
+            key.cool_until = max(key.cool_until, time.monotonic() + seconds)
+        metrics.inc("vibe_upstream_rate_limited_total", upstream=self.name, key=key.index)
+
+    def wake(self):
+        with self.cond:
+            self.cond.notify_all()
+
+
+def too_many_requests(upstream: str, retry_after_s: float) -> HTTPException:
+    secs = max(1, math.ceil(retry_after_s)) if math.isfinite(retry_after_s) else int(BUDGET_WINDOW_S)
+    return HTTPException(429, f"{upstream} quota exhausted, retry in {secs}s", headers={"Retry-After": str(secs)})
+
+
+def _parse_keys(name: str) -> List[ApiKey]:
+    env = name.upper()
+    rate = float(os.getenv(f"{env}_RPS", str(DEFAULT_RPS.get(name, 0))))
+    burst = float(os.getenv(f"{env}_BURST", str(DEFAULT_BURST)))
+    budget = int(os.getenv(f"{env}_KEY_BUDGET", "0"))
+    raw = os.getenv(f"{env}_API_KEYS") or os.getenv(f"{env}_API_KEY") or ""
+    keys = []
+    for item in filter(None, (s.strip() for s in raw.split(","))):
+        secret, sep, own = item.rpartition(":")
+        if not (sep and own.isdigit()):
+            secret, own = item, ""
+        keys.append(ApiKey(len(keys), secret, rate, burst, int(own) if own else budget))
+    return keys or [ApiKey(0, None, rate, burst, budget)]
+
+
+_lock = threading.Lock()
+_pools: Dict[str, tuple] = {}      # name -> (env signature, pool)
+
+
+def pool(upstream: str) -> UpstreamPool:
+    """The scheduler for one upstream; rebuilt when its key settings change in the environment."""
+    env = upstream.upper()
+    sig = tuple(os.getenv(f"{env}_{v}") for v in ("API_KEYS", "API_KEY", "RPS", "BURST", "KEY_BUDGET"))
+    with _lock:
+        cached = _pools.get(upstream)
+        if cached is None or cached[0] != sig:
+            cached = _pools[upstream] = (sig, UpstreamPool(upstream, _parse_keys(upstream)))
+        return cached[1]
+
+
+def keys(upstream: str) -> List[str]:
+    return [k.secret for k in pool(upstream).keys if k.secret]
+
+
+def acquire(upstream: str, deadline, wait: bool = True, pin: Optional[str] = None,
+            cancel: Optional[threading.Event] = None) -> Optional[Lease]:
+    return pool(upstream).acquire(deadline, wait, pin, cancel)
+
+
+async def acquire_async(upstream: str, deadline, pin: Optional[str] = None) -> Lease:
+    """acquire() for the event loop: free leases are taken inline, waits happen on a worker thread."""
+    lease = acquire(upstream, deadline, wait=False, pin=pin)
+    if lease is not None:
+        return lease
+    cancel = threading.Event()
+    try:
+        return await asyncio.to_thread(acquire, upstream, deadline, True, pin, cancel)
+    except asyncio.CancelledError:
+        cancel.set()
+        pool(upstream).wake()
+        raise
+
+
+def reset():
+    with _lock:
+        _pools.clear()
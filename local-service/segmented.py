@@ -0,0 +1,187 @@
+# segmented.py — parallel synthesis of long answers in sentence-aligned segments
+# One REST synthesis call takes time roughly proportional to the text, so a long answer is split at
+# sentence boundaries into segments of similar length, the segments are synthesized concurrently
+# (at most SEGMENT_WORKERS at a time; the quota scheduler still applies per call), and the PCM is
+# joined back in order. At each join the silence Murf leaves at the clip edges is cut down to a
+# natural sentence pause and the two sides are crossfaded, so there is no click or double gap.
+# The result is one 16-bit mono WAV whose header carries the real length. Every segment must come from
+# the same provider at the same sample rate; a mix (one segment failed over) is done in one call instead.
+# Opt-in: VIBE_SEGMENT_TTS=1, or "segment": true per request.
+import io
+import math
+import os
+import re
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from audio_post import SILENCE_DBFS, WINDOW_MS
+
+SEGMENT_TTS = os.getenv("VIBE_SEGMENT_TTS", "0") == "1"
+SEGMENT_MIN_CHARS = int(os.getenv("VIBE_SEGMENT_MIN_CHARS", "600"))    # shorter answers go in one call
+SEGMENT_CHARS = int(os.getenv("VIBE_SEGMENT_CHARS", "350"))            # target segment length
+SEGMENT_MAX = int(os.getenv("VIBE_SEGMENT_MAX", "8"))
+SEGMENT_WORKERS = int(os.getenv("VIBE_SEGMENT_WORKERS", "4"))
+CROSSFADE_MS = int(os.getenv("VIBE_SEGMENT_CROSSFADE_MS", "30"))
+JOIN_PAUSE_MS = int(os.getenv("VIBE_SEGMENT_PAUSE_MS", "250"))         # silence left between segments
+
+metrics.describe("vibe_tts_segmented_total", "One-shot answers synthesized in parallel segments")
+metrics.describe("vibe_tts_segments", "Segments per segmented answer")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…。！？])\s+|\n\s*\n")
+_CLAUSE_END = re.compile(r"(?<=[,;:])\s+")
+
+_pool = ThreadPoolExecutor(max_workers=SEGMENT_WORKERS, thread_name_prefix="vibe-segment")
+
+# synth(text) -> (audio bytes, mime); one segment, blocking
+Synth = Callable[[str], Tuple[bytes, str]]
+# source() -> who served the segment just synthesized on this thread (e.g. the provider name)
+Source = Callable[[], Any]
+
+
+def _pieces(text: str, limit: int) -> List[str]:
+    """Sentences; one longer than `limit` is broken at clause boundaries."""
+    out = []
+    for sentence in (s.strip() for s in _SENTENCE_END.split(text)):
+        if not sentence:
+            continue
+        if len(sentence) <= limit:
+            out.append(sentence)
+            continue
+        out.extend(c.strip() for c in _CLAUSE_END.split(sentence) if c.strip())
+    return out
+
+
+def split_segments(text: str, target: int = SEGMENT_CHARS, max_segments: int = SEGMENT_MAX) -> List[str]:
+    """
+    Sentence-aligned segments of balanced length: the number of segments comes from the total length,
+    and each cut is placed at the sentence boundary nearest to an equal share of the text.
+    """
+    pieces = _pieces(text, 2 * target)
+    total = sum(len(p) for p in pieces)
+    n = max(1, min(max_segments, len(pieces), round(total / target)))
+    share = total / n
+    segments: List[str] = []
+    current: List[str] = []
+    done = 0
+    for p in pieces:
+        boundary = (len(segments) + 1) * share
+        if current and len(segments) < n - 1 and abs(done + len(p) - boundary) > abs(done - boundary):
+            segments.append(" ".join(current))
+            current = []
+        current.append(p)
+        done += len(p)
+    if current:
+        segments.append(" ".join(current))
+    return segments
+
+
+def wanted(text: str, fmt: str, override: Optional[bool] = None) -> bool:
+    enabled = SEGMENT_TTS if override is None else override
+    return enabled and fmt == "wav" and len(text) >= SEGMENT_MIN_CHARS
+
+
+# ---- joining --------------------------------------------------------------------
+def _read_pcm(data: bytes, mime: str):
+    import numpy as np
+    if mime != "audio/wav":
+        raise ValueError(f"segment came back as {mime}, not WAV")
+    with wave.open(io.BytesIO(data)) as w:
+        if w.getsampwidth() != 2 or w.getnchannels() != 1:
+            raise ValueError("segment is not 16-bit mono")
+        return w.getframerate(), np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+
+
+def _edges(x, rate: int) -> Tuple[int, int]:
+    """First and one-past-last sample of the sound in x (by 10 ms window peaks); (0, 0) if all silent."""
+    import numpy as np
+    w = max(1, rate * WINDOW_MS // 1000)
+    full = len(x) // w * w
+    if not full:
+        return 0, len(x)
+    peaks = np.abs(x[:full].reshape(-1, w).astype(np.int32)).max(axis=1)
+    loud = np.flatnonzero(peaks >= int(32768 * 10 ** (SILENCE_DBFS / 20)))
+    if not len(loud):
+        return 0, 0
+    return loud[0] * w, min(len(x), (loud[-1] + 1) * w)
+
+
+def join_pcm(parts: List, rate: int, crossfade_ms: int = CROSSFADE_MS, pause_ms: int = JOIN_PAUSE_MS):
+    """
+    Concatenate int16 segments in order. Inside each join the edge silence is cut to pause_ms in total
+    (half from each side, never adding any), then the last crossfade_ms of one side and the first of the
+    next are mixed with an equal-power fade. The outer edges are left untouched.
+    """
+    import numpy as np
+    fade = rate * crossfade_ms // 1000
+    half_pause = rate * pause_ms // 2000
+    trimmed = []
+    for i, x in enumerate(parts):
+        start, end = _edges(x, rate)
+        if end == 0:
+            continue                                      # an all-silent segment adds nothing
+        lo = 0 if i == 0 else max(0, start - half_pause - fade // 2)
+        hi = len(x) if i == len(parts) - 1 else min(len(x), end + half_pause + fade // 2)
+        trimmed.append(x[lo:hi].astype(np.float64))
+    if not trimmed:
+        return np.zeros(0, np.int16)
+    out = trimmed[0]
+    t = np.linspace(0.0, math.pi / 2, fade) if fade else None
+    for x in trimmed[1:]:
+        n = min(fade, len(out), len(x))
+        if n:
+            ramp = t if n == fade else np.linspace(0.0, math.pi / 2, n)
+            mixed = out[len(out) - n:] * np.cos(ramp) + x[:n] * np.sin(ramp)
+            out = np.concatenate((out[:len(out) - n], mixed, x[n:]))
+        else:
+            out = np.concatenate((out, x))
+    return np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+
+
+def _wav(pcm, rate: int) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+def synthesize(text: str, synth: Synth, segments: Optional[List[str]] = None,
+               source: Optional[Source] = None) -> Tuple[bytes, Dict[str, float]]:
+    """
+    Synthesize `text` segment by segment in parallel and return (WAV bytes, stats).
+    Raises if a segment fails or is not 16-bit mono WAV, or if the segments differ in source() or
+    sample rate (a voice change mid-answer); the caller then falls back to one call.
+    """
+    segments = segments or split_segments(text)
+    t0 = time.monotonic()
+
+    def one(part: str):
+        started = time.monotonic()
+        data, mime = synth(part)
+        who = source() if source else None
+        return _read_pcm(data, mime), who, time.monotonic() - started
+
+    futures = [_pool.submit(one, s) for s in segments]
+    try:
+        results = [f.result() for f in futures]
+    finally:
+        for f in futures:
+            f.cancel()
+    voices = {(r, who) for (r, _), who, _ in results}
+    if len(voices) > 1:
+        raise ValueError(f"segments came from different voices: {sorted(voices, key=repr)}")
+    rate = results[0][0][0]
+    joined = join_pcm([x for (_, x), _, _ in results], rate)
+    metrics.inc("vibe_tts_segmented_total")
+    metrics.observe("vibe_tts_segments", len(segments))
+    return _wav(joined, rate), {
+        "segments": len(segments),
+        "longest_segment_s": round(max(dt for _, _, dt in results), 3),
+        "seconds": round(time.monotonic() - t0, 3),
+        "audio_s": round(len(joined) / rate, 3),
+    }
@@ -0,0 +1,177 @@
+# serve.py — run the service on TCP and a Unix domain socket at the same time
+#   python serve.py                      # 127.0.0.1:8001 and $XDG_RUNTIME_DIR/vibe/8001.sock
+#   VIBE_TCP=0 python serve.py           # Unix socket only: no port open on a shared dev box
+#   python serve.py some_module:app      # any ASGI app (the transport benchmark uses this)
+#   python serve.py --workers 4          # 4 processes sharing the listeners and an on-disk cache
+# Local CLIs derive the socket path from their service URL's port (cli-node/cli/service_socket.py)
+# and use TCP when it is not there. The socket is created 0600 in a 0700 per-user directory, so other
+# users on the box cannot connect to it; a directory someone else owns (say /tmp/vibe-<uid> created first
+# by another user) is refused, and the CLIs likewise only trust a socket of their own user's.
+# `uvicorn app:app` still works and serves TCP only.
+# With --workers N (VIBE_WORKERS) the sockets are bound once here and handed to N worker processes, each
+# one warmed up before it accepts (VIBE_WARMUP=block) and sharing answers/audio through shared_cache.py.
+# On SIGTERM every worker stops accepting and drains its WebSocket connections (lifecycle.py) before it
+# exits; a worker that dies is started again.
+import multiprocessing
+import os
+import signal
+import socket
+import stat
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+HOST = os.getenv("VIBE_HOST", "127.0.0.1")
+PORT = int(os.getenv("VIBE_PORT", "8001"))
+TCP = os.getenv("VIBE_TCP", "1") != "0"
+BACKLOG = int(os.getenv("VIBE_BACKLOG", "2048"))
+WORKERS = int(os.getenv("VIBE_WORKERS", "1"))
+
+
+def socket_path(port: int = PORT) -> Optional[str]:
+    """Same naming as the CLIs' service_socket.socket_path; None when the Unix socket is turned off."""
+    value = os.getenv("VIBE_UDS")
+    if not hasattr(socket, "AF_UNIX") or (value is not None and value.strip().lower() in ("", "0", "off")):
+        return None
+    if value:
+        return value
+    return os.path.join(default_folder(), f"{port}.sock")
+
+
+def default_folder() -> str:
+    runtime = os.getenv("XDG_RUNTIME_DIR")
+    return os.path.join(runtime, "vibe") if runtime else os.path.join(tempfile.gettempdir(), f"vibe-{os.getuid()}")
+
+
+def _own_folder(folder: str):
+    """The socket's directory must be ours and writable only by us (our own default one is fixed up)."""
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    st = os.lstat(folder)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        raise SystemExit(f"{folder} is not a directory owned by you; not listening there")
+    if st.st_mode & 0o022:
+        if os.path.abspath(folder) != os.path.abspath(default_folder()):
+            raise SystemExit(f"{folder} is writable by other users; not listening there")
+        os.chmod(folder, 0o700)
+
+
+def bind_unix(path: str) -> socket.socket:
+    _own_folder(os.path.dirname(path) or ".")
+    if os.path.lexists(path):
+        st = os.lstat(path)
+        if not stat.S_ISSOCK(st.st_mode):
+            raise SystemExit(f"{path} exists and is not a socket")
+        if st.st_uid != os.getuid():
+            os.unlink(path)                          # not ours, in our own directory: never talk to it
+        else:
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.unlink(path)                      # left behind by a service that did not exit cleanly
+            else:
+                raise SystemExit(f"another service is already listening on {path}")
+            finally:
+                probe.close()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(umask)
+    return sock
+
+
+def bind_tcp(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def _server(config):
+    import uvicorn
+
+    class DrainingServer(uvicorn.Server):
+        """Closes the listeners, lets live WebSocket turns finish, then shuts down as usual."""
+
+        async def shutdown(self, sockets=None):
+            import lifecycle
+            for server in self.servers:
+                server.close()
+            left = await lifecycle.drain(lifecycle.DRAIN_S)
+            if left:
+                lifecycle.log.warning("%d WebSocket connection(s) still busy after %.0fs", left, lifecycle.DRAIN_S)
+            await super().shutdown(sockets)
+
+    return DrainingServer(config)
+
+
+def _worker(config, sockets: List[socket.socket]):
+    config.configure_logging()                            # a spawned process starts with no handlers
+    _server(config).run(sockets=sockets)
+
+
+def supervise(config, sockets: List[socket.socket], workers: int):
+    """Run `workers` processes on the same listeners; forward SIGTERM/SIGINT and restart crashed ones."""
+    ctx = multiprocessing.get_context("spawn")
+    stopping = False
+
+    def spawn():
+        proc = ctx.Process(target=_worker, args=(config, sockets))
+        proc.start()
+        return proc
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for proc in procs:
+            if proc.is_alive():
+                os.kill(proc.pid, signal.SIGTERM)
+
+    procs = [spawn() for _ in range(workers)]
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while not stopping:
+        for i, proc in enumerate(procs):
+            if not proc.is_alive() and not stopping:
+                print(f"worker {proc.pid} exited with {proc.exitcode}; starting another", file=sys.stderr)
+                procs[i] = spawn()
+        time.sleep(0.5)
+    for proc in procs:
+        proc.join()
+
+
+def main(argv: Optional[List[str]] = None):
+    import uvicorn
+    args = list(sys.argv[1:] if argv is None else argv)
+    workers = WORKERS
+    if "--workers" in args:
+        i = args.index("--workers")
+        workers = int(args[i + 1])
+        del args[i:i + 2]
+    target = args[0] if args else "app:app"
+    if workers > 1:
+        os.environ.setdefault("VIBE_CACHE", "1")          # workers share answers and audio on disk
+        os.environ.setdefault("VIBE_WARMUP", "block")     # a worker accepts once it is warm
+    path = socket_path()
+    sockets = [bind_tcp(HOST, PORT)] if TCP else []
+    if path:
+        sockets.append(bind_unix(path))
+    if not sockets:
+        raise SystemExit("nothing to listen on: set VIBE_TCP=1 or VIBE_UDS")
+    config = uvicorn.Config(target, backlog=BACKLOG, log_level=os.getenv("VIBE_LOG_LEVEL", "info"))
+    try:
+        if workers > 1:
+            supervise(config, sockets, workers)
+        else:
+            _server(config).run(sockets=sockets)
+    finally:
+        if path and os.path.exists(path):
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
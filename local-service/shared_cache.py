@@ -0,0 +1,173 @@
+# shared_cache.py — answer and audio cache shared by every worker process on the host
+# An SQLite database in WAL mode indexes the entries (key, kind, metadata, blob, size, last use) and
+# counts hits and misses; audio sits next to it in content-addressed blob files that are read back
+# through mmap, so N workers share one copy in the page cache instead of holding N private ones.
+# In WAL mode readers never wait for the writer, and because the counters live in the database
+# the hit rate is the host's whichever worker answered. Least recently used entries are dropped
+# past VIBE_CACHE_MAX_MB. Off unless VIBE_CACHE=1 (`serve.py --workers N` turns it on).
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Union
+
+import metrics
+
+ENABLED = os.getenv("VIBE_CACHE", "0") == "1"
+CACHE_DIR = Path(os.getenv("VIBE_CACHE_DIR") or Path(__file__).parent / "_cache")
+MAX_BYTES = int(float(os.getenv("VIBE_CACHE_MAX_MB", "512")) * 1024 * 1024)
+TOUCH_S = 60            # a hit rewrites the entry's last-use time at most this often
+
+metrics.describe("vibe_cache_hit_rate", "Shared cache hit rate across all workers, by kind (answer, tts)")
+metrics.describe("vibe_cache_entries", "Entries in the shared cache")
+metrics.describe("vibe_cache_bytes", "Audio bytes held by the shared cache")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    meta TEXT NOT NULL,
+    blob TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries(used);
+CREATE TABLE IF NOT EXISTS counters (
+    kind TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (kind, outcome)
+);
+"""
+
+Audio = Union[bytes, mmap.mmap]
+
+
+class Hit(NamedTuple):
+    meta: Dict[str, Any]
+    audio: Optional[Audio]      # read-only mmap of the blob (bytes-like: base64, BytesIO and len() work)
+
+
+def make_key(kind: str, *parts: Any) -> str:
+    return hashlib.sha256(json.dumps([kind, *parts], ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SharedCache:
+    def __init__(self, folder: Union[str, Path] = CACHE_DIR, max_bytes: int = MAX_BYTES):
+        self.folder = Path(folder)
+        self.blobs = self.folder / "blobs"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.path = self.folder / "cache.db"
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._db()
+
+    def _db(self) -> sqlite3.Connection:
+        """One connection per thread; autocommit, so every statement is its own short transaction."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, kind: str, outcome: str):
+        self._db().execute("INSERT INTO counters VALUES (?, ?, 1) "
+                           "ON CONFLICT(kind, outcome) DO UPDATE SET n = n + 1", (kind, outcome))
+
+    def _map(self, blob: str) -> Optional[Audio]:
+        try:
+            with open(self.blobs / blob, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b""
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            return None
+
+    def get(self, kind: str, key: str) -> Optional[Hit]:
+        db = self._db()
+        row = db.execute("SELECT meta, blob, used FROM entries WHERE key = ?", (key,)).fetchone()
+        audio = None
+        if row is not None and row[1]:
+            audio = self._map(row[1])
+            if audio is None:                       # blob evicted by another worker meanwhile
+                row = None
+        if row is None:
+            self._count(kind, "miss")
+            return None
+        now = time.time()
+        if now - row[2] > TOUCH_S:
+            db.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+        self._count(kind, "hit")
+        return Hit(json.loads(row[0]), audio)
+
+    def put(self, kind: str, key: str, meta: Dict[str, Any], audio: Optional[bytes] = None):
+        blob = None
+        size = 0
+        if audio is not None:
+            blob = hashlib.sha256(audio).hexdigest()
+            size = len(audio)
+            path = self.blobs / blob
+            if not path.exists():
+                tmp = path.with_name(f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp")
+                with open(tmp, "wb") as f:
+                    f.write(audio)
+                os.replace(tmp, path)
+        now = time.time()
+        self._db().execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (key, kind, json.dumps(meta, ensure_ascii=False), blob, size, now, now))
+        self._evict()
+
+    def _evict(self):
+        db = self._db()
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        dropped = []
+        for key, blob, size in db.execute("SELECT key, blob, size FROM entries ORDER BY used").fetchall():
+            if total <= target:
+                break
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if blob:
+                dropped.append(blob)
+        for blob in set(dropped):
+            if db.execute("SELECT 1 FROM entries WHERE blob = ? LIMIT 1", (blob,)).fetchone() is None:
+                try:
+                    os.unlink(self.blobs / blob)     # workers that still map it keep their view
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        db = self._db()
+        out: Dict[str, Any] = {}
+        for kind, outcome, n in db.execute("SELECT kind, outcome, n FROM counters"):
+            out.setdefault(kind, {"hit": 0, "miss": 0})[outcome] = n
+        for counts in out.values():
+            looked = counts["hit"] + counts["miss"]
+            counts["hit_rate"] = round(counts["hit"] / looked, 4) if looked else 0.0
+        entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"kinds": out, "entries": entries, "bytes": size}
+
+
+_cache: Optional[SharedCache] = None
+_lock = threading.Lock()
+
+
+def get_cache() -> Optional[SharedCache]:
+    """The host-wide cache, or None when VIBE_CACHE is off."""
+    global _cache
+    if not ENABLED:
+        return None
+    with _lock:
+        if _cache is None:
+            _cache = SharedCache()
+        return _cache
@@ -0,0 +1,140 @@
+# speech_text.py — turn Gemini / git / issue text into what should actually be spoken
+# Markdown syntax is dropped, code blocks become a one-line summary (the transcript keeps the
+# original), identifiers are read as words (abbreviations like "e.g." are left alone), "*" between
+# operands is read as "times", whitespace is collapsed. Pure regex, so the same input and locale
+# always give the same output. VIBE_SPEECH_NORMALIZE=0 turns it off.
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+import metrics
+
+ENABLED = os.getenv("VIBE_SPEECH_NORMALIZE", "1") != "0"
+
+metrics.describe("vibe_speech_chars_total", "Characters before (in) and after (out) speech normalization")
+
+# Per base language; anything missing falls back to English
+RULES: Dict[str, Dict[str, str]] = {
+    "en": {"dot": "dot", "and": "and", "percent": "percent", "times": "times", "link": "a link",
+           "code": "a {lang} code sample", "code_defs": "a {lang} code sample defining {names}",
+           "code_tail": ", shown in the transcript."},
+    "es": {"dot": "punto", "and": "y", "percent": "por ciento", "times": "por", "link": "un enlace",
+           "code": "un ejemplo de código {lang}", "code_defs": "un ejemplo de código {lang} que define {names}",
+           "code_tail": ", visible en la transcripción."},
+    "fr": {"dot": "point", "and": "et", "percent": "pour cent", "times": "fois", "link": "un lien",
+           "code": "un exemple de code {lang}", "code_defs": "un exemple de code {lang} qui définit {names}",
+           "code_tail": ", visible dans la transcription."},
+    "de": {"dot": "Punkt", "and": "und", "percent": "Prozent", "times": "mal", "link": "ein Link",
+           "code": "ein {lang}-Codebeispiel", "code_defs": "ein {lang}-Codebeispiel, das {names} definiert",
+           "code_tail": ", siehe Transkript."},
+    "it": {"dot": "punto", "and": "e", "percent": "per cento", "times": "per", "link": "un link",
+           "code": "un esempio di codice {lang}", "code_defs": "un esempio di codice {lang} che definisce {names}",
+           "code_tail": ", visibile nella trascrizione."},
+    "pt": {"dot": "ponto", "and": "e", "percent": "por cento", "times": "vezes", "link": "um link",
+           "code": "um exemplo de código {lang}", "code_defs": "um exemplo de código {lang} que define {names}",
+           "code_tail": ", visível na transcrição."},
+    "hi": {"dot": "डॉट", "and": "और", "percent": "प्रतिशत", "times": "गुणा", "link": "एक लिंक",
+           "code": "एक {lang} कोड उदाहरण", "code_defs": "{names} वाला एक {lang} कोड उदाहरण",
+           "code_tail": ", जो ट्रांसक्रिप्ट में है।"},
+}
+
+_FENCE = re.compile(r"```[ \t]*([\w+#.-]*)[^\n]*\n(.*?)(?:```|\Z)", re.S)
+_DEF = re.compile(r"^\s*(?:async\s+)?(?:def|class|function|func|fn|interface|struct)\s+([A-Za-z_]\w*)", re.M)
+_LINK = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+_URL = re.compile(r"\b(?:https?://|www\.)\S+?(?=[.,;:!?)]?(?:\s|$))")
+_HTML = re.compile(r"</?[A-Za-z][^>]*>")
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+", re.M)
+_BULLET = re.compile(r"^\s*(?:[-*+•]|\d{1,3}[.)])\s+", re.M)
+_QUOTE = re.compile(r"^\s*>+\s?", re.M)
+_RULE = re.compile(r"^\s*(?:[-*_=]\s*){3,}$", re.M)
+_TABLE_SEP = re.compile(r"^\s*\|?[\s:|-]+\|[\s:|-]*$", re.M)
+_EMPH = re.compile(r"(\*\*|__|~~)(.+?)\1|(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?!\w)|(?<![\w_])_(?!\s)(.+?)(?<!\s)_(?![\w_])")
+_INLINE_CODE = re.compile(r"`+([^`]+)`+")
+_IDENT = re.compile(r"\b[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*\b")
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+_ARROWS = re.compile(r"\s*(?:->|=>|<-|→|←)\s*")
+_TIMES = re.compile(r"(?<=[\w)])\s*\*\s*(?=[\w(])")          # 5*3, width * height (emphasis is gone by then)
+_SYMBOLS = re.compile(r"[*#`~\\]+|(?<!\w)\^|\^(?!\w)")       # markup leftovers; 2^10 keeps its caret
+
+
+def rules_for(language: Optional[str]) -> Dict[str, str]:
+    base = (language or "en").strip().lower().split("-")[0]
+    return {**RULES["en"], **RULES.get(base, {})}
+
+
+def _summarize_code(m: "re.Match", r: Dict[str, str]) -> str:
+    lang = m.group(1).lower() or ""
+    names = list(dict.fromkeys(_DEF.findall(m.group(2))))[:3]
+    if names:
+        said = f" {r['and']} ".join([", ".join(names[:-1]), names[-1]]) if len(names) > 1 else names[0]
+        text = r["code_defs"].format(lang=lang, names=said)
+    else:
+        text = r["code"].format(lang=lang)
+    if not lang:
+        text = text.replace(" -", " ")
+    text = re.sub(r"\s+", " ", text).strip()
+    return "\n" + text[:1].upper() + text[1:] + r["code_tail"] + "\n"
+
+
+def _say_identifier(m: "re.Match", r: Dict[str, str]) -> str:
+    word = m.group(0)
+    if "_" not in word and "." not in word and not _CAMEL.search(word):
+        return word
+    if "." in word and any(len(part) == 1 for part in word.split(".")):
+        return word         # e.g., i.e., U.S. — an abbreviation, not a dotted name
+    out = []
+    for part in word.split("."):
+        words = [w for chunk in part.split("_") for w in _CAMEL.split(chunk) if w]
+        out.append(" ".join(w if w.isupper() else w.lower() for w in words))
+    return f" {r['dot']} ".join(p for p in out if p)
+
+
+def normalize(text: str, language: Optional[str] = None) -> str:
+    """Speakable version of text for the given locale."""
+    r = rules_for(language)
+    s = text.replace("\r\n", "\n")
+    s = _FENCE.sub(lambda m: _summarize_code(m, r), s)
+    s = _LINK.sub(r"\1", s)
+    s = _URL.sub(r["link"], s)
+    s = _HTML.sub(" ", s)
+    s = _TABLE_SEP.sub("", s)
+    s = _RULE.sub("", s)
+    s = _HEADING.sub("", s)
+    s = _QUOTE.sub("", s)
+    s = _BULLET.sub("", s)
+    s = _INLINE_CODE.sub(r"\1", s)
+    for _ in range(2):      # nested **_x_**
+        s = _EMPH.sub(lambda m: next(g for g in m.groups()[1:] if g is not None), s)
+    s = s.replace("|", ", ")
+    s = _ARROWS.sub(", ", s)
+    s = s.replace("&", f" {r['and']} ").replace("%", f" {r['percent']}")
+    s = _TIMES.sub(f" {r['times']} ", s)
+    s = _IDENT.sub(lambda m: _say_identifier(m, r), s)
+    s = _SYMBOLS.sub(" ", s)
+
+    # one line per list item / paragraph -> sentences
+    lines = [re.sub(r"[ \t]+", " ", ln).strip(" ,") for ln in s.split("\n")]
+    out = []
+    for ln in lines:
+        if not ln:
+            continue
+        if not re.search(r"[.!?:;।。？！]$", ln):
+            ln += "."
+        out.append(ln)
+    s = " ".join(out)
+    s = re.sub(r"\s+([,.!?;:])", r"\1", s)
+    s = re.sub(r"([,.!?;:])\1+", r"\1", s)
+    return re.sub(r"\s{2,}", " ", s).strip()
+
+
+def prepare_speech(text: str, language: Optional[str] = None,
+                   enabled: Optional[bool] = None) -> Tuple[str, Dict[str, int]]:
+    """(text to synthesize, {"in": chars, "out": chars}). enabled=None follows VIBE_SPEECH_NORMALIZE."""
+    on = ENABLED if enabled is None else enabled
+    spoken = normalize(text, language) if on else text
+    if on and not spoken:
+        spoken = text
+    stats = {"in": len(text), "out": len(spoken)}
+    metrics.inc("vibe_speech_chars_total", stats["in"], stage="in")
+    metrics.inc("vibe_speech_chars_total", stats["out"], stage="out")
+    return spoken, stats
@@ -0,0 +1,99 @@
+# transport_codec.py — compact audio encodings for /ws/stream frames (server side)
+#   pcm    16-bit (or 8-bit unsigned with sample_width 1) little-endian PCM, as before
+#   mulaw  G.711 mu-law, 8 bits per sample
+#   adpcm  IMA ADPCM, 4 bits per sample; every frame is a self-contained block:
+#          <int16 first sample><uint8 step index><uint8 flags: 1 = last nibble is padding>
+#          followed by two samples per byte, low nibble first
+# Pure Python/NumPy, no native codecs. The matching decoders live in cli-node/cli/audio_codec.py.
+# ADPCM is sequential (each code depends on the previous prediction), so it stays a Python loop;
+# app.py calls the encoders on a worker thread, never on the event loop.
+import struct
+from array import array
+
+CODECS = ("pcm", "mulaw", "adpcm")
+
+_MU_BIAS = 0x84
+_MU_CLIP = 32635
+
+IMA_STEPS = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230, 253, 279, 307,
+    337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066,
+    2272, 2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487, 12635, 13899,
+    15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767)
+IMA_INDEX = (-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8)
+
+
+def encode_mulaw(pcm: bytes) -> bytes:
+    import numpy as np
+    x = np.frombuffer(pcm, dtype=np.int16).astype(np.int32)
+    sign = np.where(x < 0, 0x80, 0)
+    mag = np.minimum(np.abs(x), _MU_CLIP) + _MU_BIAS
+    exponent = np.floor(np.log2(mag)).astype(np.int32) - 7
+    mantissa = (mag >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8).tobytes()
+
+
+def encode_pcm8(pcm: bytes) -> bytes:
+    import numpy as np
+    x = np.frombuffer(pcm, dtype=np.int16)
+    return ((x >> 8) + 128).astype(np.uint8).tobytes()
+
+
+def encode_adpcm(pcm: bytes) -> bytes:
+    samples = array("h")
+    samples.frombytes(pcm)
+    if not samples:
+        return b""
+    pred, index = samples[0], 0
+    # start the step size near the signal level so the first few ms don't smear
+    level = max(abs(s) for s in samples[:64]) // 4
+    while index < 88 and IMA_STEPS[index] < level:
+        index += 1
+    out = bytearray(struct.pack("<hBB", pred, index, (len(samples) - 1) % 2))
+    steps, adjust = IMA_STEPS, IMA_INDEX
+    nibble_lo = None
+    for s in samples[1:]:
+        step = steps[index]
+        diff = s - pred
+        code = 0
+        if diff < 0:
+            code = 8
+            diff = -diff
+        vpdiff = step >> 3
+        if diff >= step:
+            code |= 4
+            diff -= step
+            vpdiff += step
+        step >>= 1
+        if diff >= step:
+            code |= 2
+            diff -= step
+            vpdiff += step
+        step >>= 1
+        if diff >= step:
+            code |= 1
+            vpdiff += step
+        pred = pred - vpdiff if code & 8 else pred + vpdiff
+        pred = -32768 if pred < -32768 else 32767 if pred > 32767 else pred
+        index += adjust[code]
+        index = 0 if index < 0 else 88 if index > 88 else index
+        if nibble_lo is None:
+            nibble_lo = code
+        else:
+            out.append(nibble_lo | (code << 4))
+            nibble_lo = None
+    if nibble_lo is not None:
+        out.append(nibble_lo)
+    return bytes(out)
+
+
+def encoder(codec: str, sample_width: int = 2):
+    """bytes of 16-bit PCM -> bytes on the wire, or None when frames go out as 16-bit PCM unchanged."""
+    if codec == "mulaw":
+        return encode_mulaw
+    if codec == "adpcm":
+        return encode_adpcm
+    if sample_width == 1:
+        return encode_pcm8
+    return None
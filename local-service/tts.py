@@ -1,71 +1,491 @@
 # local-service/tts.py
-import os, base64
+import os, base64, threading, time, importlib.util
 from io import BytesIO
-from typing import Optional, Tuple
+from typing import Callable, List, Optional, Tuple
+
+import metrics
+import quota
 
 # --- Base interface -----------------------------------------------------------
 class TTSProvider:
     name = "base"
-    def speak(self, text: str, lang: Optional[str], fmt: str) -> Tuple[bytes, str]:
+    formats: Tuple[str, ...] = ("wav", "mp3")
+    takes_voice_id = False      # True if a client-chosen voice_id selects the voice
+
+
+    def supports(self, lang: Optional[str], fmt: str) -> bool:
+        return (fmt or "wav").lower() in self.formats
+
+    # voice_id / style / deadline are hints; providers that can't use them ignore them
+    def speak(self, text: str, lang: Optional[str], fmt: str, voice_id: Optional[str] = None,
+              style: Optional[str] = None, deadline=None) -> Tuple[bytes, str]:
         raise NotImplementedError
 
 # --- Offline, WAV (best for Windows + direct playback) ------------------------
+# pyttsx3 runs in long-lived worker processes: each keeps one initialized engine, a locale -> voice
+# map built once, and one reused output file on a RAM-backed path. Requests go over a shared queue
+# (so throughput scales with PYTTSX3_WORKERS) and come back as bytes.
+PYTTSX3_WORKERS = int(os.getenv("PYTTSX3_WORKERS", "2"))
+PYTTSX3_TIMEOUT_S = float(os.getenv("PYTTSX3_TIMEOUT_S", "60"))
+
+def _ram_dir() -> str:
+    import tempfile
+    d = os.getenv("PYTTSX3_TMPDIR")
+    if d:
+        return d
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+def _voice_map(engine) -> dict:
+    """'en-us' and 'en' -> voice id; the first voice listing a language wins."""
+    out = {}
+    for v in engine.getProperty("voices") or []:
+        for L in getattr(v, "languages", None) or []:
+            try:
+                code = L.decode(errors="ignore") if isinstance(L, bytes) else str(L)
+            except Exception:
+                continue
+            code = "".join(c for c in code if c.isprintable()).strip().lower().replace("_", "-")
+            if code:
+                out.setdefault(code, v.id)
+                out.setdefault(code.split("-")[0], v.id)
+    return out
+
+def _pyttsx3_worker(jobs, results, busy, wid: int):
+    """Worker process: serve (job_id, text, lang) from `jobs` until a None arrives; busy[wid] = current job."""
+    import pyttsx3
+    try:
+        engine = pyttsx3.init()
+        voices = _voice_map(engine)
+        default_voice = engine.getProperty("voice")
+    except Exception as e:
+        results.put((None, wid, None, f"pyttsx3 init failed: {e}"))
+        return
+    out_path = os.path.join(_ram_dir(), f"vibe-pyttsx3-{os.getpid()}.wav")
+    results.put((None, wid, b"", None))     # ready
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            job_id, text, lang = job
+            busy[wid] = job_id          # shared memory, not the queue: still readable if this process dies
+            try:
+                code = (lang or "").lower().replace("_", "-")
+                engine.setProperty("voice", voices.get(code) or voices.get(code.split("-")[0]) or default_voice)
+                engine.save_to_file(text, out_path)
+                engine.runAndWait()
+                with open(out_path, "rb") as f:
+                    results.put((job_id, wid, f.read(), None))
+            except Exception as e:
+                results.put((job_id, wid, None, str(e)))
+            busy[wid] = 0
+    finally:
+        try: os.remove(out_path)
+        except Exception: pass
+
 class Pyttsx3TTS(TTSProvider):
+    """
+    A worker that crashes mid-job fails that job straight away and is started again. A worker whose
+    engine cannot initialize is not: once no worker has come up, every request fails at once and
+    supports() turns False, so the router stops offering this provider.
+    """
     name = "pyttsx3"
-    def speak(self, text: str, lang: Optional[str], fmt: str) -> Tuple[bytes, str]:
-        import pyttsx3, tempfile, os
-        engine = pyttsx3.init()
-        # Try to pick a voice matching language
-        if lang:
+    formats = ("wav",)
+
+    def __init__(self, workers: int = PYTTSX3_WORKERS):
+        self.workers = max(1, workers)
+        self._procs = {}
+        self._jobs = None
+        self._results = None
+        self._pending = {}
+        self._busy = None           # shared array: worker id -> job id it is synthesizing (0: idle)
+        self._ready = set()         # workers whose engine initialized (only these are respawned)
+        self._init_error = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._reader = None
+
+    @property
+    def broken(self) -> Optional[str]:
+        """The init error once no worker could start its engine, else None."""
+        return self._init_error if self._init_error and not self._ready else None
+
+    def supports(self, lang: Optional[str], fmt: str) -> bool:
+        return (super().supports(lang, fmt) and self.broken is None
+                and importlib.util.find_spec("pyttsx3") is not None)
+
+    # ---- pool -------------------------------------------------------------------
+    def _spawn(self, wid: int):
+        p = self._ctx.Process(target=_pyttsx3_worker, args=(self._jobs, self._results, self._busy, wid),
+                              name=f"vibe-pyttsx3-{wid}", daemon=True)
+        p.start()
+        self._procs[wid] = p
+
+    def start(self):
+        """Start the worker processes (done lazily by the first request)."""
+        import multiprocessing as mp
+        with self._lock:
+            if self._reader is not None:
+                return
+            # spawn: each worker gets a fresh interpreter (pyttsx3 drivers don't survive fork)
+            self._ctx = mp.get_context("spawn")
+            self._jobs = self._ctx.Queue()
+            self._results = self._ctx.Queue()
+            self._busy = self._ctx.Array("q", self.workers, lock=False)
+            self._ready, self._init_error = set(), None
+            for wid in range(self.workers):
+                self._spawn(wid)
+            self._reader = threading.Thread(target=self._read_results, args=(self._results,),
+                                            name="vibe-pyttsx3-results", daemon=True)
+            self._reader.start()
+
+    def _fail(self, job_ids, message: str):
+        with self._lock:
+            futs = [self._pending.pop(j, None) for j in job_ids]
+        for fut in futs:
+            if fut is not None and not fut.done():
+                fut.set_exception(RuntimeError(message))
+
+    def _read_results(self, results):
+        import queue
+        checked = time.monotonic()
+        while self._results is results:        # close() swaps the queue out
+            if time.monotonic() - checked >= 1.0:
+                self._respawn_dead()
+                checked = time.monotonic()
             try:
-                for v in engine.getProperty("voices"):
-                    langs = []
-                    for L in getattr(v, "languages", []):
-                        try:
-                            langs.append(L.decode(errors="ignore"))
-                        except Exception:
-                            langs.append(str(L))
-                    if any(lang.lower() in (L or "").lower() for L in langs):
-                        engine.setProperty("voice", v.id)
-                        break
-            except Exception:
-                pass
+                job_id, wid, data, err = results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError, ValueError):
+                return
+            if job_id is None:
+                if err:
+                    self._init_error = err
+                    if self.broken:
+                        self._fail(list(self._pending), err)
+                else:
+                    self._ready.add(wid)
+                continue
+            with self._lock:
+                fut = self._pending.pop(job_id, None)
+            if fut is None or fut.done():
+                continue
+            if err:
+                fut.set_exception(RuntimeError(f"pyttsx3: {err}"))
+            else:
+                fut.set_result(data)
+
+    def _respawn_dead(self):
+        with self._lock:
+            dead = [wid for wid, p in self._procs.items() if self._jobs is not None and not p.is_alive()]
+            lost = [self._busy[wid] for wid in dead if self._busy[wid]]
+            for wid in dead:
+                self._busy[wid] = 0
+                if wid in self._ready:
+                    self._spawn(wid)
+                else:
+                    del self._procs[wid]        # never initialized: starting it again fails the same way
+        self._fail(lost, "pyttsx3 worker exited mid-synthesis")
+
+    def submit(self, text: str, lang: Optional[str]):
+        """Queue a synthesis job; returns a concurrent.futures.Future of the WAV bytes."""
+        from concurrent.futures import Future
+        self.start()
+        fut: Future = Future()
+        if self.broken:
+            fut.set_exception(RuntimeError(self.broken))
+            fut.job_id = None
+            return fut
+        with self._lock:
+            self._next_id += 1
+            job_id = self._next_id
+            self._pending[job_id] = fut
+        fut.job_id = job_id
+        self._jobs.put((job_id, text, lang))
+        return fut
+
+    async def speak_async(self, text: str, lang: Optional[str]) -> Tuple[bytes, str]:
+        import asyncio
+        return await asyncio.wrap_future(self.submit(text, lang)), "audio/wav"
 
-        tmp = tempfile.mktemp(suffix=".wav")
+    def speak(self, text: str, lang: Optional[str], fmt: str, voice_id: Optional[str] = None,
+              style: Optional[str] = None, deadline=None) -> Tuple[bytes, str]:
+        from concurrent.futures import TimeoutError as FutureTimeout
+        timeout = deadline.timeout("pyttsx3") if deadline is not None else PYTTSX3_TIMEOUT_S
+        fut = self.submit(text, lang)
         try:
-            engine.save_to_file(text, tmp)
-            engine.runAndWait()
-            data = open(tmp, "rb").read()
-            return data, "audio/wav"
-        finally:
-            try: os.remove(tmp)
-            except Exception: pass
+            return fut.result(timeout=timeout), "audio/wav"
+        except FutureTimeout:
+            with self._lock:
+                self._pending.pop(fut.job_id, None)
+            raise RuntimeError(f"pyttsx3 did not answer within {timeout:.1f}s")
+
+    def close(self):
+        with self._lock:
+            procs, self._procs = self._procs, {}
+            jobs, self._jobs = self._jobs, None
+            self._results = None
+            self._reader = None          # a later start() brings up a new pool
+        self._fail(list(self._pending), "pyttsx3 pool closed")
+        if jobs is None:
+            return
+        for _ in procs:
+            jobs.put(None)
+        for p in procs.values():
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
 
 # --- Online, MP3 (quick fallback) --------------------------------------------
 class GTtsTTS(TTSProvider):
     name = "gtts"
-    def speak(self, text: str, lang: Optional[str], fmt: str) -> Tuple[bytes, str]:
+    formats = ("mp3",)
+
+    @staticmethod
+    def _lang(lang: Optional[str]) -> Optional[str]:
+        # gTTS wants "en" / "zh-CN"-style codes; try the full locale, then the base language
+        if not lang:
+            return None
+        from gtts.lang import tts_langs
+        known = {k.lower(): k for k in tts_langs()}
+        return known.get(lang.lower()) or known.get(lang.split("-")[0].lower())
+
+    def supports(self, lang: Optional[str], fmt: str) -> bool:
+        if not super().supports(lang, fmt) or importlib.util.find_spec("gtts") is None:
+            return False
+        return not lang or self._lang(lang) is not None
+
+    def speak(self, text: str, lang: Optional[str], fmt: str, voice_id: Optional[str] = None,
+              style: Optional[str] = None, deadline=None) -> Tuple[bytes, str]:
         from gtts import gTTS
         buf = BytesIO()
         kwargs = {"text": text}
-        if lang: kwargs["lang"] = lang
+        if lang: kwargs["lang"] = self._lang(lang) or lang
         gTTS(**kwargs).write_to_fp(buf)
         return buf.getvalue(), "audio/mpeg"
 
-# --- Murf stub (fill in later) -----------------------------------------------
+# --- Murf ---------------------------------------------------------------------
 class MurfTTS(TTSProvider):
     name = "murf"
+    takes_voice_id = True
     """
-    Placeholder – you’ll wire this to **Murf’s REST/WebSocket**.
-    The method should return (audio_bytes, mime) just like the others.
+    Murf REST. The call itself lives in app.py (`murf_generate`, which also picks the voice);
+    it is passed in as `generate(text, lang, voice_id, fmt, style, deadline) -> (b64, mime)`.
     """
-    def speak(self, text: str, lang: Optional[str], fmt: str) -> Tuple[bytes, str]:
-        api_key = os.getenv("MURF_API_KEY")
-        if not api_key:
+    def __init__(self, generate: Optional[Callable] = None):
+        self.generate = generate
+
+    def supports(self, lang: Optional[str], fmt: str) -> bool:
+        return super().supports(lang, fmt) and bool(quota.keys("murf"))
+
+    def speak(self, text: str, lang: Optional[str], fmt: str, voice_id: Optional[str] = None,
+              style: Optional[str] = None, deadline=None) -> Tuple[bytes, str]:
+        if not quota.keys("murf"):
             raise RuntimeError("MURF_API_KEY not set")
-        # TODO: Implement Murf REST or WS call here; respect `lang` and `fmt`.
-        # For tomorrow’s demo, keep Pyttsx3 (WAV) as default and swap to Murf after.
-        raise NotImplementedError("Murf provider not implemented yet.")
+        if self.generate is None:
+            raise NotImplementedError("Murf provider needs a generate function (see app.murf_generate).")
+        b64, mime = self.generate(text, lang, voice_id, fmt, style, deadline)
+        return base64.b64decode(b64), mime
+
+# --- Router ---------------------------------------------------------------------
+TTS_EWMA_ALPHA = float(os.getenv("TTS_EWMA_ALPHA", "0.2"))
+TTS_BREAKER_FAILURES = int(os.getenv("TTS_BREAKER_FAILURES", "3"))      # consecutive failures to trip
+TTS_BREAKER_ERROR_RATE = float(os.getenv("TTS_BREAKER_ERROR_RATE", "0.5"))
+TTS_BREAKER_COOLDOWN_S = float(os.getenv("TTS_BREAKER_COOLDOWN_S", "30"))
+TTS_STALE_S = float(os.getenv("TTS_STALE_S", "60"))   # latency older than this is re-measured
+TTS_PROBE_INTERVAL_S = float(os.getenv("TTS_PROBE_INTERVAL_S", "30"))  # at most one re-measuring request per provider this often
+
+metrics.describe("vibe_tts_routed_total", "TTS requests answered, by provider and why it was chosen")
+metrics.describe("vibe_tts_failover_total", "TTS attempts that failed and moved on to the next provider")
+metrics.describe("vibe_tts_breaker_trips_total", "Times a provider's circuit breaker opened")
+metrics.describe("vibe_tts_breaker_open", "1 while a provider's circuit breaker is open")
+metrics.describe("vibe_tts_ewma_seconds", "Smoothed synthesis latency per provider")
+metrics.describe("vibe_tts_error_rate", "Smoothed error rate per provider")
+metrics.describe("vibe_tts_seconds", "Synthesis latency per provider")
+
+class ProviderHealth:
+    """EWMA latency / error rate and a circuit breaker (closed -> open -> half-open) for one provider."""
+    def __init__(self, name: str):
+        self.name = name
+        self.latency: Optional[float] = None
+        self.measured_at = 0.0
+        self.error_rate = 0.0
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.probed_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def fresh(self) -> bool:
+        return self.latency is not None and time.monotonic() - self.measured_at < TTS_STALE_S
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= TTS_BREAKER_COOLDOWN_S else "open"
+
+    def claim_probe(self) -> bool:
+        """True (once per TTS_PROBE_INTERVAL_S) if this stale provider should get the next request to re-measure it."""
+        with self._lock:
+            now = time.monotonic()
+            if self.probed_at is not None and now - self.probed_at < TTS_PROBE_INTERVAL_S:
+                return False
+            self.probed_at = now
+            return True
+
+    def acquire(self) -> Optional[str]:
+        """'closed' or 'probe' if a request may go to this provider now, else None."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return "closed"
+            if state == "half-open" and not self.probing:
+                self.probing = True     # one trial request at a time after the cooldown
+                return "probe"
+            return None
+
+    def release(self):
+        """Give back a probe slot without a verdict (the request was refused for its own sake)."""
+        with self._lock:
+            self.probing = False
+
+    def record(self, ok: bool, seconds: float):
+        a = TTS_EWMA_ALPHA
+        with self._lock:
+            self.probing = False
+            self.error_rate = (1 - a) * self.error_rate + a * (0.0 if ok else 1.0)
+            if ok:
+                self.latency = seconds if self.latency is None else (1 - a) * self.latency + a * seconds
+                self.measured_at = time.monotonic()
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if (self.opened_at is not None or self.failures >= TTS_BREAKER_FAILURES
+                        or self.error_rate >= TTS_BREAKER_ERROR_RATE):
+                    if self.opened_at is None:
+                        metrics.inc("vibe_tts_breaker_trips_total", provider=self.name)
+                    self.opened_at = time.monotonic()   # (re)open; a failed probe restarts the cooldown
+        metrics.gauge("vibe_tts_breaker_open", 0 if self.opened_at is None else 1, provider=self.name)
+        metrics.gauge("vibe_tts_error_rate", round(self.error_rate, 4), provider=self.name)
+        if self.latency is not None:
+            metrics.gauge("vibe_tts_ewma_seconds", round(self.latency, 4), provider=self.name)
+
+def _client_error(e: Exception) -> bool:
+    # a 4xx (other than 429) is about the request, not the provider: no failover, no health penalty
+    status = getattr(e, "status_code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status != 429
+
+class TTSRouter(TTSProvider):
+    """
+    Sends each request to the fastest healthy provider that supports the locale/format (and the pinned
+    voice_id, if any), failing over down the list; `fallback` (offline pyttsx3) is tried last whatever
+    its breaker says, but only for a format it produces. Providers with a recent latency sample rank by
+    it; the others come after them, in the order given, except that one of them at a time is moved to
+    the front every TTS_PROBE_INTERVAL_S, so every provider gets measured and a stale estimate is
+    refreshed instead of ruling a provider out for good. A client error (4xx other than 429) is raised
+    as it is: it counts against no provider's health and is not failed over.
+    """
+    name = "router"
+
+    def __init__(self, providers: List[TTSProvider], fallback: Optional[TTSProvider] = None):
+        self.providers = list(providers)
+        self.fallback = fallback
+        self.health = {p.name: ProviderHealth(p.name) for p in self.providers + ([fallback] if fallback else [])}
+        self._served = threading.local()
+
+    def supports(self, lang: Optional[str], fmt: str) -> bool:
+        return any(p.supports(lang, fmt) for p in self.providers + ([self.fallback] if self.fallback else []))
+
+    @staticmethod
+    def _can(p: TTSProvider, lang: Optional[str], fmt: str, voice_id: Optional[str]) -> bool:
+        return p.supports(lang, fmt) and (not voice_id or p.takes_voice_id)
+
+    def plan(self, lang: Optional[str], fmt: str, voice_id: Optional[str] = None) -> List[TTSProvider]:
+        """
+        Providers in the order they would be tried (ignores breakers; see status()). Claims the
+        re-measuring slot of the stale provider it moves to the front.
+        """
+        ok = [p for p in self.providers if self._can(p, lang, fmt, voice_id)]
+        fresh = sorted((p for p in ok if self.health[p.name].fresh), key=lambda p: self.health[p.name].latency)
+        stale = [p for p in ok if not self.health[p.name].fresh]
+        probe = next((p for p in stale if self.health[p.name].claim_probe()), None)
+        if probe is None:
+            return fresh + stale
+        return [probe] + fresh + [p for p in stale if p is not probe]
+
+    def close(self):
+        for p in self.providers + ([self.fallback] if self.fallback else []):
+            if hasattr(p, "close"):
+                p.close()
+
+    def status(self) -> dict:
+        return {name: {"state": h.state, "ewma_s": h.latency, "error_rate": round(h.error_rate, 4)}
+                for name, h in self.health.items()}
+
+    def served_by(self) -> Optional[Tuple[str, str]]:
+        """(provider, reason) of this thread's last successful speak(); reason as in vibe_tts_routed_total."""
+        return getattr(self._served, "last", None)
+
+    def _attempt(self, p: TTSProvider, text, lang, fmt, voice_id, style, deadline):
+        t0 = time.monotonic()
+        try:
+            out = p.speak(text, lang, fmt, voice_id=voice_id, style=style, deadline=deadline)
+        except Exception as e:
+            if _client_error(e):
+                self.health[p.name].release()
+                raise
+            self.health[p.name].record(False, time.monotonic() - t0)
+            raise
+        dt = time.monotonic() - t0
+        self.health[p.name].record(True, dt)
+        metrics.observe("vibe_tts_seconds", dt, provider=p.name)
+        return out
+
+    def speak(self, text: str, lang: Optional[str], fmt: str, voice_id: Optional[str] = None,
+              style: Optional[str] = None, deadline=None) -> Tuple[bytes, str]:
+        errors = []
+        reason = "fastest"
+        for p in self.plan(lang, fmt, voice_id):
+            if deadline is not None:
+                deadline.timeout(f"tts {p.name}")
+            gate = self.health[p.name].acquire()
+            if gate is None:
+                reason = "failover"
+                continue
+            try:
+                out = self._attempt(p, text, lang, fmt, voice_id, style, deadline)
+            except Exception as e:
+                if _client_error(e):
+                    raise   # the same request would be refused by the next provider too
+                if getattr(e, "status_code", None) == 504:
+                    raise   # out of time: another provider won't help
+                if getattr(e, "status_code", None) == 429 and getattr(deadline, "priority", None) == "batch":
+                    raise   # batch work waits for quota rather than settling for another voice
+                metrics.inc("vibe_tts_failover_total", provider=p.name)
+                errors.append(f"{p.name}: {e}")
+                reason = "failover"
+                continue
+            if gate == "probe":
+                reason = "probe"
+            metrics.inc("vibe_tts_routed_total", provider=p.name, reason=reason)
+            self._served.last = (p.name, reason)
+            return out
+        if self.fallback is not None and self._can(self.fallback, lang, fmt, voice_id):
+            try:
+                out = self._attempt(self.fallback, text, lang, fmt, voice_id, style, deadline)
+            except Exception as e:
+                if _client_error(e):
+                    raise
+                errors.append(f"{self.fallback.name}: {e}")
+            else:
+                metrics.inc("vibe_tts_routed_total", provider=self.fallback.name, reason="last-resort")
+                self._served.last = (self.fallback.name, "last-resort")
+                return out
+        raise RuntimeError("No TTS provider could synthesize: " + ("; ".join(errors) or "none available"))
 
 # --- Factory -----------------------------------------------------------------
 def get_tts_provider(fmt: str) -> TTSProvider:
@@ -0,0 +1,185 @@
+# upstream.py — request deadlines and hedged calls to Gemini / Murf
+# A Deadline is created once per client request (from the client's "deadline_ms" budget) and
+# handed to every stage; each upstream call gets only the time that is left.
+# call_hedged() optionally races a backup attempt against a slow primary (VIBE_HEDGE=1).
+# Every attempt runs under a lease from the quota scheduler (quota.py), which picks the API key;
+# the Deadline also says who is asking (priority class and client) so the scheduler can queue fairly.
+# It also carries the request's timeline: stages mark() themselves and clients that send a request_id
+# get the stage timings back to line up with their own (see the CLIs' --timings).
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+import metrics
+import quota
+
+DEFAULT_DEADLINE_S = float(os.getenv("VIBE_DEADLINE_S", "120"))
+MIN_STAGE_S = 0.05   # below this there is no point starting another upstream call
+
+HEDGE_ENABLED = os.getenv("VIBE_HEDGE") == "1"
+HEDGE_PERCENTILE = float(os.getenv("VIBE_HEDGE_PERCENTILE", "95"))
+HEDGE_MAX_RATE = float(os.getenv("VIBE_HEDGE_MAX_RATE", "0.05"))   # backups per primary call
+HEDGE_MIN_SAMPLES = int(os.getenv("VIBE_HEDGE_MIN_SAMPLES", "20"))
+
+metrics.describe("vibe_upstream_seconds", "Latency of successful upstream attempts")
+metrics.describe("vibe_upstream_calls_total", "Upstream calls (primary attempts)")
+metrics.describe("vibe_upstream_errors_total", "Failed upstream attempts")
+metrics.describe("vibe_upstream_hedges_total", "Backup attempts fired by hedging")
+metrics.describe("vibe_upstream_hedge_wins_total", "Hedged calls answered by the backup")
+metrics.describe("vibe_upstream_hedges_capped_total", "Hedges skipped because the rate cap was reached")
+metrics.describe("vibe_deadline_exceeded_total", "Requests that ran out of time, by stage")
+
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv("VIBE_UPSTREAM_WORKERS", "16")),
+                           thread_name_prefix="vibe-upstream")
+
+
+class Deadline:
+    """Absolute point in time (monotonic) by which a request must be answered, and who is asking."""
+
+    def __init__(self, budget_s: Optional[float] = None, priority: Optional[str] = None, client: str = "",
+                 request_id: str = ""):
+        self.budget_s = budget_s if budget_s and budget_s > 0 else DEFAULT_DEADLINE_S
+        self.started = time.monotonic()
+        self.expires = self.started + self.budget_s
+        self.priority = (priority or "interactive").lower()
+        if self.priority not in quota.PRIORITIES:
+            raise HTTPException(422, f"Unknown priority '{priority}'. Use one of: {', '.join(quota.PRIORITIES)}")
+        self.client = client or ""
+        self.request_id = request_id or ""
+        self.stages: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_ms(cls, ms: Any, priority: Optional[str] = None, client: Optional[str] = None,
+                request_id: Optional[str] = None) -> "Deadline":
+        """Client budgets arrive as milliseconds; missing or invalid values get the default."""
+        try:
+            budget = float(ms) / 1000
+        except (TypeError, ValueError):
+            budget = None
+        return cls(budget, priority, client or "", request_id or "")
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def timeout(self, stage: str, cap: Optional[float] = None) -> float:
+        """Seconds stage may use; raises 504 if the request is already out of time."""
+        left = self.remaining()
+        if left < MIN_STAGE_S:
+            metrics.inc("vibe_deadline_exceeded_total", stage=stage)
+            raise HTTPException(504, f"Deadline exceeded before {stage}")
+        return min(left, cap) if cap else left
+
+    def mark(self, stage: str, since: Optional[float] = None):
+        """Put a stage on the request's timeline: a point, or a span that began at `since` (monotonic)."""
+        now = time.monotonic()
+        entry = {"stage": stage, "at_ms": round(((since or now) - self.started) * 1000, 1)}
+        if since is not None:
+            entry["ms"] = round((now - since) * 1000, 1)
+        self.stages.append(entry)
+
+    @contextmanager
+    def span(self, stage: str):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.mark(stage, t0)
+
+    def timings(self) -> Dict[str, Any]:
+        return {"request_id": self.request_id, "stages": sorted(self.stages, key=lambda e: e["at_ms"])}
+
+
+def _hedge_delay(upstream: str) -> Optional[float]:
+    if not HEDGE_ENABLED:
+        return None
+    return metrics.percentile("vibe_upstream_seconds", HEDGE_PERCENTILE,
+                              min_samples=HEDGE_MIN_SAMPLES, upstream=upstream)
+
+
+def _take_hedge(upstream: str) -> bool:
+    calls = metrics.count("vibe_upstream_calls_total", upstream=upstream)
+    hedges = metrics.count("vibe_upstream_hedges_total", upstream=upstream)
+    if hedges + 1 > HEDGE_MAX_RATE * calls:
+        metrics.inc("vibe_upstream_hedges_capped_total", upstream=upstream)
+        return False
+    metrics.inc("vibe_upstream_hedges_total", upstream=upstream)
+    return True
+
+
+def call_hedged(upstream: str, fn: Callable[[float, Optional[str]], Any], deadline: Deadline,
+                hedge: bool = True, pin: Optional[str] = None) -> Any:
+    """
+    Run fn(timeout, api_key) — a blocking upstream call — within the deadline.
+    The key comes from a quota lease; if the upstream answers 429 that key cools down and
+    the call is retried on the next lease while the deadline allows (otherwise 429).
+    With hedging on (and hedge=True: the call is idempotent), a backup attempt starts once the
+    primary is slower than the recent HEDGE_PERCENTILE latency, as long as backups stay under
+    HEDGE_MAX_RATE of calls and a lease is free right away. The first success wins; the loser
+    is cancelled if it has not started, otherwise its result is dropped when its own
+    (deadline-bounded) timeout ends it. With no backup to race (hedging off, too few latency
+    samples yet, or hedge=False) fn runs on the calling thread; pin keeps the call on one API key.
+    """
+    metrics.inc("vibe_upstream_calls_total", upstream=upstream)
+    with deadline.span(upstream):
+        while True:
+            try:
+                return _call_leased(upstream, fn, deadline, hedge, pin)
+            except quota.RateLimited:
+                continue    # that key is cooling down; the next acquire picks another or gives up with 429
+
+
+def _call_leased(upstream: str, fn: Callable[[float, Optional[str]], Any], deadline: Deadline,
+                 hedge: bool, pin: Optional[str]) -> Any:
+    def attempt(lease: quota.Lease, timeout: float):
+        t0 = time.monotonic()
+        try:
+            out = fn(timeout, lease.key)
+        except Exception as e:
+            metrics.inc("vibe_upstream_errors_total", upstream=upstream)
+            backoff = quota.retry_after(e)
+            if backoff is not None:
+                lease.rate_limited(backoff)
+                raise quota.RateLimited(upstream, backoff) from e
+            raise
+        metrics.observe("vibe_upstream_seconds", time.monotonic() - t0, upstream=upstream)
+        return out
+
+    lease = quota.acquire(upstream, deadline, pin=pin)
+    delay = _hedge_delay(upstream) if hedge else None
+    if delay is None:
+        # nothing to race: no thread hop, fn's own timeout bounds it
+        out = attempt(lease, deadline.timeout(upstream))
+        if hedge and deadline.remaining() <= 0:
+            metrics.inc("vibe_deadline_exceeded_total", stage=upstream)
+            raise HTTPException(504, f"Deadline exceeded waiting for {upstream}")
+        return out
+    primary = _pool.submit(attempt, lease, deadline.timeout(upstream))
+    pending = {primary}
+    done, _ = wait(pending, timeout=min(delay, deadline.remaining()))
+    if not done and deadline.remaining() >= MIN_STAGE_S and _take_hedge(upstream):
+        backup = quota.acquire(upstream, deadline, wait=False, pin=pin)
+        if backup is not None:
+            pending.add(_pool.submit(attempt, backup, deadline.timeout(upstream)))
+
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for f in done:
+            if f.exception() is None:
+                for loser in pending:
+                    loser.cancel()
+                if f is not primary:
+                    metrics.inc("vibe_upstream_hedge_wins_total", upstream=upstream)
+                return f.result()
+            error = f.exception()
+    if error is not None and not pending:
+        raise error
+    metrics.inc("vibe_deadline_exceeded_total", stage=upstream)
+    raise HTTPException(504, f"Deadline exceeded waiting for {upstream}")
+
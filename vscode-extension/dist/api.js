@@ -1,16 +1,67 @@
 "use strict";
 // If you ever see "fetch not found" in your environment, uncomment the next two lines:
 //@ts-ignore
+var __createBinding = (this && this.__createBinding) || (Object.create ? (function(o, m, k, k2) {
+    if (k2 === undefined) k2 = k;
+    var desc = Object.getOwnPropertyDescriptor(m, k);
+    if (!desc || ("get" in desc ? !m.__esModule : desc.writable || desc.configurable)) {
+      desc = { enumerable: true, get: function() { return m[k]; } };
+    }
+    Object.defineProperty(o, k2, desc);
+}) : (function(o, m, k, k2) {
+    if (k2 === undefined) k2 = k;
+    o[k2] = m[k];
+}));
+var __setModuleDefault = (this && this.__setModuleDefault) || (Object.create ? (function(o, v) {
+    Object.defineProperty(o, "default", { enumerable: true, value: v });
+}) : function(o, v) {
+    o["default"] = v;
+});
+var __importStar = (this && this.__importStar) || (function () {
+    var ownKeys = function(o) {
+        ownKeys = Object.getOwnPropertyNames || function (o) {
+            var ar = [];
+            for (var k in o) if (Object.prototype.hasOwnProperty.call(o, k)) ar[ar.length] = k;
+            return ar;
+        };
+        return ownKeys(o);
+    };
+    return function (mod) {
+        if (mod && mod.__esModule) return mod;
+        var result = {};
+        if (mod != null) for (var k = ownKeys(mod), i = 0; i < k.length; i++) if (k[i] !== "default") __createBinding(result, mod, k[i]);
+        __setModuleDefault(result, mod);
+        return result;
+    };
+})();
+var __importDefault = (this && this.__importDefault) || function (mod) {
+    return (mod && mod.__esModule) ? mod : { "default": mod };
+};
 Object.defineProperty(exports, "__esModule", { value: true });
+exports.speechSettings = speechSettings;
 exports.speakText = speakText;
+exports.streamSpeech = streamSpeech;
 require("undici/register");
-const SERVICE_URL = 'http://127.0.0.1:5317/speak';
+const vscode = __importStar(require("vscode"));
+const ws_1 = __importDefault(require("ws"));
+const DEFAULT_SERVICE_URL = 'http://127.0.0.1:5317/speak';
+function speechSettings() {
+    const cfg = vscode.workspace.getConfiguration('vibe');
+    return {
+        serviceUrl: cfg.get('serviceUrl') || DEFAULT_SERVICE_URL,
+        language: cfg.get('language') || undefined,
+        voiceId: cfg.get('voiceId') || undefined
+    };
+}
+function requestBody(text, settings) {
+    return { text, language: settings.language, voice_id: settings.voiceId };
+}
 // Return the shape the rest of the extension expects: { audioB64, mime }
-async function speakText(text) {
-    const resp = await fetch(SERVICE_URL, {
+async function speakText(text, settings = speechSettings()) {
+    const resp = await fetch(settings.serviceUrl, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ text })
+        body: JSON.stringify(requestBody(text, settings))
     });
     if (!resp.ok) {
         const t = await resp.text();
@@ -23,3 +74,50 @@ async function speakText(text) {
     }
     return { audioB64: data.audio_b64, mime: data.mime };
 }
+// Open /ws/stream and hand frames over as they arrive; exactly one of onEnd/onError fires.
+function streamSpeech(text, handlers, settings = speechSettings()) {
+    const ws = new ws_1.default(settings.serviceUrl.replace(/^http/, 'ws').replace(/\/speak$/, '/ws/stream'));
+    let done = false;
+    let gotFinal = false;
+    const finish = (err) => {
+        if (done) {
+            return;
+        }
+        done = true;
+        if (err) {
+            handlers.onError(err);
+        }
+        else {
+            handlers.onEnd();
+        }
+        ws.close();
+    };
+    ws.on('open', () => ws.send(JSON.stringify({ ...requestBody(text, settings), format: 'WAV' })));
+    ws.on('message', (raw) => {
+        if (done) {
+            return;
+        }
+        const data = JSON.parse(raw.toString());
+        if (data.error) {
+            finish(new Error(data.error));
+        }
+        else if (data.info) {
+            handlers.onInfo(data.info);
+        }
+        else if (data.audio_b64) {
+            handlers.onAudio(data.audio_b64);
+        }
+        else if (data.final) {
+            gotFinal = true;
+            finish();
+        }
+    });
+    ws.on('error', (err) => finish(err));
+    // a close before "final" (service crash, proxy timeout) means the audio was cut off
+    ws.on('close', () => finish(gotFinal ? undefined : new Error('stream closed before final')));
+    return {
+        pause: () => ws.pause(),
+        resume: () => ws.resume(),
+        close: () => finish()
+    };
+}
@@ -38,15 +38,63 @@ exports.deactivate = deactivate;
 const vscode = __importStar(require("vscode"));
 const api_1 = require("./api");
 const player_1 = require("./player"); // <- named import
+const sections_1 = require("./sections");
+const narrator_1 = require("./narrator");
+let current;
+function narrateStreaming(context, text) {
+    current?.close();
+    const panel = (0, player_1.getPlayerPanel)(context);
+    let sub;
+    const stream = (0, api_1.streamSpeech)(text, {
+        onInfo: (info) => panel.webview.postMessage({ type: 'STREAM_START', sampleRate: info.sample_rate, transcript: info.transcript }),
+        onAudio: (audioB64) => panel.webview.postMessage({ type: 'STREAM_CHUNK', audioB64 }),
+        onEnd: () => {
+            panel.webview.postMessage({ type: 'STREAM_END' });
+            sub?.dispose();
+        },
+        onError: (err) => {
+            panel.webview.postMessage({ type: 'STREAM_END' }); // play out what arrived instead of waiting for more
+            sub?.dispose();
+            vscode.window.showErrorMessage(`Vibe speak failed: ${err.message || err}`);
+        }
+    });
+    sub = panel.webview.onDidReceiveMessage((msg) => {
+        if (msg?.type !== 'BUFFER') {
+            return;
+        }
+        if (msg.seconds > player_1.HIGH_WATER_S) {
+            stream.pause();
+        }
+        else if (msg.seconds < player_1.LOW_WATER_S) {
+            stream.resume();
+        }
+    });
+    current = stream;
+}
 function activate(context) {
     const disposable = vscode.commands.registerCommand('vibe.speakSelection', async () => {
         const editor = vscode.window.activeTextEditor;
         if (!editor) {
             return;
         }
-        const selection = editor.selection.isEmpty
-            ? editor.document.getText(new vscode.Range(0, 0, editor.document.lineCount, 0))
-            : editor.document.getText(editor.selection);
+        current?.close();
+        (0, narrator_1.stopNarration)(context);
+        const streaming = vscode.workspace.getConfiguration('vibe').get('streamPlayback', true);
+        // Whole document: narrate section by section (cached per section) instead of one huge request
+        if (editor.selection.isEmpty) {
+            try {
+                await (0, narrator_1.narrateSections)(context, await (0, sections_1.splitDocument)(editor.document), streaming);
+            }
+            catch (err) {
+                vscode.window.showErrorMessage(`Vibe speak failed: ${err.message || err}`);
+            }
+            return;
+        }
+        const selection = editor.document.getText(editor.selection);
+        if (streaming) {
+            narrateStreaming(context, selection);
+            return;
+        }
         try {
             const { audioB64, mime } = await (0, api_1.speakText)(selection); // ✅ camelCase
             const panel = (0, player_1.getPlayerPanel)(context);
@@ -58,4 +106,6 @@ function activate(context) {
     });
     context.subscriptions.push(disposable);
 }
-function deactivate() { }
+function deactivate() {
+    current?.close();
+}
@@ -0,0 +1,158 @@
+"use strict";
+var __createBinding = (this && this.__createBinding) || (Object.create ? (function(o, m, k, k2) {
+    if (k2 === undefined) k2 = k;
+    var desc = Object.getOwnPropertyDescriptor(m, k);
+    if (!desc || ("get" in desc ? !m.__esModule : desc.writable || desc.configurable)) {
+      desc = { enumerable: true, get: function() { return m[k]; } };
+    }
+    Object.defineProperty(o, k2, desc);
+}) : (function(o, m, k, k2) {
+    if (k2 === undefined) k2 = k;
+    o[k2] = m[k];
+}));
+var __setModuleDefault = (this && this.__setModuleDefault) || (Object.create ? (function(o, v) {
+    Object.defineProperty(o, "default", { enumerable: true, value: v });
+}) : function(o, v) {
+    o["default"] = v;
+});
+var __importStar = (this && this.__importStar) || (function () {
+    var ownKeys = function(o) {
+        ownKeys = Object.getOwnPropertyNames || function (o) {
+            var ar = [];
+            for (var k in o) if (Object.prototype.hasOwnProperty.call(o, k)) ar[ar.length] = k;
+            return ar;
+        };
+        return ownKeys(o);
+    };
+    return function (mod) {
+        if (mod && mod.__esModule) return mod;
+        var result = {};
+        if (mod != null) for (var k = ownKeys(mod), i = 0; i < k.length; i++) if (k[i] !== "default") __createBinding(result, mod, k[i]);
+        __setModuleDefault(result, mod);
+        return result;
+    };
+})();
+Object.defineProperty(exports, "__esModule", { value: true });
+exports.splitDocument = splitDocument;
+exports.splitLines = splitLines;
+const vscode = __importStar(require("vscode"));
+const crypto_1 = require("crypto");
+// Small neighbours are merged so a run of one-line comments is one request, not ten;
+// anything over the max is split at blank lines.
+const MIN_SECTION_CHARS = 300;
+const MAX_SECTION_CHARS = 4000;
+// Split a document into narration sections: top-level symbols (functions/classes) from the
+// language's symbol provider, with the text between them (imports, comment blocks) cut at blank lines.
+async function splitDocument(doc) {
+    const lines = doc.getText().split(/\r?\n/);
+    let symbols = [];
+    try {
+        const found = await vscode.commands.executeCommand('vscode.executeDocumentSymbolProvider', doc.uri);
+        symbols = (found || []).map((s) => {
+            const r = s.range ?? s.location.range;
+            return [r.start.line, r.end.line];
+        });
+    }
+    catch {
+        // no symbol provider for this language: everything is treated as loose text below
+    }
+    return splitLines(lines, symbols);
+}
+function splitLines(lines, symbols) {
+    const spans = [];
+    let cursor = 0;
+    for (const [start, end] of mergeSpans(symbols)) {
+        if (start > cursor) {
+            spans.push({ span: [cursor, start - 1], symbol: false });
+        }
+        spans.push({ span: [start, end], symbol: true });
+        cursor = end + 1;
+    }
+    if (cursor < lines.length) {
+        spans.push({ span: [cursor, lines.length - 1], symbol: false });
+    }
+    const out = [];
+    for (const { span, symbol } of spans) {
+        const parts = symbol ? splitLarge(lines, span) : paragraphs(lines, span);
+        for (const p of parts) {
+            const prev = out[out.length - 1];
+            // fold tiny pieces (one-line symbols, short comments) into the previous section
+            if (prev && size(lines, [prev[0], p[1]]) < MIN_SECTION_CHARS) {
+                prev[1] = p[1];
+            }
+            else {
+                out.push(p);
+            }
+        }
+    }
+    return out
+        .map(([startLine, endLine]) => {
+        const text = lines.slice(startLine, endLine + 1).join('\n');
+        return { text, startLine, endLine, hash: (0, crypto_1.createHash)('sha256').update(text).digest('hex') };
+    })
+        .filter((s) => s.text.trim().length > 0);
+}
+function mergeSpans(spans) {
+    const sorted = spans.slice().sort((a, b) => a[0] - b[0]);
+    const out = [];
+    for (const [s, e] of sorted) {
+        const last = out[out.length - 1];
+        if (last && s <= last[1]) {
+            last[1] = Math.max(last[1], e);
+        }
+        else {
+            out.push([s, e]);
+        }
+    }
+    return out;
+}
+function size(lines, [s, e]) {
+    let n = 0;
+    for (let i = s; i <= e; i++) {
+        n += lines[i].length + 1;
+    }
+    return n;
+}
+// Blank-line separated blocks inside a span
+function paragraphs(lines, [s, e]) {
+    const out = [];
+    let start = -1;
+    for (let i = s; i <= e; i++) {
+        const blank = lines[i].trim() === '';
+        if (!blank && start < 0) {
+            start = i;
+        }
+        if (blank && start >= 0) {
+            out.push([start, i - 1]);
+            start = -1;
+        }
+    }
+    if (start >= 0) {
+        out.push([start, e]);
+    }
+    return out.flatMap((p) => splitLarge(lines, p));
+}
+function splitLarge(lines, span) {
+    if (size(lines, span) <= MAX_SECTION_CHARS) {
+        return [span];
+    }
+    const out = [];
+    let [start] = span;
+    let n = 0;
+    let lastBlank = -1;
+    for (let i = span[0]; i <= span[1]; i++) {
+        n += lines[i].length + 1;
+        if (lines[i].trim() === '') {
+            lastBlank = i;
+        }
+        if (n > MAX_SECTION_CHARS && i > start) {
+            const cut = lastBlank > start ? lastBlank : i - 1;
+            out.push([start, cut]);
+            start = cut + 1;
+            n = size(lines, [start, i]);
+            lastBlank = -1;
+        }
+    }
+    out.push([start, span[1]]);
+    return out;
+}
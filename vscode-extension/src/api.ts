@@ -2,8 +2,26 @@
 //@ts-ignore
 
 import 'undici/register';
+import * as vscode from 'vscode';
+import WebSocket from 'ws';
 
-const SERVICE_URL = 'http://127.0.0.1:5317/speak';
+const DEFAULT_SERVICE_URL = 'http://127.0.0.1:5317/speak';
+
+// What a request is synthesized with (the "vibe" settings); part of the narration cache key too.
+export type SpeechSettings = { serviceUrl: string; language?: string; voiceId?: string };
+
+export function speechSettings(): SpeechSettings {
+  const cfg = vscode.workspace.getConfiguration('vibe');
+  return {
+    serviceUrl: cfg.get<string>('serviceUrl') || DEFAULT_SERVICE_URL,
+    language: cfg.get<string>('language') || undefined,
+    voiceId: cfg.get<string>('voiceId') || undefined
+  };
+}
+
+function requestBody(text: string, settings: SpeechSettings) {
+  return { text, language: settings.language, voice_id: settings.voiceId };
+}
 
 type SpeakResponse = {
   audio_b64: string;
@@ -11,11 +29,11 @@ type SpeakResponse = {
 };
 
 // Return the shape the rest of the extension expects: { audioB64, mime }
-export async function speakText(text: string): Promise<{ audioB64: string; mime: string }> {
-  const resp = await fetch(SERVICE_URL, {
+export async function speakText(text: string, settings: SpeechSettings = speechSettings()): Promise<{ audioB64: string; mime: string }> {
+  const resp = await fetch(settings.serviceUrl, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ text })
+    body: JSON.stringify(requestBody(text, settings))
   });
 
   if (!resp.ok) {
@@ -32,3 +50,59 @@ export async function speakText(text: string): Promise<{ audioB64: string; mime:
 
   return { audioB64: data.audio_b64, mime: data.mime };
 }
+
+// `info` frame from /ws/stream (sent once, before audio)
+export type StreamInfo = {
+  transcript: string;
+  voice_id: string;
+  mime: string;
+  sample_rate: number;
+  channel: string;
+  format: string;
+};
+
+export interface SpeechStreamHandlers {
+  onInfo(info: StreamInfo): void;
+  onAudio(audioB64: string): void;
+  onEnd(): void;
+  onError(err: Error): void;
+}
+
+export interface SpeechStream {
+  pause(): void;   // stop reading the socket (TCP backpressure up to the service)
+  resume(): void;
+  close(): void;
+}
+
+// Open /ws/stream and hand frames over as they arrive; exactly one of onEnd/onError fires.
+export function streamSpeech(text: string, handlers: SpeechStreamHandlers, settings: SpeechSettings = speechSettings()): SpeechStream {
+  const ws = new WebSocket(settings.serviceUrl.replace(/^http/, 'ws').replace(/\/speak$/, '/ws/stream'));
+  let done = false;
+  let gotFinal = false;
+
+  const finish = (err?: Error) => {
+    if (done) { return; }
+    done = true;
+    if (err) { handlers.onError(err); } else { handlers.onEnd(); }
+    ws.close();
+  };
+
+  ws.on('open', () => ws.send(JSON.stringify({ ...requestBody(text, settings), format: 'WAV' })));
+  ws.on('message', (raw) => {
+    if (done) { return; }
+    const data = JSON.parse(raw.toString());
+    if (data.error) { finish(new Error(data.error)); }
+    else if (data.info) { handlers.onInfo(data.info as StreamInfo); }
+    else if (data.audio_b64) { handlers.onAudio(data.audio_b64); }
+    else if (data.final) { gotFinal = true; finish(); }
+  });
+  ws.on('error', (err) => finish(err));
+  // a close before "final" (service crash, proxy timeout) means the audio was cut off
+  ws.on('close', () => finish(gotFinal ? undefined : new Error('stream closed before final')));
+
+  return {
+    pause: () => ws.pause(),
+    resume: () => ws.resume(),
+    close: () => finish()
+  };
+}
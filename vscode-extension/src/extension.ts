@@ -1,15 +1,64 @@
 import * as vscode from 'vscode';
-import { speakText } from './api';
-import { getPlayerPanel } from './player'; // <- named import
+import { speakText, streamSpeech, SpeechStream } from './api';
+import { getPlayerPanel, HIGH_WATER_S, LOW_WATER_S } from './player'; // <- named import
+import { splitDocument } from './sections';
+import { narrateSections, stopNarration } from './narrator';
+
+let current: SpeechStream | undefined;
+
+function narrateStreaming(context: vscode.ExtensionContext, text: string) {
+  current?.close();
+  const panel = getPlayerPanel(context);
+  let sub: vscode.Disposable | undefined;
+
+  const stream = streamSpeech(text, {
+    onInfo: (info) => panel.webview.postMessage({ type: 'STREAM_START', sampleRate: info.sample_rate, transcript: info.transcript }),
+    onAudio: (audioB64) => panel.webview.postMessage({ type: 'STREAM_CHUNK', audioB64 }),
+    onEnd: () => {
+      panel.webview.postMessage({ type: 'STREAM_END' });
+      sub?.dispose();
+    },
+    onError: (err) => {
+      panel.webview.postMessage({ type: 'STREAM_END' }); // play out what arrived instead of waiting for more
+      sub?.dispose();
+      vscode.window.showErrorMessage(`Vibe speak failed: ${err.message || err}`);
+    }
+  });
+
+  sub = panel.webview.onDidReceiveMessage((msg) => {
+    if (msg?.type !== 'BUFFER') { return; }
+    if (msg.seconds > HIGH_WATER_S) { stream.pause(); }
+    else if (msg.seconds < LOW_WATER_S) { stream.resume(); }
+  });
+  current = stream;
+}
 
 export function activate(context: vscode.ExtensionContext) {
   const disposable = vscode.commands.registerCommand('vibe.speakSelection', async () => {
     const editor = vscode.window.activeTextEditor;
     if (!editor) { return; }
 
-    const selection = editor.selection.isEmpty
-      ? editor.document.getText(new vscode.Range(0, 0, editor.document.lineCount, 0))
-      : editor.document.getText(editor.selection);
+    current?.close();
+    stopNarration(context);
+
+    const streaming = vscode.workspace.getConfiguration('vibe').get<boolean>('streamPlayback', true);
+
+    // Whole document: narrate section by section (cached per section) instead of one huge request
+    if (editor.selection.isEmpty) {
+      try {
+        await narrateSections(context, await splitDocument(editor.document), streaming);
+      } catch (err: any) {
+        vscode.window.showErrorMessage(`Vibe speak failed: ${err.message || err}`);
+      }
+      return;
+    }
+
+    const selection = editor.document.getText(editor.selection);
+
+    if (streaming) {
+      narrateStreaming(context, selection);
+      return;
+    }
 
     try {
       const { audioB64, mime } = await speakText(selection); // ✅ camelCase
@@ -23,4 +72,6 @@ export function activate(context: vscode.ExtensionContext) {
   context.subscriptions.push(disposable);
 }
 
-export function deactivate() {}
+export function deactivate() {
+  current?.close();
+}
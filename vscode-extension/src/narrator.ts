@@ -0,0 +1,193 @@
+import * as vscode from 'vscode';
+import { createHash } from 'crypto';
+import { promises as fs } from 'fs';
+import { speakText, speechSettings, SpeechSettings, streamSpeech } from './api';
+import { getPlayerPanel, HIGH_WATER_S, LOW_WATER_S } from './player';
+import { Section } from './sections';
+
+// A /speak clip, or (mime PCM_MIME) a streamed section: 16-bit mono PCM at sampleRate.
+type Clip = { audioB64: string; mime: string; sampleRate?: number };
+const PCM_MIME = 'audio/pcm';
+
+// Clips kept in global storage; the least recently played go first past this size.
+const MAX_CACHE_BYTES = 100 * 1024 * 1024;
+let pruning: Promise<void> = Promise.resolve();
+
+// Bumped on every new narration; a running loop exits when it no longer owns the latest value.
+let generation = 0;
+// Ends the section playing through the PCM worklet, if any.
+let stopPlayback: (() => void) | undefined;
+
+export function stopNarration(context: vscode.ExtensionContext) {
+  generation++;
+  stopPlayback?.();
+  getPlayerPanel(context).webview.postMessage({ type: 'STOP' });
+}
+
+// Narrate sections in order. Every clip is cached by content hash and speech settings, so after
+// an edit only changed sections hit the service (and a new voice or language is never served an
+// old clip). With `streaming` a section that is not cached is streamed over /ws/stream and plays
+// as it arrives; otherwise the next section is fetched from /speak while the current one plays.
+export async function narrateSections(context: vscode.ExtensionContext, sections: Section[], streaming = false) {
+  const gen = ++generation;
+  const panel = getPlayerPanel(context);
+  const settings = speechSettings();
+  const load = (section: Section) => streaming ? readClip(context, section, settings) : loadClip(context, section, settings);
+  let next = sections.length ? load(sections[0]) : undefined;
+
+  for (let i = 0; i < sections.length; i++) {
+    const clip = await next!;
+    if (gen !== generation) { return; }
+    next = i + 1 < sections.length ? load(sections[i + 1]) : undefined;
+    next?.catch(() => undefined); // surfaced when awaited on the next iteration
+    const played = clip
+      ? await playClip(panel, `${gen}:${i}`, clip, sections[i])
+      : await streamClip(context, panel, `${gen}:${i}`, sections[i], settings);
+    if (!played || gen !== generation) { return; }
+  }
+}
+
+function label(section: Section) {
+  return `Lines ${section.startLine + 1}-${section.endLine + 1}`;
+}
+
+// Resolves true when the clip finished (or was stopped), false if the player was closed.
+function playClip(panel: vscode.WebviewPanel, id: string, clip: Clip, section: Section): Promise<boolean> {
+  if (clip.mime === PCM_MIME) {
+    const playback = playout(panel, id);
+    panel.webview.postMessage({ type: 'STREAM_START', stream: id, sampleRate: clip.sampleRate, transcript: label(section) });
+    panel.webview.postMessage({ type: 'STREAM_CHUNK', audioB64: clip.audioB64 });
+    panel.webview.postMessage({ type: 'STREAM_END' });
+    playback.ended();
+    stopPlayback = () => playback.cancel(true);
+    return playback.done.finally(() => { stopPlayback = undefined; });
+  }
+  return new Promise((resolve) => {
+    const done = (played: boolean) => { sub.dispose(); closed.dispose(); resolve(played); };
+    const sub = panel.webview.onDidReceiveMessage((msg) => {
+      if (msg?.type === 'CLIP_ENDED' && msg.id === id) { done(true); }
+    });
+    const closed = panel.onDidDispose(() => done(false));
+    panel.webview.postMessage({ type: 'PLAY_CLIP', id, audioB64: clip.audioB64, mime: clip.mime, label: label(section) });
+  });
+}
+
+// Stream a section into the PCM worklet and cache what was streamed once it is complete.
+// Resolves like playClip; rejects if the stream fails.
+async function streamClip(context: vscode.ExtensionContext, panel: vscode.WebviewPanel, id: string, section: Section,
+                          settings: SpeechSettings): Promise<boolean> {
+  const chunks: Buffer[] = [];
+  let sampleRate = 0;
+  let stopped = false;
+  let failed: Error | undefined;
+  const playback = playout(panel, id, (seconds) => {
+    if (seconds > HIGH_WATER_S) { stream.pause(); }
+    else if (seconds < LOW_WATER_S) { stream.resume(); }
+  });
+  const stream = streamSpeech(section.text, {
+    onInfo: (info) => {
+      sampleRate = info.sample_rate;
+      panel.webview.postMessage({ type: 'STREAM_START', stream: id, sampleRate, transcript: label(section) });
+    },
+    onAudio: (audioB64) => {
+      const pcm = chunks.length ? Buffer.from(audioB64, 'base64') : stripWavHeader(Buffer.from(audioB64, 'base64'));
+      chunks.push(pcm);
+      panel.webview.postMessage({ type: 'STREAM_CHUNK', audioB64: pcm.toString('base64') });
+    },
+    onEnd: () => {
+      panel.webview.postMessage({ type: 'STREAM_END' });
+      playback.ended();
+      if (!chunks.length) { playback.cancel(true); return; } // nothing to play out or keep
+      if (!stopped) {
+        const clip = { audioB64: Buffer.concat(chunks).toString('base64'), mime: PCM_MIME, sampleRate };
+        saveClip(context, section, settings, clip).catch(() => undefined);
+      }
+    },
+    onError: (err) => {
+      failed = err;
+      panel.webview.postMessage({ type: 'STREAM_END' }); // play out what arrived instead of waiting for more
+      playback.cancel(true);
+    }
+  }, settings);
+  stopPlayback = () => { stopped = true; stream.close(); playback.cancel(true); };
+  try {
+    const played = await playback.done;
+    if (failed) { throw failed; }
+    if (!played) { stopped = true; stream.close(); }
+    return played;
+  } finally {
+    stopPlayback = undefined;
+  }
+}
+
+// Waits for the worklet to play out everything sent for stream `id` before STREAM_END: `done` resolves
+// true then (or on cancel), false if the player is closed. `level` gets the seconds queued, for flow control.
+function playout(panel: vscode.WebviewPanel, id: string, level?: (seconds: number) => void) {
+  let ended = false;
+  let settle: (played: boolean) => void = () => undefined;
+  const done = new Promise<boolean>((resolve) => {
+    const sub = panel.webview.onDidReceiveMessage((msg) => {
+      if (msg?.type !== 'BUFFER' || msg.stream !== id) { return; }
+      if (ended && msg.done) { settle(true); return; }
+      level?.(msg.seconds);
+    });
+    const closed = panel.onDidDispose(() => settle(false));
+    settle = (played) => { sub.dispose(); closed.dispose(); resolve(played); };
+  });
+  return { done, ended: () => { ended = true; }, cancel: (played: boolean) => settle(played) };
+}
+
+// Murf puts a RIFF header in front of the first frame; keep only the PCM after "data"+size.
+function stripWavHeader(chunk: Buffer): Buffer {
+  if (chunk.subarray(0, 4).toString('latin1') !== 'RIFF') { return chunk; }
+  const i = chunk.indexOf('data', 12, 'latin1');
+  return chunk.subarray(i >= 0 ? i + 8 : 44);
+}
+
+function clipFile(context: vscode.ExtensionContext, section: Section, settings: SpeechSettings) {
+  const dir = vscode.Uri.joinPath(context.globalStorageUri, 'narration');
+  const key = createHash('sha256').update(JSON.stringify(settings)).update('\0').update(section.hash).digest('hex');
+  return { dir, file: vscode.Uri.joinPath(dir, `${key}.json`) };
+}
+
+async function readClip(context: vscode.ExtensionContext, section: Section, settings: SpeechSettings): Promise<Clip | undefined> {
+  const { file } = clipFile(context, section, settings);
+  try {
+    const clip = JSON.parse(Buffer.from(await vscode.workspace.fs.readFile(file)).toString('utf8')) as Clip;
+    const now = new Date();
+    fs.utimes(file.fsPath, now, now).catch(() => undefined); // recently played: pruned last
+    return clip;
+  } catch {
+    return undefined; // cache miss
+  }
+}
+
+async function saveClip(context: vscode.ExtensionContext, section: Section, settings: SpeechSettings, clip: Clip) {
+  const { dir, file } = clipFile(context, section, settings);
+  await vscode.workspace.fs.createDirectory(dir);
+  await vscode.workspace.fs.writeFile(file, Buffer.from(JSON.stringify(clip), 'utf8'));
+  pruning = pruning.then(() => pruneCache(dir.fsPath)).catch(() => undefined);
+}
+
+async function loadClip(context: vscode.ExtensionContext, section: Section, settings: SpeechSettings): Promise<Clip> {
+  const cached = await readClip(context, section, settings);
+  if (cached) { return cached; }
+  const clip = await speakText(section.text, settings);
+  await saveClip(context, section, settings, clip);
+  return clip;
+}
+
+// Delete the least recently used clips until the folder is under MAX_CACHE_BYTES.
+async function pruneCache(dir: string) {
+  const files = await Promise.all((await fs.readdir(dir)).map(async (name) => {
+    const path = `${dir}/${name}`;
+    const st = await fs.stat(path);
+    return { path, size: st.size, used: st.mtimeMs };
+  }));
+  let total = files.reduce((sum, f) => sum + f.size, 0);
+  for (const f of files.sort((a, b) => a.used - b.used)) {
+    if (total <= MAX_CACHE_BYTES) { break; }
+    await fs.unlink(f.path).catch(() => undefined);
+    total -= f.size;
+  }
+}
@@ -2,6 +2,11 @@ import * as vscode from 'vscode';
 
 let panel: vscode.WebviewPanel | undefined;
 
+// Flow control for streamed playback: stop reading the socket when the webview
+// has this many seconds queued, resume once it drains below the low mark.
+export const HIGH_WATER_S = 4;
+export const LOW_WATER_S = 1;
+
 export function getPlayerPanel(context: vscode.ExtensionContext): vscode.WebviewPanel {
   if (panel) return panel;
 
@@ -18,21 +23,143 @@ export function getPlayerPanel(context: vscode.ExtensionContext): vscode.Webview
   return panel;
 }
 
+// AudioWorklet that plays queued Float32 PCM. Playback starts once `jitterSamples` are buffered
+// and re-buffers on underrun; played chunks are dropped so memory tracks what is queued, not clip length.
+const PCM_WORKLET = `
+class VibePcmPlayer extends AudioWorkletProcessor {
+  constructor(opts) {
+    super();
+    this.jitter = opts.processorOptions.jitterSamples;
+    this.reset();
+    this.ticks = 0;
+    this.port.onmessage = (e) => {
+      const d = e.data;
+      if (d === 'end') { this.ended = true; return; }
+      if (d === 'reset') { this.reset(); return; }
+      if (!(d instanceof Float32Array)) { this.reset(); this.stream = d.stream; return; }  // { stream }
+      this.chunks.push(d);
+      this.buffered += d.length;
+    };
+  }
+  reset() {
+    this.chunks = []; this.offset = 0; this.buffered = 0;
+    this.playing = false; this.ended = false;
+  }
+  process(inputs, outputs) {
+    const out = outputs[0][0];
+    if (!this.playing && (this.buffered >= this.jitter || (this.ended && this.buffered > 0))) {
+      this.playing = true;
+    }
+    let i = 0;
+    if (this.playing) {
+      while (i < out.length && this.chunks.length) {
+        const c = this.chunks[0];
+        const n = Math.min(out.length - i, c.length - this.offset);
+        out.set(c.subarray(this.offset, this.offset + n), i);
+        i += n; this.offset += n; this.buffered -= n;
+        if (this.offset >= c.length) { this.chunks.shift(); this.offset = 0; }
+      }
+      if (i < out.length && !this.ended) { this.playing = false; }
+    }
+    out.fill(0, i);
+    if (++this.ticks % 16 === 0) {
+      this.port.postMessage({ buffered: this.buffered, done: this.ended && this.buffered === 0, stream: this.stream });
+    }
+    return true;
+  }
+}
+registerProcessor('vibe-pcm', VibePcmPlayer);
+`;
+
 function getHtml() {
   return `<!doctype html>
 <html><head><meta charset="utf-8" />
-<style>body{font-family:system-ui;padding:8px} audio{width:100%}</style>
+<style>body{font-family:system-ui;padding:8px} audio{width:100%} #transcript{white-space:pre-wrap;opacity:.8}</style>
 </head>
 <body>
   <h3>Vibe Player</h3>
   <audio id="aud" controls autoplay></audio>
+  <div id="transcript"></div>
   <script>
+    const vscode = acquireVsCodeApi();
+    const WORKLET = ${JSON.stringify(PCM_WORKLET)};
+    const JITTER_S = 0.15;
+    let ctx, node, rate = 0, first = true, carry = null;
+    let ready = Promise.resolve();
+
+    async function start(sampleRate, stream) {
+      if (!ctx || rate !== sampleRate) {
+        if (ctx) { await ctx.close(); }
+        rate = sampleRate;
+        ctx = new AudioContext({ sampleRate });
+        const url = URL.createObjectURL(new Blob([WORKLET], { type: 'application/javascript' }));
+        await ctx.audioWorklet.addModule(url);
+        URL.revokeObjectURL(url);
+        node = new AudioWorkletNode(ctx, 'vibe-pcm', {
+          outputChannelCount: [1],
+          processorOptions: { jitterSamples: Math.round(sampleRate * JITTER_S) }
+        });
+        node.port.onmessage = e => vscode.postMessage({ type: 'BUFFER', seconds: e.data.buffered / rate, done: e.data.done, stream: e.data.stream });
+        node.connect(ctx.destination);
+      }
+      node.port.postMessage({ stream }); // reports carry it, so the host can tell this clip's "done" from the last one's
+      await ctx.resume();
+      first = true; carry = null;
+    }
+
+    function push(b64) {
+      let bytes = Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+      // Murf puts a RIFF header in front of the first frame
+      if (first) {
+        first = false;
+        if (bytes.length > 12 && String.fromCharCode(...bytes.subarray(0, 4)) === 'RIFF') {
+          let i = 12;
+          while (i + 8 <= bytes.length && String.fromCharCode(...bytes.subarray(i, i + 4)) !== 'data') { i++; }
+          bytes = bytes.subarray(Math.min(i + 8, bytes.length));
+        }
+      }
+      if (carry !== null) {
+        const joined = new Uint8Array(bytes.length + 1);
+        joined[0] = carry; joined.set(bytes, 1); bytes = joined; carry = null;
+      }
+      if (bytes.length % 2) { carry = bytes[bytes.length - 1]; bytes = bytes.subarray(0, bytes.length - 1); }
+      const pcm = new Int16Array(bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + bytes.length));
+      const f32 = new Float32Array(pcm.length);
+      for (let i = 0; i < pcm.length; i++) { f32[i] = pcm[i] / 32768; }
+      node.port.postMessage(f32, [f32.buffer]);
+    }
+
+    // Sectioned narration: one clip at a time, the host waits for CLIP_ENDED before sending the next
+    const aud = document.getElementById('aud');
+    let clipId = null;
+    function clipEnded() {
+      if (clipId !== null) { vscode.postMessage({ type: 'CLIP_ENDED', id: clipId }); clipId = null; }
+    }
+    aud.addEventListener('ended', clipEnded);
+
     window.addEventListener('message', ev => {
       const msg = ev.data;
       if (msg.type === 'PLAY') {
         const src = \`data:\${msg.mime};base64,\${msg.audioB64}\`;
         const a = document.getElementById('aud');
         a.src = src; a.play();
+      } else if (msg.type === 'PLAY_CLIP') {
+        clipEnded();
+        clipId = msg.id;
+        document.getElementById('transcript').textContent = msg.label || '';
+        aud.src = \`data:\${msg.mime};base64,\${msg.audioB64}\`;
+        aud.play().catch(clipEnded);
+      } else if (msg.type === 'STOP') {
+        aud.pause();
+        clipEnded();
+        if (node) { node.port.postMessage('reset'); }
+      } else if (msg.type === 'STREAM_START') {
+        document.getElementById('transcript').textContent = msg.transcript || '';
+        ready = start(msg.sampleRate, msg.stream);
+      } else if (msg.type === 'STREAM_CHUNK') {
+        ready = ready.then(() => push(msg.audioB64));
+      } else if (msg.type === 'STREAM_END') {
+        ready = ready.then(() => node && node.port.postMessage('end'));
       }
     });
   </script>
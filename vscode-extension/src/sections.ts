@@ -0,0 +1,115 @@
+import * as vscode from 'vscode';
+import { createHash } from 'crypto';
+
+export type Section = {
+  text: string;
+  startLine: number;
+  endLine: number;   // inclusive
+  hash: string;      // sha256 of text, the narration cache key
+};
+
+// Small neighbours are merged so a run of one-line comments is one request, not ten;
+// anything over the max is split at blank lines.
+const MIN_SECTION_CHARS = 300;
+const MAX_SECTION_CHARS = 4000;
+
+type Span = [number, number];
+
+// Split a document into narration sections: top-level symbols (functions/classes) from the
+// language's symbol provider, with the text between them (imports, comment blocks) cut at blank lines.
+export async function splitDocument(doc: vscode.TextDocument): Promise<Section[]> {
+  const lines = doc.getText().split(/\r?\n/);
+  let symbols: Span[] = [];
+  try {
+    const found = await vscode.commands.executeCommand<any[]>('vscode.executeDocumentSymbolProvider', doc.uri);
+    symbols = (found || []).map((s) => {
+      const r: vscode.Range = s.range ?? s.location.range;
+      return [r.start.line, r.end.line] as Span;
+    });
+  } catch {
+    // no symbol provider for this language: everything is treated as loose text below
+  }
+  return splitLines(lines, symbols);
+}
+
+export function splitLines(lines: string[], symbols: Span[]): Section[] {
+  const spans: Array<{ span: Span; symbol: boolean }> = [];
+  let cursor = 0;
+  for (const [start, end] of mergeSpans(symbols)) {
+    if (start > cursor) { spans.push({ span: [cursor, start - 1], symbol: false }); }
+    spans.push({ span: [start, end], symbol: true });
+    cursor = end + 1;
+  }
+  if (cursor < lines.length) { spans.push({ span: [cursor, lines.length - 1], symbol: false }); }
+
+  const out: Span[] = [];
+  for (const { span, symbol } of spans) {
+    const parts = symbol ? splitLarge(lines, span) : paragraphs(lines, span);
+    for (const p of parts) {
+      const prev = out[out.length - 1];
+      // fold tiny pieces (one-line symbols, short comments) into the previous section
+      if (prev && size(lines, [prev[0], p[1]]) < MIN_SECTION_CHARS) {
+        prev[1] = p[1];
+      } else {
+        out.push(p);
+      }
+    }
+  }
+
+  return out
+    .map(([startLine, endLine]) => {
+      const text = lines.slice(startLine, endLine + 1).join('\n');
+      return { text, startLine, endLine, hash: createHash('sha256').update(text).digest('hex') };
+    })
+    .filter((s) => s.text.trim().length > 0);
+}
+
+function mergeSpans(spans: Span[]): Span[] {
+  const sorted = spans.slice().sort((a, b) => a[0] - b[0]);
+  const out: Span[] = [];
+  for (const [s, e] of sorted) {
+    const last = out[out.length - 1];
+    if (last && s <= last[1]) { last[1] = Math.max(last[1], e); } else { out.push([s, e]); }
+  }
+  return out;
+}
+
+function size(lines: string[], [s, e]: Span): number {
+  let n = 0;
+  for (let i = s; i <= e; i++) { n += lines[i].length + 1; }
+  return n;
+}
+
+// Blank-line separated blocks inside a span
+function paragraphs(lines: string[], [s, e]: Span): Span[] {
+  const out: Span[] = [];
+  let start = -1;
+  for (let i = s; i <= e; i++) {
+    const blank = lines[i].trim() === '';
+    if (!blank && start < 0) { start = i; }
+    if (blank && start >= 0) { out.push([start, i - 1]); start = -1; }
+  }
+  if (start >= 0) { out.push([start, e]); }
+  return out.flatMap((p) => splitLarge(lines, p));
+}
+
+function splitLarge(lines: string[], span: Span): Span[] {
+  if (size(lines, span) <= MAX_SECTION_CHARS) { return [span]; }
+  const out: Span[] = [];
+  let [start] = span;
+  let n = 0;
+  let lastBlank = -1;
+  for (let i = span[0]; i <= span[1]; i++) {
+    n += lines[i].length + 1;
+    if (lines[i].trim() === '') { lastBlank = i; }
+    if (n > MAX_SECTION_CHARS && i > start) {
+      const cut = lastBlank > start ? lastBlank : i - 1;
+      out.push([start, cut]);
+      start = cut + 1;
+      n = size(lines, [start, i]);
+      lastBlank = -1;
+    }
+  }
+  out.push([start, span[1]]);
+  return out;
+}